@@ -3,15 +3,98 @@ __author__ = "Jimena B. Gonzalez"
 __version__ = "1.0.1"
 
 import requests as req
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pds
-from datetime import datetime, timedelta, date
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+import pyarrow.dataset as ds
+from datetime import datetime, timedelta, date, timezone
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import threading
+import codecs
+import gzip
+import hashlib
+import json
+import math
 import os
+import sqlite3
+import time
+import uuid
+
+## Cantidad maxima de eventos que la API de USGS devuelve por peticion.
+LIMITE_EVENTOS_USGS = 20000
+
+## Configuracion del cliente HTTP compartido por todas las extracciones (ver configurar_cliente_http).
+CONFIG_HTTP = {
+    "timeout": (5, 60),                                 # (conexion, lectura) en segundos
+    "reintentos": 5,
+    "backoffFactor": 0.5,                               # espera = backoffFactor * 2^(intento-1) segundos
+    "backoffJitter": 0.5,                               # segundos aleatorios sumados a cada espera
+    "backoffMax": 60,
+    "statusReintentables": (429, 500, 502, 503, 504),
+    "poolConexiones": 4,
+    "poolMaxsize": 16,
+}
+
+## Esquema de los campos 'properties' de los eventos GeoJSON de USGS, con el tipo de dato de cada columna.
+## None ==> tipo inferido por Pandas (campos de texto libre).
+ESQUEMA_PROPERTIES_USGS = {
+    "mag": "float64", "place": "category", "time": "int64", "updated": "int64", "tz": "Int64",
+    "url": None, "detail": None, "felt": "Int64", "cdi": "float64", "mmi": "float64",
+    "alert": "category", "status": "category", "tsunami": "Int64", "sig": "Int64", "net": "category",
+    "code": None, "ids": None, "sources": None, "types": None, "nst": "Int64",
+    "dmin": "float64", "rms": "float64", "gap": "float64", "magType": "category",
+    "type": "category", "title": None
+}
+
+## Columnas de baja cardinalidad que se manejan como categoricas (Pandas) / diccionario (Arrow y Parquet) en todo el pipeline:
+## al extraer (ESQUEMA_PROPERTIES_USGS), almacenar (OPCIONES_PARQUET), leer (read_parquet) y agrupar.
+COLUMNAS_CATEGORICAS = ["properties.place", "properties.type", "properties.magType", "properties.net", "properties.status", "properties.alert"]
+
+sesion_http = None
+lock_sesion_http = threading.Lock()
+
+## Archivo donde se registra, por endpoint y parametros, la maxima fecha de actualizacion ya extraida (ver extraccion_incremental).
+RUTA_CHECKPOINTS = "Output/datalake/state/checkpoints.json"
+lock_checkpoints = threading.Lock()
+
+## Configuracion del cache en disco de respuestas de la API (ver configurar_cache). Por defecto, deshabilitado.
+CONFIG_CACHE = {
+    "habilitado": False,
+    "directorio": "Output/cache/http",
+    "ttlSegundos": {"query": 300, "count": 60},         # TTL por endpoint
+    "ttlDefecto": 300,
+    "maxBytes": 256 * 1024 * 1024,                      # tamaño maximo del cache; se eliminan primero las entradas menos usadas
+}
+lock_cache = threading.Lock()
+
+## Tamaño (en grados) de las celdas de la grilla utilizada en el particionado espacial (ver agregar_celda_espacial).
+TAMANIO_CELDA_GRADOS = 1.0
+CELDA_SIN_COORDENADAS = -9999
+
+## Opciones por defecto de escritura de archivos parquet (ver preparar_escritura_parquet).
+OPCIONES_PARQUET = {
+    "compresion": "snappy",                             # codec: snappy, zstd, gzip, brotli, lz4, none
+    "nivelCompresion": None,                            # None ==> nivel por defecto del codec
+    "filasPorRowGroup": None,                           # None ==> tamaño por defecto de pyarrow
+    "ordenarPor": None,                                 # columnas por las que se ordenan los registros (mejora las estadisticas min/max)
+    "columnasDiccionario": COLUMNAS_CATEGORICAS,        # columnas de texto a almacenar con codificacion diccionario
+}
+
+## Catalogo (SQLite) de los archivos de cada dataset parquet (ver registrar_archivos_manifest). Al comenzar con '_', pyarrow lo ignora al leer el dataset.
+NOMBRE_MANIFEST = "_manifest.sqlite"
+CAMPO_TIEMPO_MANIFEST = "timestamp_measured"
 
 ### Funciones Genericas / Utilitarias ### 
 
 def create_table(data):
     """
     A partir de datos en formato JSON, construye un DataFrame de Pandas.
+    Si los datos son una lista de eventos (features) GeoJSON, se utiliza el esquema de USGS (ver aplanar_features_geojson).
 
     Parametros (args):
         :param data (JSON str) ==> Conjunto de datos en formato JSON.
@@ -25,7 +108,10 @@ def create_table(data):
     """
     try:
 
-        df = pds.json_normalize(data)
+        if es_lista_features_geojson(data):
+            df = aplanar_features_geojson(data)
+        else:
+            df = pds.json_normalize(data)
 
     except NotImplementedError as ex:
         raise NotImplementedError("ERROR! Formato de entrada no soportado por Pandas.")
@@ -36,6 +122,145 @@ def create_table(data):
         
     return df
 
+def es_lista_features_geojson(data):
+    """
+    Evalua si el argumento recibido es una lista de eventos (features) GeoJSON.
+
+    Parametros (args):
+        :param data (Unknown) ==> El elemento a evaluar.
+
+    Output (returns):
+        :return True (Boolean) ==> Si 'data' SI es una lista de features GeoJSON (o una lista vacia).
+        :return False (Boolean) ==> Si 'data' NO es una lista de features GeoJSON.
+    """
+    if not isinstance(data, list):
+        return False
+    return len(data) == 0 or (isinstance(data[0], dict) and "properties" in data[0] and "geometry" in data[0])
+
+def convertir_columna(valores, tipo):
+    """
+    Construye una columna (Serie de Pandas) con un tipo de dato dado.
+
+    Parametros (args):
+        :param valores (list) ==> Valores de la columna.
+        :param tipo (str) ==> Tipo de dato de la columna. None para inferirlo. Las columnas 'int64' con nulos se construyen como 'Int64'.
+
+    Output (returns):
+        :return serie (Pandas.Series) ==> La columna con el tipo de dato indicado.
+    """
+    if tipo is None:
+        return pds.Series(valores)
+
+    if tipo == "int64":
+        try:
+            return pds.Series(valores, dtype="int64")
+        except (TypeError, ValueError):
+            tipo = "Int64"
+
+    return pds.Series(valores, dtype=tipo)
+
+def aplanar_features_geojson(features, esquema=ESQUEMA_PROPERTIES_USGS):
+    """
+    Construye un DataFrame de Pandas a partir de una lista de eventos (features) GeoJSON, con columnas tipadas segun un esquema.
+    Las coordenadas del campo 'geometry' se separan en las columnas geometry.longitude, geometry.latitude y geometry.depth
+    (los datasets con el esquema previo, con la columna 'geometry.coordinates', se migran con migrar_esquema_coordenadas).
+    Los campos 'properties' que no se encuentran en el esquema se agregan con tipo inferido.
+
+    Parametros (args):
+        :param features (list) ==> Lista de eventos GeoJSON.
+        :param esquema (Dict) ==> Tipo de dato de cada campo 'properties'. Por defecto, ESQUEMA_PROPERTIES_USGS.
+
+    Output (returns):
+        :return df (Pandas Dataframe) ==> Un DataFrame de Pandas con una fila por evento.
+    """
+    properties = [f.get("properties") or {} for f in features]
+    geometrias = [f.get("geometry") or {} for f in features]
+    coordenadas = [(g.get("coordinates") or []) + [None, None, None] for g in geometrias]
+
+    columnas = {
+        "type": convertir_columna([f.get("type") for f in features], "category"),
+        "id": convertir_columna([f.get("id") for f in features], None),
+    }
+
+    extras = set().union(*properties).difference(esquema)
+    for campo, tipo in list(esquema.items()) + [(campo, None) for campo in sorted(extras)]:
+        columnas[f"properties.{campo}"] = convertir_columna([p.get(campo) for p in properties], tipo)
+
+    columnas["geometry.type"] = convertir_columna([g.get("type") for g in geometrias], "category")
+    columnas["geometry.longitude"] = np.array([c[0] for c in coordenadas], dtype="float64")
+    columnas["geometry.latitude"] = np.array([c[1] for c in coordenadas], dtype="float64")
+    columnas["geometry.depth"] = np.array([c[2] for c in coordenadas], dtype="float64")
+
+    return pds.DataFrame(columnas)
+
+def migrar_coordenadas(df):
+    """
+    Compatibilidad con el esquema previo de los eventos, que almacenaba las coordenadas en la columna 'geometry.coordinates' ([longitud, latitud, profundidad]):
+    la separa en las columnas geometry.longitude, geometry.latitude y geometry.depth (ver aplanar_features_geojson), completando solo sus valores nulos.
+
+    Parametros (args):
+        :param df (Pandas.DataFrame) ==> Los eventos, con el esquema previo, el actual o ambos (ej. archivos de una misma particion concatenados).
+
+    Output (returns):
+        :return df (Pandas.DataFrame) ==> Los eventos con el esquema actual (sin la columna 'geometry.coordinates').
+    """
+    if "geometry.coordinates" not in df.columns:
+        return df
+
+    coordenadas = [(list(c) if isinstance(c, (list, tuple, np.ndarray)) else []) + [None, None, None] for c in df["geometry.coordinates"]]
+    df = df.drop(columns=["geometry.coordinates"])
+
+    for posicion, columna in enumerate(["geometry.longitude", "geometry.latitude", "geometry.depth"]):
+        valores = pds.Series([c[posicion] for c in coordenadas], index=df.index, dtype="float64")
+        df[columna] = df[columna].fillna(valores) if columna in df.columns else valores
+
+    return df
+
+def leer_archivos_particion(archivos):
+    """
+    Lee los archivos parquet de una particion, uno por vez, y los concatena con el esquema actual (ver migrar_coordenadas).
+    A diferencia de una lectura conjunta (que toma el esquema del primer archivo), no descarta las columnas de los archivos con el esquema previo.
+
+    Parametros (args):
+        :param archivos (list) ==> Paths de los archivos.
+
+    Output (returns):
+        :return df (Pandas.DataFrame) ==> El contenido de todos los archivos.
+    """
+    return concatenar_dataframes([migrar_coordenadas(pq.read_table(archivo, partitioning=None).to_pandas()) for archivo in archivos])
+
+def migrar_esquema_coordenadas(path, opcionesParquet=None):
+    """
+    Reescribe las particiones de un dataset que contienen archivos con el esquema previo de las coordenadas (ver migrar_coordenadas),
+    para que todos sus archivos tengan el esquema actual. Las particiones sin archivos previos no se leen (solo se lee el esquema de cada archivo),
+    por lo que puede ejecutarse antes de cada extraccion.
+
+    Parametros (args):
+        :param path (str) ==> Path del dataset.
+        :param opcionesParquet (Dict) ==> Opciones de escritura de los archivos parquet (ver OPCIONES_PARQUET). Por defecto, None (OPCIONES_PARQUET).
+
+    Output (returns):
+        :return migradas (list) ==> Paths de las particiones reescritas.
+
+    Raises:
+        Exception ==> Si no se puede reescribir alguna de las particiones.
+    """
+    migradas = []
+
+    for directorio, _, _ in os.walk(path):
+        archivos = listar_archivos_parquet(directorio)
+        if not any("geometry.coordinates" in pq.read_schema(archivo).names for archivo in archivos):
+            continue
+
+        try:
+            reemplazar_archivos_particion(directorio, leer_archivos_particion(archivos), archivos, opcionesParquet=opcionesParquet)
+            migradas.append(directorio)
+        except Exception as ex:
+            print(f"ERROR! No se pudo migrar el esquema de la particion '{directorio}': {str(ex)}")
+            raise ex
+
+    return migradas
+
 def extract_response_data_field(reponse, fieldToExtract=None):
     """
     Realiza una extraccion de un campo especifico de un json de entrada.
@@ -95,7 +320,7 @@ def normalize_date(df, fecha=None, dateFiledName='timestamp_measured', unitEpoch
     
     return df
 
-def almacenar_particionado(df, path, fecha=None, dateFiledName='timestamp_measured',unitEpoch='s', tipoParticion="fyh"): 
+def almacenar_particionado(df, path, fecha=None, dateFiledName='timestamp_measured',unitEpoch='s', tipoParticion="fyh", modoEscritura="append", claveMerge="id", campoVersion="properties.updated", opcionesParquet=None, tamanioCelda=TAMANIO_CELDA_GRADOS): 
     """
     A partir de un DataFrame de Pandas, lo almacena en formato parquet, en una estructura de directorios segmentada por fecha y hora de la medición y/o calculo.
 
@@ -105,27 +330,158 @@ def almacenar_particionado(df, path, fecha=None, dateFiledName='timestamp_measur
         :param fecha (Datetime) ==> Hora a colocar en caso de no contar con la misma como dato.
         :param dateFiledName  (JSON str) ==> Nombre del campo de fecha a normalizar. Pir defecto, 'timestamp_measured'.
         :param unitEpoch (str) ==> Campo que contiene unidad en que se encuentra el time en epoch (ej. 's'=segundos, 'ms'=milisegundos). Por defecto 's'.
-        :param tipoParticion (str) ==> Indica el tipo de particionado a realizar. Por defecto fecha y hora (fyh). Los valores posibles son: fyh = fecha y hora; f = fecha; h = hora
+        :param tipoParticion (str) ==> Indica el tipo de particionado a realizar. Por defecto fecha y hora (fyh). Los valores posibles son: fyh = fecha y hora; f = fecha; h = hora; g = celda espacial; fg = fecha y celda espacial
+        :param modoEscritura (str) ==> 'append' agrega nuevos archivos a cada particion; 'merge' combina los datos con los ya almacenados (ver merge_parquet_particionado). Por defecto, 'append'.
+        :param claveMerge (str) ==> Campo que identifica a cada registro en el modo 'merge'. Por defecto, 'id'.
+        :param campoVersion (str) ==> Campo con la version de cada registro en el modo 'merge' (se conserva la mayor). Por defecto, 'properties.updated'.
+        :param opcionesParquet (Dict) ==> Opciones de escritura de los archivos parquet (ver OPCIONES_PARQUET). Por defecto, None (OPCIONES_PARQUET).
+        :param tamanioCelda (float) ==> Tamaño en grados de las celdas del particionado espacial. Por defecto, TAMANIO_CELDA_GRADOS.
 
     Output (returns):
         :return None ==> Sin retorno
+
+    Raises:
+        Exception ==> Si no se pudieron almacenar los datos (ver df_to_parquet).
     """
     df=normalize_date(df, fecha, dateFiledName, unitEpoch)
 
-    if tipoParticion == "fyh":
-        partition_cols = ["fecha", "hora"]
-    elif tipoParticion == "f":
-        partition_cols = ["fecha"]
-    elif tipoParticion == "h":
-        partition_cols = ["hora"]
-    else:
-        partition_cols = ["fecha", "hora"]
+    if df is not None and "g" in tipoParticion:
+        df = agregar_celda_espacial(df, tamanioCelda)
+
+    partition_cols = columnas_particion(tipoParticion)
    
     if df is not None: 
-        df_to_parquet(df, f"{path}", partition_cols)
+        df_to_parquet(df, f"{path}", partition_cols, modoEscritura, claveMerge, campoVersion, opcionesParquet)
 
     return None
 
+def columnas_particion(tipoParticion="fyh"):
+    """
+    Obtiene las columnas de particionado correspondientes a un tipo de particion.
+
+    Parametros (args):
+        :param tipoParticion (str) ==> Tipo de particionado. Los valores posibles son: fyh = fecha y hora; f = fecha; h = hora; g = celda espacial; fg = fecha y celda espacial. Por defecto (o ante otro valor), fecha y hora.
+
+    Output (returns):
+        :return partition_cols (list) ==> Columnas de particionado.
+    """
+    if tipoParticion == "f":
+        return ["fecha"]
+    elif tipoParticion == "h":
+        return ["hora"]
+    elif tipoParticion == "g":
+        return ["celda_lat", "celda_lon"]
+    elif tipoParticion == "fg":
+        return ["fecha", "celda_lat", "celda_lon"]
+    return ["fecha", "hora"]
+
+def agregar_celda_espacial(df, tamanioCelda=TAMANIO_CELDA_GRADOS):
+    """
+    Agrega las columnas 'celda_lat' y 'celda_lon', con los indices de la celda de una grilla regular que contiene a cada evento.
+    La celda se obtiene de las columnas geometry.latitude / geometry.longitude (o de geometry.coordinates, si no existen).
+
+    Parametros (args):
+        :param df (Pandas.DataFrame) ==> DataFrame con las coordenadas de los eventos.
+        :param tamanioCelda (float) ==> Tamaño de las celdas, en grados. Por defecto, TAMANIO_CELDA_GRADOS.
+
+    Output (returns):
+        :return df (Pandas.DataFrame) ==> El DataFrame origen con las columnas de la celda (CELDA_SIN_COORDENADAS si el evento no tiene coordenadas).
+    """
+    if "geometry.latitude" in df.columns and "geometry.longitude" in df.columns:
+        latitud = df["geometry.latitude"].to_numpy(dtype="float64")
+        longitud = df["geometry.longitude"].to_numpy(dtype="float64")
+    else:
+        coordenadas = [(c if isinstance(c, (list, tuple, np.ndarray)) else []) for c in df["geometry.coordinates"]]
+        longitud = np.array([c[0] if len(c) > 0 and c[0] is not None else np.nan for c in coordenadas], dtype="float64")
+        latitud = np.array([c[1] if len(c) > 1 and c[1] is not None else np.nan for c in coordenadas], dtype="float64")
+
+    ## Los eventos sin coordenadas se asignan a una celda fuera del rango valido, ya que pyarrow no permite leer particiones nulas
+    df["celda_lat"] = np.nan_to_num(np.floor(latitud / tamanioCelda), nan=CELDA_SIN_COORDENADAS).astype("int64")
+    df["celda_lon"] = np.nan_to_num(np.floor(longitud / tamanioCelda), nan=CELDA_SIN_COORDENADAS).astype("int64")
+
+    return df
+
+def filtros_bbox(bbox, tamanioCelda=TAMANIO_CELDA_GRADOS, particionEspacial=True):
+    """
+    Construye los filtros de lectura para un area rectangular (bounding box): descartan las celdas que no la intersectan
+    y los eventos por fuera de la misma.
+
+    Parametros (args):
+        :param bbox (tuple) ==> Area a leer, como (longitud minima, latitud minima, longitud maxima, latitud maxima).
+        :param tamanioCelda (float) ==> Tamaño de las celdas, en grados. Por defecto, TAMANIO_CELDA_GRADOS.
+        :param particionEspacial (bool) ==> Indica si el dataset se encuentra particionado por celda. Por defecto, True.
+
+    Output (returns):
+        :return condiciones (list) ==> Lista de tuplas (columna, operador, valor).
+
+    Raises:
+        ValueError ==> Si la longitud minima es mayor a la maxima (bbox que cruza el antimeridiano) o la latitud minima es mayor a la maxima.
+    """
+    lonMin, latMin, lonMax, latMax = bbox
+
+    if lonMin > lonMax or latMin > latMax:
+        raise ValueError("El argumento 'bbox' debe tener la forma (lonMin, latMin, lonMax, latMax), con lonMin <= lonMax y latMin <= latMax.")
+
+    condiciones = [
+        ("geometry.longitude", ">=", lonMin), ("geometry.longitude", "<=", lonMax),
+        ("geometry.latitude", ">=", latMin), ("geometry.latitude", "<=", latMax),
+    ]
+
+    if particionEspacial:
+        condiciones += [
+            ("celda_lon", ">=", math.floor(lonMin / tamanioCelda)), ("celda_lon", "<=", math.floor(lonMax / tamanioCelda)),
+            ("celda_lat", ">=", math.floor(latMin / tamanioCelda)), ("celda_lat", "<=", math.floor(latMax / tamanioCelda)),
+        ]
+
+    return condiciones
+
+def columnas_particion_dataset(path):
+    """
+    Obtiene las columnas de particionado de un dataset, a partir de su manifest o de los nombres de sus directorios (ej. fecha=2023-01-01).
+
+    Parametros (args):
+        :param path (str) ==> El path del dataset.
+
+    Output (returns):
+        :return columnas (list) ==> Columnas de particionado, en orden. Vacia si el dataset no esta particionado.
+    """
+    df_manifest = leer_manifest(path) if os.path.isdir(path) else None
+    if df_manifest is not None and len(df_manifest) > 0:
+        return list(json.loads(df_manifest["particion"].iloc[0]))
+
+    columnas = []
+    directorio = path
+
+    while os.path.isdir(directorio):
+        subdirectorios = sorted(entrada.name for entrada in os.scandir(directorio) if entrada.is_dir() and "=" in entrada.name)
+        if not subdirectorios:
+            break
+        columnas.append(subdirectorios[0].split("=", 1)[0])
+        directorio = os.path.join(directorio, subdirectorios[0])
+
+    return columnas
+
+def listar_particiones(path, columna="fecha"):
+    """
+    Obtiene los valores de una columna de particionado de primer nivel de un dataset (ej. las fechas de las particiones fecha=...),
+    a partir de su manifest o, si no lo tiene, de los nombres de sus directorios.
+
+    Parametros (args):
+        :param path (str) ==> El path del dataset.
+        :param columna (str) ==> La columna de particionado. Por defecto, 'fecha'.
+
+    Output (returns):
+        :return valores (list) ==> Valores de la particion, ordenados. Vacia si el dataset no existe o no esta particionado por la columna.
+    """
+    df_manifest = leer_manifest(path) if os.path.isdir(path) else None
+    if df_manifest is not None and len(df_manifest) > 0:
+        return sorted({json.loads(particion)[columna] for particion in df_manifest["particion"] if columna in json.loads(particion)})
+
+    if not os.path.isdir(path):
+        return []
+
+    return sorted(entrada.name.split("=", 1)[1] for entrada in os.scandir(path) if entrada.is_dir() and entrada.name.startswith(f"{columna}="))
+
 def isDataframe(param):
     """
     Evalua si el argumento recibido se encuentra o no en formato DatFrame de Pandas.
@@ -142,6 +498,21 @@ def isDataframe(param):
         return False
     return True
 
+def isDict(param):
+    """
+    Evalua si el argumento recibido es o no un Dict de Python.
+
+    Parametros (args):
+        :param param (Unknown) ==> El objeto del que se desea verificar el tipo
+    
+    Output (returns):
+        :return True ==> Si 'param' SI es un Dict de Python
+        :return False ==> Si 'param' NO es un Dict de Python
+    """
+    if not isinstance(param, dict):
+        return False
+    return True
+
 def is_Str_Or_StrList(param):
     """
     Evalua si el argumento recibido es un string o una lista de strings.
@@ -174,7 +545,7 @@ def crear_directorio(path):
     if directory and not os.path.exists(directory):
         os.makedirs(directory)
 
-def df_to_parquet(df, path, partition_col=None):
+def df_to_parquet(df, path, partition_col=None, modoEscritura="append", claveMerge="id", campoVersion="properties.updated", opcionesParquet=None):
     """
     Guardar un DataFrame en formato Parquet en en path especificado.
 
@@ -182,13 +553,18 @@ def df_to_parquet(df, path, partition_col=None):
         :param df (Pandas.DataFrame) ==>  El DataFrame que se desea guardar.
         :param path (str) ==>  La ruta donde se guardará el archivo Parquet.
         :param partition_col (str or list, optional) ==>  Columna(s) por la cual particionar los datos en el formato Parquet.
+        :param modoEscritura (str) ==> 'append' agrega nuevos archivos a cada particion; 'merge' combina los datos con los ya almacenados (ver merge_parquet_particionado). Por defecto, 'append'.
+        :param claveMerge (str) ==> Campo que identifica a cada registro en el modo 'merge'. Por defecto, 'id'.
+        :param campoVersion (str) ==> Campo con la version de cada registro en el modo 'merge'. Por defecto, 'properties.updated'.
+        :param opcionesParquet (Dict) ==> Opciones de escritura de los archivos parquet (ver OPCIONES_PARQUET). Por defecto, None (OPCIONES_PARQUET).
     
     Output (returns):
         :return None ==> Sin retorno. La salida son los archivo almacenados en "path".
 
     Raises:
         TypeError ==>  Si el argumento df no es un DataFrame de pandas.
-        ValueError ==>  Si partition_col no es None ni una cadena o lista de cadenas.
+        ValueError ==>  Si partition_col no es None ni una cadena o lista de cadenas, o si modoEscritura no es un valor valido.
+        Exception ==> Si no se pudieron escribir los archivos (los archivos ya escritos de otras particiones se conservan).
     """
 
     ##Control de tipos
@@ -198,212 +574,2047 @@ def df_to_parquet(df, path, partition_col=None):
     if is_Str_Or_StrList(partition_col) is False:
         raise ValueError("El argumento 'partition_col' debe ser un string o una lista de strings.")
 
+    if modoEscritura not in ("append", "merge"):
+        raise ValueError("El argumento 'modoEscritura' debe ser 'append' o 'merge'.")
+
     crear_directorio(path)
 
     try:
         # Guardar el DataFrame en formato Parquet
-        df.to_parquet(path, partition_cols=partition_col)
+        if modoEscritura == "merge":
+            merge_parquet_particionado(df, path, partition_col, claveMerge, campoVersion, opcionesParquet)
+        else:
+            df, opciones_escritura = preparar_escritura_parquet(df, opcionesParquet)
+            if partition_col:
+                ## Se registran en el manifest los archivos escritos, con la metadata obtenida al escribirlos
+                escritos = {}
+                ## pyarrow rechaza por defecto los lotes de mas de 1024 particiones (ej. particionado por fecha y celda de un lote global)
+                cantParticiones = df.groupby(partition_col, observed=True, dropna=False).ngroups
+                df.to_parquet(path, engine="pyarrow", partition_cols=partition_col, file_visitor=lambda archivo: escritos.update({archivo.path: archivo.metadata}), max_partitions=max(cantParticiones, 1024), **opciones_escritura)
+                registrar_archivos_manifest(path, list(escritos), metadatas=escritos)
+            else:
+                df.to_parquet(path, engine="pyarrow", partition_cols=partition_col, **opciones_escritura)
         print("DataFrame guardado exitosamente en formato Parquet.")
     except Exception as e:
+        ## El error se propaga: quien invoca no debe considerar almacenados los datos (ej. para registrar un checkpoint)
         print(f"Error al guardar el DataFrame en formato Parquet: {str(e)}")
+        raise e
 
-def print_parquet(path):
+def merge_parquet_particionado(df, path, partition_col, claveMerge="id", campoVersion="properties.updated", opcionesParquet=None):
     """
-    Imprime un archivo parquet en caso de que exista.
+    Combina un DataFrame con los datos ya almacenados en un dataset parquet particionado, sin generar registros repetidos.
+    Se reescriben las particiones presentes en el DataFrame y las que contienen versiones previas de sus registros
+    (ej. un evento cuya fecha se corrigio): entre todas ellas se conserva la version mas reciente de cada registro (segun campoVersion),
+    por lo que un registro que cambia de particion se elimina de la anterior. Los archivos previos de cada particion se reemplazan por uno nuevo (ver reemplazar_particiones).
 
     Parametros (args):
-        :param path (str) ==>  El path con el nombre del archivo a leer
-    
+        :param df (Pandas.DataFrame) ==> El DataFrame que se desea guardar.
+        :param path (str) ==> La ruta del dataset parquet.
+        :param partition_col (str or list) ==> Columna(s) por la cual se encuentra particionado el dataset.
+        :param claveMerge (str) ==> Campo que identifica a cada registro. Por defecto, 'id'.
+        :param campoVersion (str) ==> Campo con la version de cada registro. Por defecto, 'properties.updated'.
+        :param opcionesParquet (Dict) ==> Opciones de escritura de los archivos parquet (ver OPCIONES_PARQUET). Por defecto, None (OPCIONES_PARQUET).
+
     Output (returns):
-        :return None ==> Sin retorno. La salida es la impresion por pantalla del contenido del archivo "parquet".
+        :return None ==> Sin retorno
     """
-    print(read_parquet(path))
+    partition_cols = [partition_col] if isinstance(partition_col, str) else list(partition_col or [])
+    columnaDirectorio = "__directorio__"
 
-def read_parquet(path):
-    """
-    Lee un archivo parquet en caso de que exista.
+    grupos = df.groupby(partition_cols, observed=True, sort=False, dropna=False) if partition_cols else [((), df)]
+    nuevos = {}
 
-    Parametros (args):
-        :param path (str) ==>  El path con el nombre del archivo a leer
-    
-    Output (returns):
-        :return df (Pandas Dataframe) ==> Los datos leidos, en formato de Tabla (DataFrame de Pandas).
-    """
-    if os.path.exists(path):
-        return pds.read_parquet(path)
-    else:
-        print("\nEl archivo o path deseado es inexistente.")
+    for valores, df_particion in grupos:
+        valores = valores if isinstance(valores, tuple) else (valores,)
+        directorio = os.path.normpath(os.path.join(path, *[f"{col}={'__HIVE_DEFAULT_PARTITION__' if pds.isna(valor) else valor}" for col, valor in zip(partition_cols, valores)]))
+        nuevos[directorio] = df_particion.drop(columns=partition_cols).assign(**{columnaDirectorio: directorio})
 
-### Métodos de Consulta ### 
+    ## Se suman las particiones que contienen versiones previas de los registros del lote
+    directorios = list(nuevos) + [directorio for directorio in particiones_con_claves(path, df[claveMerge] if claveMerge in df.columns else [], claveMerge) if directorio not in nuevos]
+    archivos_previos = {directorio: listar_archivos_parquet(directorio) for directorio in directorios}
 
-def get_response_data(url_base, endpoint, params=None):
+    ## Los datos previos se concatenan antes que los nuevos: ante versiones iguales, se conserva la del lote
+    previos = [leer_archivos_particion(archivos).assign(**{columnaDirectorio: directorio}) for directorio, archivos in archivos_previos.items() if archivos]
+    df_merge = deduplicar_eventos(concatenar_dataframes(previos + list(nuevos.values())), claveMerge, campoVersion)
+    filas = df_merge.groupby(columnaDirectorio, sort=False).indices
+
+    reemplazar_particiones(path, {
+        directorio: (df_merge.iloc[filas.get(directorio, [])].drop(columns=columnaDirectorio).reset_index(drop=True), archivos_previos[directorio])
+        for directorio in directorios
+    }, opcionesParquet=opcionesParquet)
+
+def particiones_con_claves(path, claves, claveMerge="id"):
     """
-    Realiza una solicitud GET a una API REST para obtener datos.
+    Obtiene las particiones de un dataset parquet que contienen alguno de los registros dados, leyendo solo la columna que los identifica.
 
     Parametros (args):
-        :param url_base (str) ==> URL base de la API.
-        :param endpoint (str) ==> Endpoint (ruta) de la API para obtener datos específicos.
-        :param params   (Python Dict) ==> Parámetros de la solicitud GET.
+        :param path (str) ==> La ruta del dataset parquet.
+        :param claves (Pandas.Series o list) ==> Valores de claveMerge de los registros a buscar.
+        :param claveMerge (str) ==> Campo que identifica a cada registro. Por defecto, 'id'.
 
     Output (returns):
-        :return response_data (JSON str) ==> Datos obtenidos de la API REST, en formato JSON.
+        :return directorios (list) ==> Paths de las particiones que contienen alguno de los registros, sin repetir.
     """
+    archivos = [archivo for directorio, _, _ in os.walk(path) for archivo in listar_archivos_parquet(directorio)]
+    claves = pds.Series(claves).dropna().astype(str).unique()
 
-    try:
+    if not archivos or len(claves) == 0:
+        return []
 
-        ## Se constituye la url del target
-        if((url_base is not None) and (url_base[-1]!='/')):
-            url_endpoint = f"{url_base}/{endpoint}"
-        else: 
-           url_endpoint = f"{url_base}{endpoint}"
+    dataset = ds.dataset(archivos, format="parquet")
+    if claveMerge not in dataset.schema.names:
+        return []
 
-        ## Se realiza la peticion GET a la API
-        response = req.get(url_endpoint, params=params) 
-        # response_url = print(response.url)
-        # response_status_code = response.status_code
-        
-        ## Si se detecta un error (ej. status_code!=200) en la HTTP Response, se lanza una excepcion.
-        response.raise_for_status()
+    directorios = {}
+    for lote in dataset.scanner(columns=[claveMerge], filter=ds.field(claveMerge).isin(pa.array(claves, type=pa.string()))).scan_batches():
+        if lote.record_batch.num_rows > 0:
+            directorios[os.path.normpath(os.path.dirname(lote.fragment.path))] = None
 
-        try:
-            response_data = response.json() 
- 
-        except ValueError as ex:
-            print(f"ERROR! Formato de respuesta inesperado. Asegurese de que se trate de un Dict o Json.\nDetalle del error: {ex}")
-            return None
-        
-        return response_data
+    return list(directorios)
 
-    except req.exceptions.RequestException as ex:
+def listar_archivos_parquet(directorio):
+    """
+    Lista los archivos parquet visibles de un directorio (no incluye los archivos ocultos o temporales, que comienzan con '.' o '_').
 
-        print(f"ERROR al realizar la peticion.\nCódigo de error: {ex}")
-    
-        return None
-    
-    except Exception as ex:
-         
-        print(f"ERROR!: {ex}")
+    Parametros (args):
+        :param directorio (str) ==> El path del directorio.
 
-        return None
+    Output (returns):
+        :return archivos (list) ==> Paths de los archivos, ordenados. Vacio si el directorio no existe.
+    """
+    if not os.path.isdir(directorio):
+        return []
 
-### Métodos de extraccion especifica ### 
+    return sorted(
+        os.path.join(directorio, nombre) for nombre in os.listdir(directorio)
+        if nombre.endswith(".parquet") and not nombre.startswith((".", "_")) and os.path.isfile(os.path.join(directorio, nombre))
+    )
 
-def extraccion_full(url_base, endpoint, params, fieldToExtract=None): 
+def reemplazar_archivos_particion(directorio, df, archivos_previos, filasPorArchivo=None, opcionesParquet=None):
     """
-    Realiza una solicitud GET a una API REST para obtener datos todos los datos sin inportar la fecha de actualización.
+    Escribe el contenido de una particion en nuevos archivos parquet y elimina los archivos previos de la misma (ver reemplazar_particiones).
 
     Parametros (args):
-        :param url_base (str) ==> URL base de la API.
-        :param endpoint (str) ==> Endpoint (ruta) de la API para obtener datos específicos.
-        :param params   (Python Dict) ==> Parámetros de la solicitud GET.
-        :param fieldToExtract (str) ==> Campo que contienen los eventos y/o datos específicos de interés.
+        :param directorio (str) ==> El path de la particion.
+        :param df (Pandas.DataFrame) ==> El contenido completo de la particion (sin las columnas de particionado).
+        :param archivos_previos (list) ==> Paths de los archivos a reemplazar.
+        :param filasPorArchivo (int) ==> Cantidad maxima de filas por archivo. Por defecto, None (un unico archivo).
+        :param opcionesParquet (Dict) ==> Opciones de escritura de los archivos parquet (ver OPCIONES_PARQUET). Por defecto, None (OPCIONES_PARQUET).
 
     Output (returns):
-        :return df_result (Pandas Dataframe) ==> Los datos del campo deseado, en formato de Tabla (DataFrame de Pandas).
-
-    Raises:
-        Exception ==> Si se detectan errores en alguna de las operaciones realizadas.   
+        :return rutas (list) ==> Paths de los nuevos archivos.
     """
-    try:
-        result = get_response_data(url_base, endpoint, params)
-        df_result = extract_response_data_field(result, fieldToExtract)
-    
-    except Exception as ex:
-        print(f"ERROR!: {ex}")
-        raise ex
+    return reemplazar_particiones(raiz_dataset(directorio), {directorio: (df, archivos_previos)}, filasPorArchivo, opcionesParquet)[directorio]
 
-    return df_result ##EXTRACCION FULL EXITOSA => print(df_result.head())
-
-def extraccion_incremental(url_base, endpoint, parameters=None, fieldToExtract=None, deltaHoras=1):
+def reemplazar_particiones(path, particiones, filasPorArchivo=None, opcionesParquet=None):
     """
-    Realiza una extraccion incremental/parcial a partir de un GET a una API dada para obtener datos sólo actualizados.
-    Se basa en la fecha de actualizacion de los eventos a extraer. 
+    Reemplaza el contenido de varias particiones de un dataset parquet: escribe los nuevos archivos y elimina los previos de cada una.
+    Los archivos se escriben primero con un nombre oculto y luego se renombran (operacion atomica), por lo que nunca se lee un archivo incompleto.
+    El reemplazo de todas las particiones se publica en el manifest del dataset en una unica transaccion (ver registrar_archivos_manifest):
+    como los lectores obtienen los archivos a leer solo desde el manifest (ver archivos_a_leer), ven el dataset completo antes o despues del reemplazo,
+    nunca ambas versiones de un registro (ej. uno que cambio de particion) ni ninguna.
 
     Parametros (args):
-        :param url_base (str) ==> URL base de la API.
-        :param endpoint (str) ==> Endpoint (ruta) de la API para obtener datos específicos.
-        :param params (Dict) ==> Parámetros de la solicitud GET.
-        :param fieldToExtract (str) ==> Nombre del campo donde se encuentran los datos de interés.
-        :param deltaHoras (int) ==> Numero que represente la Diferencia de tiempo respecto a hora.
+        :param path (str) ==> El path del dataset.
+        :param particiones (Dict) ==> Por cada path de particion, la tupla (df, archivos_previos) con su contenido completo (sin las columnas de particionado)
+            y los paths de los archivos a reemplazar.
+        :param filasPorArchivo (int) ==> Cantidad maxima de filas por archivo. Por defecto, None (un unico archivo por particion).
+        :param opcionesParquet (Dict) ==> Opciones de escritura de los archivos parquet (ver OPCIONES_PARQUET). Por defecto, None (OPCIONES_PARQUET).
 
     Output (returns):
-        :return df_result (Pandas Dataframe) ==> Datos obtenidos de la API (y/o del campo fieldToExtract de response de la misma), en formato Dataframe. Los eventos será aquellos actualizados en las últimas deltaHoras horas.
+        :return rutas (Dict) ==> Paths de los nuevos archivos, por particion.
+    """
+    rutas = {}
 
-    Raises:
-        Exception ==> Si se detectan errores en alguna de las operaciones realizadas.  
+    for directorio, (df, _) in particiones.items():
+        os.makedirs(directorio, exist_ok=True)
+        df, opciones_escritura = preparar_escritura_parquet(df, opcionesParquet)
+        filas = max(1, filasPorArchivo or len(df))
+        rutas[directorio] = []
 
-    Comentarios: La función podría ser mejorada para recibir un listado de campos fechas a utilizar en la extraccion.
-    """
+        for inicio in range(0, max(len(df), 1), filas):
+            nombre = f"{uuid.uuid4().hex}.parquet"
+            rutaTemporal = os.path.join(directorio, f".tmp-{nombre}")
+            df.iloc[inicio:inicio + filas].to_parquet(rutaTemporal, engine="pyarrow", index=False, **opciones_escritura)
+            rutas[directorio].append((rutaTemporal, os.path.join(directorio, nombre)))
 
-    ## Se calcula un timestamp de hace XXhs para realizar una extraccion
-    start_date = datetime.utcnow() - timedelta(hours=deltaHoras) 
+    for rutaTemporal, ruta in [rutaArchivo for rutasParticion in rutas.values() for rutaArchivo in rutasParticion]:
+        os.replace(rutaTemporal, ruta)
 
-    updatedafter = start_date.strftime("%Y-%m-%dT%H:00:00Z")
+    archivos_previos = [archivo for _, previos in particiones.values() for archivo in previos]
+    registrar_archivos_manifest(path, [ruta for rutasParticion in rutas.values() for _, ruta in rutasParticion], archivos_previos)
 
-    dynamic_parameters = { "updatedafter": f"{updatedafter}"  }
+    for archivo in archivos_previos:
+        try:
+            os.remove(archivo)
+        except FileNotFoundError:
+            pass
 
-    try:
-        params = {**parameters , **dynamic_parameters}
+    return {directorio: [ruta for _, ruta in rutasParticion] for directorio, rutasParticion in rutas.items()}
 
-        result = get_response_data(url_base, endpoint, params)
+def compactar_particiones(path, umbralArchivos=8, bytesObjetivo=128 * 1024 * 1024, ordenarPor="timestamp_measured", opcionesParquet=None):
+    """
+    Compacta los archivos parquet pequeños de cada particion de un datalake en archivos de un tamaño objetivo, ordenados por un campo dado.
+    Solo se procesan las particiones con una cantidad de archivos pequeños (menores a la mitad del tamaño objetivo) mayor o igual al umbral,
+    por lo que puede ejecutarse luego de cada extraccion.
+    Los archivos nuevos se publican antes de eliminar los previos (ver reemplazar_particiones), por lo que puede ejecutarse mientras se leen los datos.
 
-        df_result = extract_response_data_field(result, fieldToExtract)
-    
-    except Exception as ex:
-        print(f"ERROR!: {ex}")
-        raise ex
+    Parametros (args):
+        :param path (str) ==> Path del dataset (o de un directorio que contenga varios datasets).
+        :param umbralArchivos (int) ==> Cantidad minima de archivos de una particion para compactarla. Por defecto, 8.
+        :param bytesObjetivo (int) ==> Tamaño aproximado de cada archivo compactado, en bytes. Por defecto, 128 MB.
+        :param ordenarPor (str) ==> Campo por el cual se ordenan los registros de cada particion. Por defecto, 'timestamp_measured'.
+        :param opcionesParquet (Dict) ==> Opciones de escritura de los archivos parquet (ver OPCIONES_PARQUET). Por defecto, None (OPCIONES_PARQUET).
 
-    return df_result ## EXTRACION INCREMENTAL OK => print(df_result.head())
+    Output (returns):
+        :return compactadas (Dict) ==> Por cada particion compactada, la tupla (cantidad de archivos previos, cantidad de archivos nuevos).
+    """
+    compactadas = {}
 
+    for directorio, _, _ in os.walk(path):
+        ## Solo se consideran los archivos pequeños, para no volver a compactar archivos ya compactados
+        archivos_previos = [archivo for archivo in listar_archivos_parquet(directorio) if os.path.getsize(archivo) < bytesObjetivo / 2]
+        if len(archivos_previos) < max(umbralArchivos, 2):
+            continue
 
-### Funcion principal del Script ### 
+        try:
+            df = leer_archivos_particion(archivos_previos)
+            if ordenarPor in df.columns:
+                df = df.sort_values(ordenarPor, kind="stable", ignore_index=True)
+            elif ordenarPor is not None:
+                print(f"La particion '{directorio}' no tiene el campo '{ordenarPor}': se compacta sin ordenar.")
 
-def main():
+            bytesPorFila = sum(os.path.getsize(archivo) for archivo in archivos_previos) / max(len(df), 1)
+            rutas = reemplazar_archivos_particion(directorio, df, archivos_previos, int(bytesObjetivo // max(bytesPorFila, 1)), {**(opcionesParquet or {}), "ordenarPor": None})
+            compactadas[directorio] = (len(archivos_previos), len(rutas))
+
+        except Exception as ex:
+            print(f"ERROR! No se pudo compactar la particion '{directorio}': {str(ex)}")
+
+    return compactadas
+
+def ruta_manifest(path):
     """
-    Funcion principal del Script para modularizar el código.
-    En la misma se envian la mayor parte de parametros propios de la API en cuestion.
+    Obtiene el path del manifest (catalogo de archivos) de un dataset parquet.
 
     Parametros (args):
-        :param (None)
+        :param path (str) ==> El path del dataset.
 
     Output (returns):
-        :return (None) 
+        :return ruta (str) ==> El path del archivo SQLite del manifest.
     """
+    return os.path.join(path, NOMBRE_MANIFEST)
 
-    aux_nro_consulta = 0; 
-    url_base = "https://earthquake.usgs.gov/fdsnws/event/1/"
+def raiz_dataset(directorio):
+    """
+    Obtiene el path de un dataset parquet a partir del directorio de una de sus particiones (ej. dataset/fecha=2023-01-01/hora=3 ==> dataset).
 
-    endpoints = [ 
-        {"endpoint": "query", "params": {'format': 'geojson', 'latitude':34,'longitude':-118, 'maxradius': 5}, "fieldToExtract": "features"}, 
-        {"endpoint": "count", "params": {'format': 'geojson', 'latitude':34,'longitude':-118, 'maxradius': 5}, "fieldToExtract": None }
-    ]
+    Parametros (args):
+        :param directorio (str) ==> El path de la particion (o del dataset).
 
-    for ep in endpoints:
-        aux_nro_consulta += 1
-        print(f'\n###### Consulta Nro. {aux_nro_consulta} ######\n')
-        try:
+    Output (returns):
+        :return path (str) ==> El path del dataset.
+    """
+    directorio = os.path.normpath(directorio)
 
-            df_extraccion_full=extraccion_full(url_base, ep["endpoint"], ep["params"], ep["fieldToExtract"])
+    while "=" in os.path.basename(directorio):
+        directorio = os.path.dirname(directorio)
 
-            df_extraccion_incremental=extraccion_incremental(url_base, ep["endpoint"], ep["params"], ep["fieldToExtract"], 6)
+    return directorio
 
-            if(ep["endpoint"]=="query"):
-                
-                almacenar_particionado(df_extraccion_full, "Output/datalake/landing/earthquake/Registros/Historial/terremotos-historial.parquet",dateFiledName='properties.time',unitEpoch='ms', tipoParticion='f')
-                print_parquet("Output/datalake/landing/earthquake/Registros/Historial/terremotos-historial.parquet")
+def conectar_manifest(path):
+    """
+    Abre (y crea, si no existe) el manifest de un dataset parquet: una tabla 'archivos' con una fila por archivo del dataset.
 
-                almacenar_particionado(df_extraccion_incremental, "Output/datalake/landing/earthquake/Registros/Latest/ultimos-terremotos.parquet",dateFiledName='properties.time',unitEpoch='ms', tipoParticion='f')
-                print_parquet("Output/datalake/landing/earthquake/Registros/Latest/ultimos-terremotos.parquet")
+    Parametros (args):
+        :param path (str) ==> El path del dataset.
+
+    Output (returns):
+        :return conexion (sqlite3.Connection) ==> La conexion al manifest.
+    """
+    os.makedirs(path, exist_ok=True)
+    conexion = sqlite3.connect(ruta_manifest(path), timeout=30)
+    conexion.execute("""
+        CREATE TABLE IF NOT EXISTS archivos (
+            ruta TEXT PRIMARY KEY,      -- path relativo al dataset
+            particion TEXT,             -- valores de particion (JSON)
+            fecha TEXT,                 -- valor de la particion 'fecha' (si existe)
+            filas INTEGER,
+            bytes INTEGER,
+            tiempo_min TEXT,            -- minimo / maximo de CAMPO_TIEMPO_MANIFEST (ISO 8601)
+            tiempo_max TEXT,
+            escrito_en REAL             -- momento de escritura (epoch)
+        )""")
+    conexion.execute("CREATE INDEX IF NOT EXISTS archivos_fecha ON archivos (fecha)")
+    conexion.execute("CREATE INDEX IF NOT EXISTS archivos_escrito_en ON archivos (escrito_en)")
+    return conexion
+
+def describir_archivo_manifest(path, archivo, metadata=None, campoTiempo=CAMPO_TIEMPO_MANIFEST):
+    """
+    Obtiene la fila del manifest de un archivo parquet, a partir de su path y del footer del archivo.
+
+    Parametros (args):
+        :param path (str) ==> El path del dataset.
+        :param archivo (str) ==> El path del archivo.
+        :param metadata (pyarrow.parquet.FileMetaData) ==> Metadata del archivo, si ya se cuenta con ella (ej. al escribirlo). Por defecto, None (se lee del footer).
+        :param campoTiempo (str) ==> Campo del que se registran el minimo y maximo. Por defecto, CAMPO_TIEMPO_MANIFEST.
+
+    Output (returns):
+        :return fila (tuple) ==> La tupla (ruta, particion, fecha, filas, bytes, tiempo_min, tiempo_max, escrito_en).
+    """
+    ruta = os.path.relpath(archivo, path).replace(os.sep, "/")
+    particion = dict(segmento.split("=", 1) for segmento in ruta.split("/")[:-1] if "=" in segmento)
+    metadata = metadata if metadata is not None else pq.read_metadata(archivo)
+
+    tiempos = []
+    columnas = [metadata.schema.column(i).path for i in range(metadata.num_columns)]
+    if campoTiempo in columnas:
+        indice = columnas.index(campoTiempo)
+        for rowGroup in range(metadata.num_row_groups):
+            estadisticas = metadata.row_group(rowGroup).column(indice).statistics
+            if estadisticas is not None and estadisticas.has_min_max:
+                tiempos += [pds.Timestamp(estadisticas.min).isoformat(), pds.Timestamp(estadisticas.max).isoformat()]
+
+    return (ruta, json.dumps(particion), particion.get("fecha"), metadata.num_rows, os.path.getsize(archivo),
+            min(tiempos) if tiempos else None, max(tiempos) if tiempos else None, os.path.getmtime(archivo))
+
+def registrar_archivos_manifest(path, archivos, eliminados=(), metadatas=None):
+    """
+    Registra en el manifest de un dataset los archivos escritos y da de baja los eliminados, en una unica transaccion
+    (los lectores que planifican desde el manifest ven el reemplazo de forma atomica).
+    Si el manifest no existe, primero se genera a partir de los archivos del dataset (ver reconstruir_manifest).
+    Ante un error, el manifest se elimina para que el proximo lector o escritura lo regenere (ver reconstruir_manifest).
+
+    Parametros (args):
+        :param path (str) ==> El path del dataset.
+        :param archivos (list) ==> Paths de los archivos escritos.
+        :param eliminados (list) ==> Paths de los archivos a dar de baja. Por defecto, ninguno.
+        :param metadatas (Dict) ==> Metadata de los archivos escritos, por path (evita releer sus footers). Por defecto, None.
+
+    Output (returns):
+        :return None ==> Sin retorno
+    """
+    try:
+        if not os.path.exists(ruta_manifest(path)):
+            reconstruir_manifest(path)
+
+        filas = [describir_archivo_manifest(path, archivo, (metadatas or {}).get(archivo)) for archivo in archivos]
+        conexion = conectar_manifest(path)
+        try:
+            with conexion:
+                conexion.executemany("DELETE FROM archivos WHERE ruta = ?", [(os.path.relpath(archivo, path).replace(os.sep, "/"),) for archivo in eliminados])
+                conexion.executemany("INSERT OR REPLACE INTO archivos VALUES (?, ?, ?, ?, ?, ?, ?, ?)", filas)
+        finally:
+            conexion.close()
+
+    except Exception as ex:
+        print(f"ERROR! No se pudo actualizar el manifest del dataset '{path}': {str(ex)}")
+        try:
+            os.remove(ruta_manifest(path))
+        except FileNotFoundError:
+            pass
+
+def reconstruir_manifest(path):
+    """
+    Genera nuevamente el manifest de un dataset parquet, listando sus directorios y leyendo el footer de cada archivo.
+    Se utiliza para datasets escritos antes de contar con manifest, o si el mismo se elimino.
+
+    Parametros (args):
+        :param path (str) ==> El path del dataset.
+
+    Output (returns):
+        :return cantidad (int) ==> Cantidad de archivos registrados.
+    """
+    filas = [describir_archivo_manifest(path, archivo) for directorio, _, _ in os.walk(path) for archivo in listar_archivos_parquet(directorio)]
+
+    conexion = conectar_manifest(path)
+    try:
+        with conexion:
+            conexion.execute("DELETE FROM archivos")
+            conexion.executemany("INSERT INTO archivos VALUES (?, ?, ?, ?, ?, ?, ?, ?)", filas)
+    finally:
+        conexion.close()
+
+    return len(filas)
+
+def leer_manifest(path, fechaDesde=None, fechaHasta=None, escritoDesde=None):
+    """
+    Lee el manifest de un dataset parquet, opcionalmente filtrado por fecha de los datos y/o momento de escritura.
+    Los archivos sin particion 'fecha' se filtran por su rango de tiempo (tiempo_min / tiempo_max).
+
+    Parametros (args):
+        :param path (str) ==> El path del dataset.
+        :param fechaDesde (date o str) ==> Fecha minima (inclusive) de los datos. Por defecto, None (sin limite).
+        :param fechaHasta (date o str) ==> Fecha maxima (inclusive) de los datos. Por defecto, None (sin limite).
+        :param escritoDesde (float o datetime) ==> Solo los archivos escritos luego de este momento (epoch o datetime). Por defecto, None (todos).
+
+    Output (returns):
+        :return df_manifest (Pandas.DataFrame) ==> Una fila por archivo, o None si el dataset no tiene manifest.
+    """
+    if not os.path.isfile(ruta_manifest(path)):
+        return None
+
+    condiciones, valores = [], []
+
+    if fechaDesde is not None:
+        condiciones.append("(fecha >= ? OR (fecha IS NULL AND (tiempo_max IS NULL OR tiempo_max >= ?)))")
+        valores += [str(fechaDesde), str(fechaDesde)]
+    if fechaHasta is not None:
+        fechaLimite = (pds.Timestamp(str(fechaHasta)) + timedelta(days=1)).date().isoformat()
+        condiciones.append("(fecha <= ? OR (fecha IS NULL AND (tiempo_min IS NULL OR tiempo_min < ?)))")
+        valores += [str(fechaHasta), fechaLimite]
+    if escritoDesde is not None:
+        condiciones.append("escrito_en > ?")
+        valores.append(escritoDesde.timestamp() if isinstance(escritoDesde, datetime) else float(escritoDesde))
+
+    consulta = "SELECT * FROM archivos" + (" WHERE " + " AND ".join(condiciones) if condiciones else "") + " ORDER BY ruta"
+
+    conexion = conectar_manifest(path)
+    try:
+        return pds.read_sql_query(consulta, conexion, params=valores)
+    finally:
+        conexion.close()
+
+def planificar_lectura_manifest(path, fechaDesde=None, fechaHasta=None):
+    """
+    Obtiene, desde el manifest, los archivos de un dataset a leer para un rango de fechas, sin listar sus directorios.
+
+    Parametros (args):
+        :param path (str) ==> El path del dataset.
+        :param fechaDesde (date o str) ==> Fecha minima (inclusive). Por defecto, None.
+        :param fechaHasta (date o str) ==> Fecha maxima (inclusive). Por defecto, None.
+
+    Output (returns):
+        :return archivos (list) ==> Paths de los archivos a leer, o None si el dataset no tiene manifest.
+    """
+    df_manifest = leer_manifest(path, fechaDesde, fechaHasta)
+
+    if df_manifest is None:
+        return None
+
+    return [os.path.join(path, *ruta.split("/")) for ruta in df_manifest["ruta"]]
+
+def archivos_nuevos_manifest(path, escritoDesde):
+    """
+    Obtiene los archivos de un dataset escritos luego de un momento dado (ej. la ultima transformacion), con sus particiones.
+
+    Parametros (args):
+        :param path (str) ==> El path del dataset.
+        :param escritoDesde (float o datetime) ==> Momento a partir del cual buscar (epoch o datetime).
+
+    Output (returns):
+        :return df_manifest (Pandas.DataFrame) ==> Una fila por archivo nuevo, o None si el dataset no tiene manifest.
+    """
+    return leer_manifest(path, escritoDesde=escritoDesde)
+
+def preparar_escritura_parquet(df, opcionesParquet=None):
+    """
+    Prepara un DataFrame para su escritura en formato parquet segun las opciones dadas: lo ordena, convierte a categoricas
+    las columnas a codificar como diccionario, y obtiene los parametros de escritura de pyarrow.
+
+    Parametros (args):
+        :param df (Pandas.DataFrame) ==> El DataFrame a escribir.
+        :param opcionesParquet (Dict) ==> Opciones de escritura (mismas claves que OPCIONES_PARQUET). Las claves omitidas toman el valor de OPCIONES_PARQUET.
+
+    Output (returns):
+        :return (tuple) ==> La tupla (df, opciones_escritura) con el DataFrame preparado y los parametros a enviar a to_parquet.
+    """
+    opciones = {**OPCIONES_PARQUET, **(opcionesParquet or {})}
+
+    ordenarPor = [col for col in (opciones["ordenarPor"] or []) if col in df.columns]
+    if ordenarPor:
+        df = df.sort_values(ordenarPor, kind="stable", ignore_index=True)
+
+    columnasDiccionario = [col for col in (opciones["columnasDiccionario"] or []) if col in df.columns and not isinstance(df[col].dtype, pds.CategoricalDtype)]
+    if columnasDiccionario:
+        df = df.astype({col: "category" for col in columnasDiccionario})
+
+    opciones_escritura = {"compression": opciones["compresion"], "write_statistics": True}
+    if opciones["nivelCompresion"] is not None:
+        opciones_escritura["compression_level"] = opciones["nivelCompresion"]
+    if opciones["filasPorRowGroup"] is not None:
+        opciones_escritura["row_group_size"] = opciones["filasPorRowGroup"]
+
+    return df, opciones_escritura
+
+def reporte_parquet(path):
+    """
+    Obtiene un reporte del almacenamiento de un dataset parquet: por cada archivo, su particion, cantidad de filas, row groups, tamaño y codec.
+
+    Parametros (args):
+        :param path (str) ==> El path del dataset (o de un archivo parquet).
+
+    Output (returns):
+        :return df_reporte (Pandas.DataFrame) ==> Una fila por archivo, con las columnas particion, archivo, filas, row_groups, bytes y compresion.
+    """
+    archivos = [path] if os.path.isfile(path) else [archivo for directorio, _, _ in os.walk(path) for archivo in listar_archivos_parquet(directorio)]
+    filas = []
+
+    for archivo in archivos:
+        metadata = pq.ParquetFile(archivo).metadata
+        filas.append({
+            "particion": os.path.relpath(os.path.dirname(archivo), path) if os.path.isdir(path) else ".",
+            "archivo": os.path.basename(archivo),
+            "filas": metadata.num_rows,
+            "row_groups": metadata.num_row_groups,
+            "bytes": os.path.getsize(archivo),
+            "compresion": metadata.row_group(0).column(0).compression if metadata.num_row_groups > 0 and metadata.num_columns > 0 else None,
+        })
+
+    return pds.DataFrame(filas, columns=["particion", "archivo", "filas", "row_groups", "bytes", "compresion"])
+
+def print_parquet(path):
+    """
+    Imprime un archivo parquet en caso de que exista.
+
+    Parametros (args):
+        :param path (str) ==>  El path con el nombre del archivo a leer
+    
+    Output (returns):
+        :return None ==> Sin retorno. La salida es la impresion por pantalla del contenido del archivo "parquet".
+    """
+    print(read_parquet(path))
+
+def read_parquet(path, fechaDesde=None, fechaHasta=None, columnas=None, magnitudMinima=None, filtros=None, bbox=None, tamanioCelda=TAMANIO_CELDA_GRADOS):
+    """
+    Lee un archivo parquet en caso de que exista.
+    Los filtros se aplican durante la lectura: los de fecha descartan directorios de particion completos,
+    y los de valores (ej. magnitud minima) descartan row groups segun sus estadisticas min/max.
+    Los archivos a leer se obtienen del manifest del dataset, sin listar sus directorios (ver archivos_a_leer).
+
+    Parametros (args):
+        :param path (str) ==>  El path con el nombre del archivo a leer
+        :param fechaDesde (date o str) ==> Fecha minima (inclusive) de la particion 'fecha' a leer. Por defecto, None (sin limite).
+        :param fechaHasta (date o str) ==> Fecha maxima (inclusive) de la particion 'fecha' a leer. Por defecto, None (sin limite).
+        :param columnas (list) ==> Columnas a leer. Por defecto, None (todas).
+        :param magnitudMinima (float) ==> Magnitud minima ('properties.mag') de los eventos a leer. Por defecto, None (sin limite).
+        :param filtros (list) ==> Otros filtros, como tuplas (columna, operador, valor) (ej. ('properties.type', '==', 'earthquake')). Por defecto, None.
+        :param bbox (tuple) ==> Area a leer, como (lonMin, latMin, lonMax, latMax). Si el dataset esta particionado por celda, solo se leen las celdas que la intersectan. Por defecto, None.
+        :param tamanioCelda (float) ==> Tamaño en grados de las celdas del particionado espacial. Por defecto, TAMANIO_CELDA_GRADOS.
+    
+    Output (returns):
+        :return df (Pandas Dataframe) ==> Los datos leidos, en formato de Tabla (DataFrame de Pandas).
+    """
+    if bbox is not None:
+        filtros = list(filtros or []) + filtros_bbox(bbox, tamanioCelda, "celda_lat" in columnas_particion_dataset(path))
+
+    condiciones = construir_filtros(fechaDesde, fechaHasta, magnitudMinima, filtros)
+
+    if os.path.exists(path):
+        ## Si una compactacion o merge elimina un archivo durante la lectura, se vuelve a planificar la lectura
+        for intento in range(3):
+            try:
+                return pds.read_parquet(archivos_a_leer(path, fechaDesde, fechaHasta), engine="pyarrow", columns=columnas, filters=condiciones or None, read_dictionary=COLUMNAS_CATEGORICAS)
+            except OSError:
+                if intento == 2:
+                    raise
+    else:
+        print("\nEl archivo o path deseado es inexistente.")
+
+def iterar_lotes_parquet(path, columnas=None, filasPorLote=100000, fechaDesde=None, fechaHasta=None, magnitudMinima=None, filtros=None):
+    """
+    Lee un dataset parquet por lotes de tamaño acotado, sin cargarlo completo en memoria: se lee un archivo y un lote por vez
+    (sin lectura anticipada), por lo que la memoria utilizada depende del tamaño del lote y no del tamaño del dataset.
+    Los lotes de archivos pequeños se agrupan hasta alcanzar filasPorLote. Aplica los mismos filtros que read_parquet.
+
+    Parametros (args):
+        :param path (str) ==> El path del dataset a leer.
+        :param columnas (list) ==> Columnas a leer. Por defecto, None (todas).
+        :param filasPorLote (int) ==> Cantidad maxima de filas de cada lote. Por defecto, 100000.
+        :param fechaDesde (date o str) ==> Fecha minima (inclusive) de la particion 'fecha'. Por defecto, None.
+        :param fechaHasta (date o str) ==> Fecha maxima (inclusive) de la particion 'fecha'. Por defecto, None.
+        :param magnitudMinima (float) ==> Magnitud minima ('properties.mag'). Por defecto, None.
+        :param filtros (list) ==> Otros filtros, como tuplas (columna, operador, valor). Por defecto, None.
+
+    Output (returns):
+        :return lotes (generator) ==> Generador de DataFrames de Pandas, uno por lote (no genera lotes vacios).
+    """
+    if not os.path.exists(path):
+        print("\nEl archivo o path deseado es inexistente.")
+        return
+
+    condiciones = construir_filtros(fechaDesde, fechaHasta, magnitudMinima, filtros)
+    origen = archivos_a_leer(path, fechaDesde, fechaHasta)
+
+    dataset = ds.dataset(
+        origen,
+        format=ds.ParquetFileFormat(read_options={"dictionary_columns": COLUMNAS_CATEGORICAS}),
+        partitioning=ds.HivePartitioning.discover(infer_dictionary=True),
+        partition_base_dir=path if isinstance(origen, list) else None
+    )
+
+    pendientes, filasPendientes = [], 0
+
+    for lote in dataset.to_batches(columns=columnas, filter=pq.filters_to_expression(condiciones) if condiciones else None, batch_size=filasPorLote, batch_readahead=1, fragment_readahead=1, use_threads=False):
+        if lote.num_rows > 0:
+            pendientes.append(lote)
+            filasPendientes += lote.num_rows
+
+        if filasPendientes >= filasPorLote:
+            yield pa.Table.from_batches(pendientes).to_pandas()
+            pendientes, filasPendientes = [], 0
+
+    if filasPendientes > 0:
+        yield pa.Table.from_batches(pendientes).to_pandas()
+
+def archivos_a_leer(path, fechaDesde=None, fechaHasta=None):
+    """
+    Obtiene lo que se debe enviar a pyarrow para leer un dataset: la lista de archivos del rango de fechas segun el manifest
+    (sin listar directorios ni leer footers de archivos descartados). Es la unica forma de lectura de los datasets: los directorios pueden contener,
+    durante un reemplazo, archivos nuevos aun no publicados o previos ya dados de baja (ver reemplazar_particiones).
+    Si el dataset no tiene manifest (ej. escrito por una version previa), primero se genera.
+
+    Parametros (args):
+        :param path (str) ==> El path del dataset (o de un archivo parquet).
+        :param fechaDesde (date o str) ==> Fecha minima (inclusive). Por defecto, None.
+        :param fechaHasta (date o str) ==> Fecha maxima (inclusive). Por defecto, None.
+
+    Output (returns):
+        :return origen (str o list) ==> La lista de archivos a leer, o el path recibido si es un archivo o un dataset sin archivos.
+    """
+    if not os.path.isdir(path):
+        return path
+
+    if not os.path.isfile(ruta_manifest(path)):
+        reconstruir_manifest(path)
+
+    ## Sin archivos en el rango, se leen todos para obtener el esquema del dataset (los filtros descartan todas las filas)
+    archivos = planificar_lectura_manifest(path, fechaDesde, fechaHasta) or planificar_lectura_manifest(path)
+
+    return archivos if archivos else path
+
+def construir_filtros(fechaDesde=None, fechaHasta=None, magnitudMinima=None, filtros=None):
+    """
+    Construye la lista de filtros de lectura de un dataset parquet (formato de filtros de pyarrow).
+
+    Parametros (args):
+        :param fechaDesde (date o str) ==> Fecha minima (inclusive) de la particion 'fecha'. Por defecto, None.
+        :param fechaHasta (date o str) ==> Fecha maxima (inclusive) de la particion 'fecha'. Por defecto, None.
+        :param magnitudMinima (float) ==> Magnitud minima ('properties.mag'). Por defecto, None.
+        :param filtros (list) ==> Otros filtros, como tuplas (columna, operador, valor). Por defecto, None.
+
+    Output (returns):
+        :return condiciones (list) ==> Lista de tuplas (columna, operador, valor). Vacia si no hay filtros.
+    """
+    condiciones = list(filtros or [])
+
+    if fechaDesde is not None:
+        condiciones.append(("fecha", ">=", str(fechaDesde)))
+    if fechaHasta is not None:
+        condiciones.append(("fecha", "<=", str(fechaHasta)))
+    if magnitudMinima is not None:
+        condiciones.append(("properties.mag", ">=", magnitudMinima))
+
+    return condiciones
+
+### Cliente HTTP ### 
+
+def crear_sesion_http(config=None):
+    """
+    Crea una sesion HTTP con pool de conexiones (keep-alive) y reintentos con backoff exponencial.
+    Los reintentos respetan el header Retry-After enviado por el servidor.
+
+    Parametros (args):
+        :param config (Dict) ==> Configuracion del cliente (mismas claves que CONFIG_HTTP). Por defecto, CONFIG_HTTP.
+
+    Output (returns):
+        :return sesion (requests.Session) ==> La sesion HTTP configurada.
+    """
+    config = config or CONFIG_HTTP
+
+    reintentos = Retry(
+        total=config["reintentos"],
+        backoff_factor=config["backoffFactor"],
+        backoff_jitter=config["backoffJitter"],
+        backoff_max=config["backoffMax"],
+        status_forcelist=config["statusReintentables"],
+        allowed_methods=["GET"],
+        respect_retry_after_header=True
+    )
+    adapter = HTTPAdapter(pool_connections=config["poolConexiones"], pool_maxsize=config["poolMaxsize"], max_retries=reintentos)
+
+    sesion = req.Session()
+    sesion.mount("https://", adapter)
+    sesion.mount("http://", adapter)
+
+    return sesion
+
+def get_sesion_http():
+    """
+    Obtiene la sesion HTTP compartida por todas las extracciones. La crea en el primer uso.
+
+    Parametros (args):
+        :param (None)
+
+    Output (returns):
+        :return sesion (requests.Session) ==> La sesion HTTP compartida.
+    """
+    global sesion_http
+
+    with lock_sesion_http:
+        if sesion_http is None:
+            sesion_http = crear_sesion_http(CONFIG_HTTP)
+
+    return sesion_http
+
+def configurar_cliente_http(**opciones):
+    """
+    Modifica la configuracion del cliente HTTP compartido. La sesion actual se cierra y se vuelve a crear en el proximo uso.
+
+    Parametros (args):
+        :param opciones ==> Claves de CONFIG_HTTP a modificar (ej. timeout=(5, 30), reintentos=3, poolMaxsize=32).
+
+    Output (returns):
+        :return None ==> Sin retorno
+
+    Raises:
+        KeyError ==> Si se indica una opcion inexistente.
+    """
+    global sesion_http
+
+    for clave in opciones:
+        if clave not in CONFIG_HTTP:
+            raise KeyError(f"Opcion de cliente HTTP inexistente: '{clave}'.")
+
+    with lock_sesion_http:
+        CONFIG_HTTP.update(opciones)
+        if sesion_http is not None:
+            sesion_http.close()
+        sesion_http = None
+
+### Métodos de Consulta ### 
+
+def construir_url(url_base, endpoint):
+    """
+    Construye la url de un endpoint a partir de la URL base de la API.
+
+    Parametros (args):
+        :param url_base (str) ==> URL base de la API.
+        :param endpoint (str) ==> Endpoint (ruta) de la API.
+
+    Output (returns):
+        :return url_endpoint (str) ==> La url completa del endpoint.
+    """
+    if((url_base is not None) and (url_base[-1]!='/')):
+        return f"{url_base}/{endpoint}"
+    return f"{url_base}{endpoint}"
+
+def get_response_data(url_base, endpoint, params=None):
+    """
+    Realiza una solicitud GET a una API REST para obtener datos.
+    Utiliza la sesion HTTP compartida (ver get_sesion_http), que reutiliza conexiones y reintenta ante errores transitorios.
+
+    Parametros (args):
+        :param url_base (str) ==> URL base de la API.
+        :param endpoint (str) ==> Endpoint (ruta) de la API para obtener datos específicos.
+        :param params   (Python Dict) ==> Parámetros de la solicitud GET.
+
+    Output (returns):
+        :return response_data (JSON str) ==> Datos obtenidos de la API REST, en formato JSON.
+    """
+
+    try:
+
+        ## Se constituye la url del target
+        url_endpoint = construir_url(url_base, endpoint)
+
+        ## Si el cache esta habilitado y la respuesta guardada no expiro, no se realiza la peticion
+        entrada_cache = None
+        if CONFIG_CACHE["habilitado"]:
+            clave = clave_cache(url_endpoint, params)
+            entrada_cache = leer_cache(clave)
+            if entrada_cache is not None and not cache_expirado(entrada_cache, endpoint):
+                return entrada_cache["data"]
+
+        ## Se realiza la peticion GET a la API
+        response = get_sesion_http().get(url_endpoint, params=params, timeout=CONFIG_HTTP["timeout"], headers=headers_revalidacion(entrada_cache))
+        # response_url = print(response.url)
+        # response_status_code = response.status_code
+
+        ## La respuesta guardada sigue vigente segun el servidor (ETag / Last-Modified)
+        if response.status_code == 304 and entrada_cache is not None:
+            entrada_cache["guardado"] = time.time()
+            guardar_cache(clave, entrada_cache)
+            return entrada_cache["data"]
+        
+        ## Si se detecta un error (ej. status_code!=200) en la HTTP Response, se lanza una excepcion.
+        response.raise_for_status()
+
+        try:
+            response_data = response.json() 
+ 
+        except ValueError as ex:
+            print(f"ERROR! Formato de respuesta inesperado. Asegurese de que se trate de un Dict o Json.\nDetalle del error: {ex}")
+            return None
+
+        if CONFIG_CACHE["habilitado"]:
+            guardar_cache(clave, {
+                "url": url_endpoint,
+                "params": params,
+                "guardado": time.time(),
+                "etag": response.headers.get("ETag"),
+                "lastModified": response.headers.get("Last-Modified"),
+                "data": response_data
+            })
+        
+        return response_data
+
+    except req.exceptions.RequestException as ex:
+
+        print(f"ERROR al realizar la peticion.\nCódigo de error: {ex}")
+    
+        return None
+    
+    except Exception as ex:
+         
+        print(f"ERROR!: {ex}")
+
+        return None
+
+### Cache de respuestas en disco ### 
+
+def configurar_cache(**opciones):
+    """
+    Modifica la configuracion del cache en disco de respuestas de la API (ej. configurar_cache(habilitado=True)).
+
+    Parametros (args):
+        :param opciones ==> Claves de CONFIG_CACHE a modificar (ej. habilitado=True, ttlSegundos={"query": 600}, maxBytes=1024**3).
+
+    Output (returns):
+        :return None ==> Sin retorno
+
+    Raises:
+        KeyError ==> Si se indica una opcion inexistente.
+    """
+    for clave in opciones:
+        if clave not in CONFIG_CACHE:
+            raise KeyError(f"Opcion de cache inexistente: '{clave}'.")
+
+    CONFIG_CACHE.update(opciones)
+
+def clave_cache(url_endpoint, params):
+    """
+    Obtiene la clave de cache de una peticion, a partir de su url y sus parametros en forma canonica (ordenados y como texto).
+
+    Parametros (args):
+        :param url_endpoint (str) ==> Url completa del endpoint.
+        :param params (Dict) ==> Parámetros de la solicitud GET.
+
+    Output (returns):
+        :return clave (str) ==> Hash SHA-256 (hexadecimal) de la peticion.
+    """
+    params_canonicos = sorted((str(k), str(v)) for k, v in (params or {}).items())
+    return hashlib.sha256(json.dumps([url_endpoint, params_canonicos]).encode("utf-8")).hexdigest()
+
+def ruta_cache(clave):
+    """
+    Obtiene el path del archivo de cache de una clave dada.
+
+    Parametros (args):
+        :param clave (str) ==> Clave de cache (ver clave_cache).
+
+    Output (returns):
+        :return ruta (str) ==> Path del archivo comprimido de la entrada.
+    """
+    return os.path.join(CONFIG_CACHE["directorio"], f"{clave}.json.gz")
+
+def leer_cache(clave):
+    """
+    Lee una entrada del cache y la marca como usada recientemente.
+
+    Parametros (args):
+        :param clave (str) ==> Clave de cache (ver clave_cache).
+
+    Output (returns):
+        :return entrada (Dict) ==> La entrada guardada (claves: url, params, guardado, etag, lastModified, data), o None si no existe o no se puede leer.
+    """
+    ruta = ruta_cache(clave)
+
+    try:
+        with gzip.open(ruta, "rt", encoding="utf-8") as archivo:
+            entrada = json.load(archivo)
+        os.utime(ruta)
+    except (OSError, ValueError):
+        return None
+
+    return entrada
+
+def guardar_cache(clave, entrada):
+    """
+    Guarda una entrada en el cache (comprimida con gzip) y elimina las entradas menos usadas si se supera el tamaño maximo.
+
+    Parametros (args):
+        :param clave (str) ==> Clave de cache (ver clave_cache).
+        :param entrada (Dict) ==> Entrada a guardar.
+
+    Output (returns):
+        :return None ==> Sin retorno
+    """
+    ruta = ruta_cache(clave)
+    crear_directorio(ruta)
+
+    rutaTemporal = f"{ruta}.{threading.get_ident()}.tmp"
+    with gzip.open(rutaTemporal, "wt", encoding="utf-8") as archivo:
+        json.dump(entrada, archivo)
+    os.replace(rutaTemporal, ruta)
+
+    evictar_cache(CONFIG_CACHE["maxBytes"])
+
+def evictar_cache(maxBytes):
+    """
+    Elimina las entradas del cache usadas hace mas tiempo (LRU) hasta que el tamaño total no supere el maximo dado.
+
+    Parametros (args):
+        :param maxBytes (int) ==> Tamaño maximo del cache, en bytes.
+
+    Output (returns):
+        :return None ==> Sin retorno
+    """
+    with lock_cache:
+        archivos = []
+        with os.scandir(CONFIG_CACHE["directorio"]) as entradas:
+            for entrada in entradas:
+                if entrada.name.endswith(".json.gz"):
+                    info = entrada.stat()
+                    archivos.append((info.st_mtime, info.st_size, entrada.path))
+
+        total = sum(tamanio for _, tamanio, _ in archivos)
+
+        for _, tamanio, ruta in sorted(archivos):
+            if total <= maxBytes:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                pass
+            total -= tamanio
+
+def cache_expirado(entrada, endpoint):
+    """
+    Evalua si una entrada del cache supero el TTL configurado para su endpoint.
+
+    Parametros (args):
+        :param entrada (Dict) ==> Entrada del cache.
+        :param endpoint (str) ==> Endpoint (ruta) de la API.
+
+    Output (returns):
+        :return True (Boolean) ==> Si la entrada expiro.
+        :return False (Boolean) ==> Si la entrada sigue vigente.
+    """
+    ttl = CONFIG_CACHE["ttlSegundos"].get(endpoint, CONFIG_CACHE["ttlDefecto"])
+    return time.time() - entrada["guardado"] > ttl
+
+def headers_revalidacion(entrada):
+    """
+    Obtiene los headers de revalidacion condicional (If-None-Match / If-Modified-Since) de una entrada del cache.
+
+    Parametros (args):
+        :param entrada (Dict) ==> Entrada del cache, o None.
+
+    Output (returns):
+        :return headers (Dict) ==> Headers a enviar en la peticion. Vacio si no hay entrada o el servidor no envio ETag ni Last-Modified.
+    """
+    headers = {}
+
+    if entrada is not None:
+        if entrada.get("etag"):
+            headers["If-None-Match"] = entrada["etag"]
+        if entrada.get("lastModified"):
+            headers["If-Modified-Since"] = entrada["lastModified"]
+
+    return headers
+
+### Métodos de extraccion en streaming ### 
+
+def get_response_stream(url_base, endpoint, params=None):
+    """
+    Realiza una solicitud GET a una API REST sin descargar el cuerpo de la respuesta, para poder leerlo por partes.
+
+    Parametros (args):
+        :param url_base (str) ==> URL base de la API.
+        :param endpoint (str) ==> Endpoint (ruta) de la API para obtener datos específicos.
+        :param params   (Python Dict) ==> Parámetros de la solicitud GET.
+
+    Output (returns):
+        :return response (requests.Response) ==> Respuesta HTTP abierta. Debe cerrarse luego de leerla.
+
+    Raises:
+        requests.exceptions.RequestException ==> Si se produce un error en la peticion o la respuesta tiene un status de error.
+    """
+    response = get_sesion_http().get(construir_url(url_base, endpoint), params=params, timeout=CONFIG_HTTP["timeout"], stream=True)
+
+    try:
+        response.raise_for_status()
+    except req.exceptions.RequestException:
+        response.close()
+        raise
+
+    return response
+
+def iterar_elementos_json_stream(chunks, fieldToExtract="features"):
+    """
+    Recorre de forma incremental los elementos de un array JSON contenido en un campo dado, a partir de los fragmentos (bytes) de la respuesta.
+    Solo se mantiene en memoria el fragmento actual y el elemento en curso, nunca el documento completo.
+
+    Parametros (args):
+        :param chunks (iterable de bytes) ==> Fragmentos consecutivos del documento JSON (ej. response.iter_content()).
+        :param fieldToExtract (str) ==> Nombre del campo que contiene el array de elementos. Por defecto, 'features'.
+
+    Output (returns):
+        :return (generator de Dict) ==> Cada uno de los elementos del array.
+
+    Raises:
+        ValueError ==> Si el documento termina antes de cerrar el array.
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    clave = f'"{fieldToExtract}"'
+    buffer = ""
+    enArray = False
+
+    for chunk in chunks:
+        buffer += utf8.decode(chunk)
+
+        ## Se busca el inicio del array: "fieldToExtract": [
+        while not enArray:
+            pos = buffer.find(clave)
+            if pos < 0:
+                buffer = buffer[-len(clave):]
+                break
+
+            resto = buffer[pos + len(clave):].lstrip()
+            if not resto or (resto[0] == ":" and not resto[1:].lstrip()):
+                buffer = buffer[pos:]
+                break
+
+            if resto[0] == ":" and resto[1:].lstrip()[0] == "[":
+                buffer = resto[1:].lstrip()[1:]
+                enArray = True
+            else:
+                buffer = resto
+
+        ## Se decodifican los elementos completos que haya en el buffer
+        while enArray:
+            buffer = buffer.lstrip().lstrip(",").lstrip()
+            if not buffer:
+                break
+            if buffer[0] == "]":
+                return
+            try:
+                elemento, fin = decoder.raw_decode(buffer)
+            except json.JSONDecodeError:
+                break
+            yield elemento
+            buffer = buffer[fin:]
+
+    if enArray:
+        raise ValueError(f"El array '{fieldToExtract}' de la respuesta se encuentra incompleto.")
+
+def iterar_lotes(elementos, tamanioLote):
+    """
+    Agrupa los elementos de un iterable en lotes de tamaño fijo.
+
+    Parametros (args):
+        :param elementos (iterable) ==> Elementos a agrupar.
+        :param tamanioLote (int) ==> Cantidad de elementos por lote. El ultimo lote puede ser menor.
+
+    Output (returns):
+        :return (generator de list) ==> Cada uno de los lotes.
+    """
+    lote = []
+    for elemento in elementos:
+        lote.append(elemento)
+        if len(lote) >= tamanioLote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+def extraccion_full_streaming(url_base, endpoint, params, path, fieldToExtract="features", tamanioLote=5000, dateFiledName='properties.time', unitEpoch='ms', tipoParticion='f', chunkBytes=65536, formato="pandas"):
+    """
+    Realiza una extraccion full leyendo la respuesta de la API por partes, y almacena los eventos en formato parquet en lotes de tamaño fijo.
+    La memoria utilizada depende del tamaño del lote y no del tamaño total de la respuesta.
+
+    Parametros (args):
+        :param url_base (str) ==> URL base de la API.
+        :param endpoint (str) ==> Endpoint (ruta) de la API para obtener datos específicos.
+        :param params   (Python Dict) ==> Parámetros de la solicitud GET.
+        :param path (str) ==> Path del directorio donde almacenar los archivos parquet.
+        :param fieldToExtract (str) ==> Campo que contiene el array de eventos. Por defecto, 'features'.
+        :param tamanioLote (int) ==> Cantidad de eventos por lote almacenado. Por defecto, 5000.
+        :param dateFiledName (str) ==> Nombre del campo de fecha a normalizar. Por defecto, 'properties.time'.
+        :param unitEpoch (str) ==> Unidad del campo de fecha en epoch. Por defecto, 'ms'.
+        :param tipoParticion (str) ==> Tipo de particionado a realizar (ver almacenar_particionado). Por defecto, 'f'.
+        :param chunkBytes (int) ==> Tamaño de cada fragmento leido de la respuesta, en bytes. Por defecto, 65536.
+        :param formato (str) ==> 'pandas' construye cada lote como DataFrame; 'arrow' lo construye y almacena como tabla de Arrow. Por defecto, 'pandas'.
+
+    Output (returns):
+        :return cantEventos (int) ==> Cantidad total de eventos almacenados.
+
+    Raises:
+        Exception ==> Si se detectan errores en alguna de las operaciones realizadas.
+    """
+    cantEventos = 0
+
+    try:
+        response = get_response_stream(url_base, endpoint, params)
+
+        with response:
+            elementos = iterar_elementos_json_stream(response.iter_content(chunk_size=chunkBytes), fieldToExtract)
+
+            for lote in iterar_lotes(elementos, tamanioLote):
+                if formato == "arrow":
+                    almacenar_particionado_arrow(create_arrow_table(lote), path, dateFiledName=dateFiledName, unitEpoch=unitEpoch, tipoParticion=tipoParticion)
+                else:
+                    almacenar_particionado(create_table(lote), path, dateFiledName=dateFiledName, unitEpoch=unitEpoch, tipoParticion=tipoParticion)
+                cantEventos += len(lote)
+
+    except Exception as ex:
+        print(f"ERROR!: {ex}")
+        raise ex
+
+    return cantEventos
+
+### Métodos del modo Arrow (sin conversiones a Pandas) ### 
+
+def tipo_arrow(tipo):
+    """
+    Obtiene el tipo de dato de Arrow equivalente a un tipo de dato del esquema de Pandas (ver ESQUEMA_PROPERTIES_USGS).
+
+    Parametros (args):
+        :param tipo (str) ==> Tipo de dato de Pandas, o None.
+
+    Output (returns):
+        :return tipo (pyarrow.DataType) ==> Tipo de dato de Arrow, o None para inferirlo.
+    """
+    if tipo in ("int64", "Int64"):
+        return pa.int64()
+    if tipo == "float64":
+        return pa.float64()
+    if tipo == "category":
+        return pa.dictionary(pa.int32(), pa.string())
+    return None
+
+def columna_arrow(valores, tipo):
+    """
+    Construye una columna (Array de Arrow) con un tipo de dato dado.
+
+    Parametros (args):
+        :param valores (list) ==> Valores de la columna.
+        :param tipo (pyarrow.DataType) ==> Tipo de dato de la columna, o None para inferirlo.
+
+    Output (returns):
+        :return array (pyarrow.Array) ==> La columna con el tipo de dato indicado.
+    """
+    if tipo is not None and pa.types.is_dictionary(tipo):
+        return pa.array(valores, type=pa.string()).dictionary_encode()
+    return pa.array(valores, type=tipo)
+
+def create_arrow_table(features, esquema=ESQUEMA_PROPERTIES_USGS):
+    """
+    Construye una tabla de Arrow a partir de una lista de eventos (features) GeoJSON, con las mismas columnas y tipos que aplanar_features_geojson.
+
+    Parametros (args):
+        :param features (list) ==> Lista de eventos GeoJSON.
+        :param esquema (Dict) ==> Tipo de dato de cada campo 'properties'. Por defecto, ESQUEMA_PROPERTIES_USGS.
+
+    Output (returns):
+        :return tabla (pyarrow.Table) ==> Una tabla de Arrow con una fila por evento.
+    """
+    properties = [f.get("properties") or {} for f in features]
+    geometrias = [f.get("geometry") or {} for f in features]
+    coordenadas = [(g.get("coordinates") or []) + [None, None, None] for g in geometrias]
+
+    columnas = {
+        "type": columna_arrow([f.get("type") for f in features], tipo_arrow("category")),
+        "id": columna_arrow([f.get("id") for f in features], pa.string()),
+    }
+
+    extras = set().union(*properties).difference(esquema)
+    for campo, tipo in list(esquema.items()) + [(campo, None) for campo in sorted(extras)]:
+        columnas[f"properties.{campo}"] = columna_arrow([p.get(campo) for p in properties], tipo_arrow(tipo) if tipo is not None else (pa.string() if campo in esquema else None))
+
+    columnas["geometry.type"] = columna_arrow([g.get("type") for g in geometrias], tipo_arrow("category"))
+    columnas["geometry.longitude"] = columna_arrow([c[0] for c in coordenadas], pa.float64())
+    columnas["geometry.latitude"] = columna_arrow([c[1] for c in coordenadas], pa.float64())
+    columnas["geometry.depth"] = columna_arrow([c[2] for c in coordenadas], pa.float64())
+
+    return pa.table(columnas)
+
+def normalize_date_arrow(tabla, fecha=None, dateFiledName='properties.time', unitEpoch='ms'):
+    """
+    Version Arrow de normalize_date: agrega las columnas 'timestamp_measured', 'fecha' y 'hora' utilizando funciones de pyarrow.compute.
+
+    Parametros (args):
+        :param tabla (pyarrow.Table) ==> Tabla donde se encuentra el campo a normalizar.
+        :param fecha (Datetime) ==> Fecha a utilizar en caso de que la tabla no cuente con el campo debido. Por defecto, None.
+        :param dateFiledName (str) ==> Nombre del campo de fecha (epoch) a normalizar. Por defecto, 'properties.time'.
+        :param unitEpoch (str) ==> Unidad del campo de fecha en epoch (ej. 's'=segundos, 'ms'=milisegundos). Por defecto 'ms'.
+
+    Output (returns):
+        :return tabla (pyarrow.Table) ==> Una nueva tabla con los campos de fecha normalizados.
+    """
+    if fecha is None:
+        timestamp = pc.cast(tabla[dateFiledName], pa.timestamp(unitEpoch))
+    else:
+        timestamp = pa.array([fecha] * tabla.num_rows, type=pa.timestamp("us"))
+
+    for nombre, columna in [("timestamp_measured", timestamp), ("fecha", pc.cast(timestamp, pa.date32())), ("hora", pc.hour(timestamp))]:
+        if nombre in tabla.column_names:
+            tabla = tabla.drop_columns([nombre])
+        tabla = tabla.append_column(nombre, columna)
+
+    return tabla
+
+def almacenar_particionado_arrow(tabla, path, fecha=None, dateFiledName='properties.time', unitEpoch='ms', tipoParticion="fyh", opcionesParquet=None, tamanioCelda=TAMANIO_CELDA_GRADOS):
+    """
+    Version Arrow de almacenar_particionado: almacena una tabla de Arrow en formato parquet, particionada por fecha y/o hora, sin convertirla a Pandas.
+
+    Parametros (args):
+        :param tabla (pyarrow.Table) ==> Tabla que contiene las columnas a almacenar.
+        :param path (str) ==> Path del directorio donde almacenar los archivos parquet.
+        :param fecha (Datetime) ==> Fecha a colocar en caso de no contar con la misma como dato.
+        :param dateFiledName (str) ==> Nombre del campo de fecha a normalizar. Por defecto, 'properties.time'.
+        :param unitEpoch (str) ==> Unidad del campo de fecha en epoch. Por defecto 'ms'.
+        :param tipoParticion (str) ==> Tipo de particionado a realizar (ver columnas_particion). Por defecto, fecha y hora (fyh).
+        :param opcionesParquet (Dict) ==> Opciones de escritura de los archivos parquet (ver OPCIONES_PARQUET). Por defecto, None (OPCIONES_PARQUET).
+        :param tamanioCelda (float) ==> Tamaño en grados de las celdas del particionado espacial. Por defecto, TAMANIO_CELDA_GRADOS.
+
+    Output (returns):
+        :return None ==> Sin retorno
+
+    Raises:
+        Exception ==> Si no se pudieron almacenar los datos.
+    """
+    try:
+        tabla = normalize_date_arrow(tabla, fecha, dateFiledName, unitEpoch)
+        if "g" in tipoParticion:
+            tabla = agregar_celda_espacial_arrow(tabla, tamanioCelda)
+        tabla, opciones_escritura = preparar_escritura_parquet_arrow(tabla, opcionesParquet)
+        escritos = {}
+        partition_cols = columnas_particion(tipoParticion)
+        ## pyarrow rechaza por defecto las tablas de mas de 1024 particiones (ver df_to_parquet)
+        cantParticiones = tabla.group_by(partition_cols).aggregate([]).num_rows
+        pq.write_to_dataset(tabla, path, partition_cols=partition_cols, file_visitor=lambda archivo: escritos.update({archivo.path: archivo.metadata}), max_partitions=max(cantParticiones, 1024), **opciones_escritura)
+        registrar_archivos_manifest(path, list(escritos), metadatas=escritos)
+        print("Tabla Arrow guardada exitosamente en formato Parquet.")
+    except Exception as e:
+        print(f"Error al guardar la tabla Arrow en formato Parquet: {str(e)}")
+        raise e
+
+def agregar_celda_espacial_arrow(tabla, tamanioCelda=TAMANIO_CELDA_GRADOS):
+    """
+    Version Arrow de agregar_celda_espacial (requiere las columnas geometry.latitude y geometry.longitude).
+
+    Parametros (args):
+        :param tabla (pyarrow.Table) ==> Tabla con las coordenadas de los eventos.
+        :param tamanioCelda (float) ==> Tamaño de las celdas, en grados. Por defecto, TAMANIO_CELDA_GRADOS.
+
+    Output (returns):
+        :return tabla (pyarrow.Table) ==> Una nueva tabla con las columnas 'celda_lat' y 'celda_lon'.
+    """
+    for nombre, origen in [("celda_lat", "geometry.latitude"), ("celda_lon", "geometry.longitude")]:
+        celda = pc.fill_null(pc.cast(pc.floor(pc.divide(tabla[origen], tamanioCelda)), pa.int64()), CELDA_SIN_COORDENADAS)
+        if nombre in tabla.column_names:
+            tabla = tabla.drop_columns([nombre])
+        tabla = tabla.append_column(nombre, celda)
+
+    return tabla
+
+def preparar_escritura_parquet_arrow(tabla, opcionesParquet=None):
+    """
+    Version Arrow de preparar_escritura_parquet.
+
+    Parametros (args):
+        :param tabla (pyarrow.Table) ==> La tabla a escribir.
+        :param opcionesParquet (Dict) ==> Opciones de escritura (mismas claves que OPCIONES_PARQUET). Las claves omitidas toman el valor de OPCIONES_PARQUET.
+
+    Output (returns):
+        :return (tuple) ==> La tupla (tabla, opciones_escritura) con la tabla preparada y los parametros a enviar a pyarrow.
+    """
+    opciones = {**OPCIONES_PARQUET, **(opcionesParquet or {})}
+
+    ordenarPor = [col for col in (opciones["ordenarPor"] or []) if col in tabla.column_names]
+    if ordenarPor:
+        tabla = tabla.sort_by([(col, "ascending") for col in ordenarPor])
+
+    for col in opciones["columnasDiccionario"] or []:
+        if col in tabla.column_names and not pa.types.is_dictionary(tabla.schema.field(col).type):
+            tabla = tabla.set_column(tabla.schema.get_field_index(col), col, pc.dictionary_encode(tabla[col]))
+
+    _, opciones_escritura = preparar_escritura_parquet(pds.DataFrame(), opciones)
+
+    return tabla, opciones_escritura
+
+def read_parquet_arrow(path, fechaDesde=None, fechaHasta=None, columnas=None, magnitudMinima=None, filtros=None, bbox=None, tamanioCelda=TAMANIO_CELDA_GRADOS):
+    """
+    Version Arrow de read_parquet: lee un dataset parquet como tabla de Arrow, aplicando los filtros durante la lectura.
+
+    Parametros (args):
+        :param path (str) ==> El path del dataset a leer.
+        :param fechaDesde (date o str) ==> Fecha minima (inclusive) de la particion 'fecha'. Por defecto, None.
+        :param fechaHasta (date o str) ==> Fecha maxima (inclusive) de la particion 'fecha'. Por defecto, None.
+        :param columnas (list) ==> Columnas a leer. Por defecto, None (todas).
+        :param magnitudMinima (float) ==> Magnitud minima ('properties.mag'). Por defecto, None.
+        :param filtros (list) ==> Otros filtros, como tuplas (columna, operador, valor). Por defecto, None.
+        :param bbox (tuple) ==> Area a leer, como (lonMin, latMin, lonMax, latMax) (ver read_parquet). Por defecto, None.
+        :param tamanioCelda (float) ==> Tamaño en grados de las celdas del particionado espacial. Por defecto, TAMANIO_CELDA_GRADOS.
+
+    Output (returns):
+        :return tabla (pyarrow.Table) ==> Los datos leidos, o None si el path no existe.
+    """
+    if not os.path.exists(path):
+        print("\nEl archivo o path deseado es inexistente.")
+        return None
+
+    if bbox is not None:
+        filtros = list(filtros or []) + filtros_bbox(bbox, tamanioCelda, "celda_lat" in columnas_particion_dataset(path))
+
+    condiciones = construir_filtros(fechaDesde, fechaHasta, magnitudMinima, filtros)
+
+    for intento in range(3):
+        try:
+            return pq.read_table(archivos_a_leer(path, fechaDesde, fechaHasta), columns=columnas, filters=condiciones or None, read_dictionary=COLUMNAS_CATEGORICAS)
+        except OSError:
+            if intento == 2:
+                raise
+
+def extraccion_full_arrow(url_base, endpoint, params, fieldToExtract="features"):
+    """
+    Version Arrow de extraccion_full: obtiene los eventos de la API como tabla de Arrow.
+
+    Parametros (args):
+        :param url_base (str) ==> URL base de la API.
+        :param endpoint (str) ==> Endpoint (ruta) de la API para obtener datos específicos.
+        :param params   (Python Dict) ==> Parámetros de la solicitud GET.
+        :param fieldToExtract (str) ==> Campo que contiene la lista de eventos. Por defecto, 'features'.
+
+    Output (returns):
+        :return tabla (pyarrow.Table) ==> Los eventos obtenidos, en formato de tabla de Arrow.
+
+    Raises:
+        Exception ==> Si se detectan errores en alguna de las operaciones realizadas.
+    """
+    try:
+        result = get_response_data(url_base, endpoint, params)
+        tabla = create_arrow_table(result[fieldToExtract])
+
+    except Exception as ex:
+        print(f"ERROR!: {ex}")
+        raise ex
+
+    return tabla
+
+### Métodos de extraccion especifica ### 
+
+def extraccion_full(url_base, endpoint, params, fieldToExtract=None): 
+    """
+    Realiza una solicitud GET a una API REST para obtener datos todos los datos sin inportar la fecha de actualización.
+
+    Parametros (args):
+        :param url_base (str) ==> URL base de la API.
+        :param endpoint (str) ==> Endpoint (ruta) de la API para obtener datos específicos.
+        :param params   (Python Dict) ==> Parámetros de la solicitud GET.
+        :param fieldToExtract (str) ==> Campo que contienen los eventos y/o datos específicos de interés.
+
+    Output (returns):
+        :return df_result (Pandas Dataframe) ==> Los datos del campo deseado, en formato de Tabla (DataFrame de Pandas).
+
+    Raises:
+        Exception ==> Si se detectan errores en alguna de las operaciones realizadas.   
+    """
+    try:
+        result = get_response_data(url_base, endpoint, params)
+        df_result = extract_response_data_field(result, fieldToExtract)
+    
+    except Exception as ex:
+        print(f"ERROR!: {ex}")
+        raise ex
+
+    return df_result ##EXTRACCION FULL EXITOSA => print(df_result.head())
+
+def extraccion_incremental(url_base, endpoint, parameters=None, fieldToExtract=None, deltaHoras=1, rutaCheckpoint=None):
+    """
+    Realiza una extraccion incremental/parcial a partir de un GET a una API dada para obtener datos sólo actualizados.
+    Se basa en la fecha de actualizacion de los eventos a extraer. 
+    Si se indica un archivo de checkpoints y el mismo tiene registrada una fecha para el endpoint y parametros dados, solo se extraen los eventos actualizados luego de la misma.
+    El checkpoint no se actualiza en esta funcion: debe registrarse con registrar_checkpoint una vez almacenados los datos.
+
+    Parametros (args):
+        :param url_base (str) ==> URL base de la API.
+        :param endpoint (str) ==> Endpoint (ruta) de la API para obtener datos específicos.
+        :param params (Dict) ==> Parámetros de la solicitud GET.
+        :param fieldToExtract (str) ==> Nombre del campo donde se encuentran los datos de interés.
+        :param deltaHoras (int) ==> Numero que represente la Diferencia de tiempo respecto a hora. Se utiliza si no hay un checkpoint registrado.
+        :param rutaCheckpoint (str) ==> Path del archivo de checkpoints. Por defecto, None (no se utilizan checkpoints).
+
+    Output (returns):
+        :return df_result (Pandas Dataframe) ==> Datos obtenidos de la API (y/o del campo fieldToExtract de response de la misma), en formato Dataframe. Los eventos será aquellos actualizados luego del checkpoint, o en las últimas deltaHoras horas.
+
+    Raises:
+        Exception ==> Si se detectan errores en alguna de las operaciones realizadas.  
+
+    Comentarios: La función podría ser mejorada para recibir un listado de campos fechas a utilizar en la extraccion.
+    """
+
+    updatedafter = calcular_updatedafter(endpoint, parameters, deltaHoras, rutaCheckpoint)
+
+    dynamic_parameters = { "updatedafter": f"{updatedafter}"  }
+
+    try:
+        params = {**parameters , **dynamic_parameters}
+
+        result = get_response_data(url_base, endpoint, params)
+
+        df_result = extract_response_data_field(result, fieldToExtract)
+    
+    except Exception as ex:
+        print(f"ERROR!: {ex}")
+        raise ex
+
+    return df_result ## EXTRACION INCREMENTAL OK => print(df_result.head())
+
+def calcular_updatedafter(endpoint, params, deltaHoras=1, rutaCheckpoint=None):
+    """
+    Calcula la fecha a partir de la cual se extraen los eventos actualizados (parametro 'updatedafter' de la API).
+
+    Parametros (args):
+        :param endpoint (str) ==> Endpoint (ruta) de la API.
+        :param params (Dict) ==> Parámetros de la solicitud GET.
+        :param deltaHoras (int) ==> Diferencia de tiempo respecto a la hora actual, si no hay un checkpoint registrado. Por defecto, 1.
+        :param rutaCheckpoint (str) ==> Path del archivo de checkpoints. Por defecto, None.
+
+    Output (returns):
+        :return updatedafter (str) ==> La fecha del checkpoint (con milisegundos) o la de hace deltaHoras horas (redondeada a la hora), en formato ISO8601.
+    """
+    checkpoint = leer_checkpoint(rutaCheckpoint, endpoint, params) if rutaCheckpoint is not None else None
+
+    if checkpoint is not None:
+        return datetime.utcfromtimestamp(checkpoint / 1000).strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+    ## Se calcula un timestamp de hace XXhs para realizar una extraccion
+    start_date = datetime.utcnow() - timedelta(hours=deltaHoras) 
+
+    return start_date.strftime("%Y-%m-%dT%H:00:00Z")
+
+### Checkpoints de extraccion incremental ### 
+
+def clave_checkpoint(endpoint, params):
+    """
+    Obtiene la clave con la que se registra el checkpoint de un endpoint y sus parametros.
+
+    Parametros (args):
+        :param endpoint (str) ==> Endpoint (ruta) de la API.
+        :param params (Dict) ==> Parámetros de la solicitud GET. Se ignoran los parametros de fecha que agrega la extraccion.
+
+    Output (returns):
+        :return clave (str) ==> La clave del checkpoint.
+    """
+    params = {k: v for k, v in (params or {}).items() if k not in ("updatedafter", "starttime", "endtime")}
+    return f"{endpoint}?{json.dumps(params, sort_keys=True, default=str)}"
+
+def leer_checkpoints(rutaCheckpoint):
+    """
+    Lee todos los checkpoints registrados en un archivo.
+
+    Parametros (args):
+        :param rutaCheckpoint (str) ==> Path del archivo de checkpoints.
+
+    Output (returns):
+        :return checkpoints (Dict) ==> Los checkpoints registrados (clave ==> fecha epoch en milisegundos). Vacio si el archivo no existe.
+    """
+    if not os.path.exists(rutaCheckpoint):
+        return {}
+
+    with open(rutaCheckpoint, "r", encoding="utf-8") as archivo:
+        return json.load(archivo)
+
+def leer_checkpoint(rutaCheckpoint, endpoint, params):
+    """
+    Lee el checkpoint registrado para un endpoint y sus parametros.
+
+    Parametros (args):
+        :param rutaCheckpoint (str) ==> Path del archivo de checkpoints.
+        :param endpoint (str) ==> Endpoint (ruta) de la API.
+        :param params (Dict) ==> Parámetros de la solicitud GET.
 
-            if(ep["endpoint"]=="count"):     
-                
-                almacenar_particionado(df_extraccion_full, "Output/datalake/landing/earthquake/Cantidad/cant-ult-30dias.parquet", fecha=datetime.utcnow(), tipoParticion='f')
-                print_parquet("Output/datalake/landing/earthquake/Cantidad/cant-ult-30dias.parquet")
-                
-                almacenar_particionado(df_extraccion_incremental, "Output/datalake/landing/earthquake/Cantidad/cant-actualizados-ult-6hs.parquet", fecha=datetime.utcnow(), tipoParticion='f')
-                print_parquet("Output/datalake/landing/earthquake/Cantidad/cant-actualizados-ult-6hs.parquet")
+    Output (returns):
+        :return checkpoint (int) ==> La maxima fecha de actualizacion registrada (epoch en milisegundos), o None si no hay registro.
+    """
+    with lock_checkpoints:
+        return leer_checkpoints(rutaCheckpoint).get(clave_checkpoint(endpoint, params))
+
+def registrar_checkpoint(rutaCheckpoint, endpoint, params, df, campoVersion="properties.updated"):
+    """
+    Registra como checkpoint la maxima fecha de actualizacion de los eventos extraidos, si es posterior a la ya registrada.
+    Debe invocarse luego de almacenar los datos, para no perder eventos si el almacenamiento falla. El archivo se reemplaza de forma atomica.
+
+    Parametros (args):
+        :param rutaCheckpoint (str) ==> Path del archivo de checkpoints.
+        :param endpoint (str) ==> Endpoint (ruta) de la API.
+        :param params (Dict) ==> Parámetros de la solicitud GET.
+        :param df (Pandas.DataFrame) ==> Eventos extraidos.
+        :param campoVersion (str) ==> Campo con la fecha de actualizacion (epoch en milisegundos). Por defecto, 'properties.updated'.
+
+    Output (returns):
+        :return checkpoint (int) ==> El checkpoint registrado, o None si los datos no tienen el campo o estan vacios.
+    """
+    if not isDataframe(df) or campoVersion not in df.columns or df[campoVersion].dropna().empty:
+        return None
+
+    clave = clave_checkpoint(endpoint, params)
+    maximo = int(df[campoVersion].max())
+
+    with lock_checkpoints:
+        checkpoints = leer_checkpoints(rutaCheckpoint)
+        checkpoints[clave] = max(maximo, checkpoints.get(clave, maximo))
+
+        crear_directorio(rutaCheckpoint)
+        rutaTemporal = f"{rutaCheckpoint}.tmp"
+        with open(rutaTemporal, "w", encoding="utf-8") as archivo:
+            json.dump(checkpoints, archivo, indent=2, sort_keys=True)
+        os.replace(rutaTemporal, rutaCheckpoint)
+
+    return checkpoints[clave]
+
+
+### Métodos de extraccion full por ventanas de tiempo ### 
+
+def parse_fecha_parametro(valor):
+    """
+    Convierte el valor de un parametro de fecha de la API (ISO8601) a Datetime.
+
+    Parametros (args):
+        :param valor (str o Datetime) ==> Fecha en formato ISO8601 (ej. '2023-01-01' o '2023-01-01T00:00:00Z') o Datetime.
+
+    Output (returns):
+        :return fecha (Datetime) ==> La fecha convertida, sin zona horaria (UTC). Las fechas con zona horaria se convierten previamente a UTC.
+    """
+    fecha = valor if isinstance(valor, datetime) else datetime.fromisoformat(str(valor).replace("Z", "+00:00"))
+
+    if fecha.tzinfo is not None:
+        fecha = fecha.astimezone(timezone.utc)
+
+    return fecha.replace(tzinfo=None)
+
+def generar_ventanas_tiempo(starttime, endtime, cantVentanas=1):
+    """
+    Divide un rango de tiempo en ventanas contiguas de igual duracion.
+
+    Parametros (args):
+        :param starttime (Datetime) ==> Inicio del rango de tiempo.
+        :param endtime (Datetime) ==> Fin del rango de tiempo.
+        :param cantVentanas (int) ==> Cantidad de ventanas a generar. Por defecto, 1.
+
+    Output (returns):
+        :return ventanas (list) ==> Lista de tuplas (inicio, fin) ordenadas en el tiempo.
+    """
+    cantVentanas = max(1, int(cantVentanas))
+    duracion = (endtime - starttime) / cantVentanas
+    ventanas = []
+
+    for i in range(cantVentanas):
+        inicio = starttime + duracion * i
+        fin = endtime if i == cantVentanas - 1 else starttime + duracion * (i + 1)
+        ventanas.append((inicio, fin))
+
+    return ventanas
+
+def estimar_cant_ventanas(url_base, params, starttime, endtime, limiteEventos=LIMITE_EVENTOS_USGS, ocupacionVentana=0.5):
+    """
+    Estima la cantidad de ventanas necesarias para un rango de tiempo, consultando el endpoint 'count' de la API.
+
+    Parametros (args):
+        :param url_base (str) ==> URL base de la API.
+        :param params (Dict) ==> Parámetros de la solicitud GET (sin starttime/endtime).
+        :param starttime (Datetime) ==> Inicio del rango de tiempo.
+        :param endtime (Datetime) ==> Fin del rango de tiempo.
+        :param limiteEventos (int) ==> Cantidad maxima de eventos por peticion. Por defecto, LIMITE_EVENTOS_USGS.
+        :param ocupacionVentana (float) ==> Fraccion del limite que se busca ocupar en cada ventana. Por defecto, 0.5.
+
+    Output (returns):
+        :return cantVentanas (int) ==> Cantidad de ventanas estimada. Si no se puede obtener el conteo, 1.
+    """
+    params_count = {**params, "format": "geojson", "starttime": starttime.strftime("%Y-%m-%dT%H:%M:%S"), "endtime": endtime.strftime("%Y-%m-%dT%H:%M:%S")}
+    result = get_response_data(url_base, "count", params_count)
+
+    if not isDict(result) or result.get("count") is None:
+        return 1
+
+    return max(1, math.ceil(result["count"] / (limiteEventos * ocupacionVentana)))
+
+def extraer_ventana(url_base, endpoint, params, fieldToExtract, inicio, fin, limiteEventos=LIMITE_EVENTOS_USGS, minutosMinimos=60):
+    """
+    Extrae los eventos de una ventana de tiempo. Si la ventana falla o alcanza el limite de eventos de la API, se divide a la mitad y se extrae cada mitad.
+
+    Parametros (args):
+        :param url_base (str) ==> URL base de la API.
+        :param endpoint (str) ==> Endpoint (ruta) de la API para obtener datos específicos.
+        :param params (Dict) ==> Parámetros de la solicitud GET (sin starttime/endtime).
+        :param fieldToExtract (str) ==> Campo que contienen los eventos y/o datos específicos de interés.
+        :param inicio (Datetime) ==> Inicio de la ventana.
+        :param fin (Datetime) ==> Fin de la ventana.
+        :param limiteEventos (int) ==> Cantidad maxima de eventos por peticion. Por defecto, LIMITE_EVENTOS_USGS.
+        :param minutosMinimos (int) ==> Duracion minima de una ventana. Por debajo de la misma no se sigue dividiendo. Por defecto, 60.
+
+    Output (returns):
+        :return df_result (Pandas Dataframe) ==> Los eventos de la ventana, en formato de Tabla (DataFrame de Pandas).
+
+    Raises:
+        ValueError ==> Si no se pudieron obtener los datos de una ventana de duracion minima.
+    """
+    params_ventana = {**params, "starttime": inicio.strftime("%Y-%m-%dT%H:%M:%S"), "endtime": fin.strftime("%Y-%m-%dT%H:%M:%S")}
+    result = get_response_data(url_base, endpoint, params_ventana)
+
+    desborda = result is None or (fieldToExtract is not None and len(result.get(fieldToExtract) or []) >= limiteEventos)
+
+    if desborda and (fin - inicio) > timedelta(minutes=minutosMinimos):
+        medio = inicio + (fin - inicio) / 2
+        return concatenar_dataframes([
+            extraer_ventana(url_base, endpoint, params, fieldToExtract, inicio, medio, limiteEventos, minutosMinimos),
+            extraer_ventana(url_base, endpoint, params, fieldToExtract, medio, fin, limiteEventos, minutosMinimos)
+        ])
+
+    if result is None:
+        raise ValueError(f"No se pudieron obtener los datos de la ventana {params_ventana['starttime']} - {params_ventana['endtime']}.")
+
+    return extract_response_data_field(result, fieldToExtract)
+
+def concatenar_dataframes(dfs):
+    """
+    Concatena DataFrames conservando como categoricas las columnas que lo son en alguno de ellos
+    (pds.concat las convierte a texto cuando las categorias de cada DataFrame difieren).
+
+    Parametros (args):
+        :param dfs (list) ==> Los DataFrames a concatenar.
+
+    Output (returns):
+        :return df (Pandas.DataFrame) ==> Un nuevo DataFrame con las filas de todos ellos.
+    """
+    categoricas = {col for df in dfs for col in df.columns if isinstance(df[col].dtype, pds.CategoricalDtype)}
+    df = pds.concat(dfs, ignore_index=True)
+
+    return df.astype({col: "category" for col in categoricas if not isinstance(df[col].dtype, pds.CategoricalDtype)})
+
+def deduplicar_eventos(df, campoId="id", campoVersion="properties.updated"):
+    """
+    Elimina los eventos repetidos de un DataFrame, conservando la version mas reciente de cada uno.
+
+    Parametros (args):
+        :param df (Pandas.DataFrame) ==> DataFrame con los eventos.
+        :param campoId (str) ==> Campo que identifica a cada evento. Por defecto, 'id'.
+        :param campoVersion (str) ==> Campo con la fecha de actualizacion del evento. Por defecto, 'properties.updated'.
+
+    Output (returns):
+        :return df (Pandas.DataFrame) ==> DataFrame sin eventos repetidos. Las versiones sin fecha de actualizacion (nulas) solo se conservan si el evento no tiene otra.
+    """
+    if campoId not in df.columns:
+        return df
+
+    if campoVersion in df.columns:
+        df = df.sort_values(campoVersion, kind="stable", na_position="first")
+
+    return df.drop_duplicates(subset=[campoId], keep="last").reset_index(drop=True)
+
+def extraccion_full_paralela(url_base, endpoint, params, fieldToExtract=None, cantVentanas=None, maxWorkers=4, limiteEventos=LIMITE_EVENTOS_USGS):
+    """
+    Realiza una extraccion full dividiendo el rango starttime/endtime de los parametros en ventanas de tiempo, que se consultan en paralelo.
+    Los resultados de todas las ventanas se unen en un unico DataFrame sin eventos repetidos (segun el campo 'id').
+
+    Parametros (args):
+        :param url_base (str) ==> URL base de la API.
+        :param endpoint (str) ==> Endpoint (ruta) de la API para obtener datos específicos.
+        :param params (Python Dict) ==> Parámetros de la solicitud GET. Si no se indica starttime, se consideran los ultimos 30 dias (igual que la API).
+        :param fieldToExtract (str) ==> Campo que contienen los eventos y/o datos específicos de interés.
+        :param cantVentanas (int) ==> Cantidad de ventanas en que se divide el rango. Por defecto None: primero se consulta el rango completo en una unica peticion
+            y, solo si la API la rechaza o alcanza su limite de eventos, se estima segun el endpoint 'count' de la API.
+        :param maxWorkers (int) ==> Cantidad maxima de peticiones simultaneas. Por defecto, 4.
+        :param limiteEventos (int) ==> Cantidad maxima de eventos por peticion. Por defecto, LIMITE_EVENTOS_USGS.
+
+    Output (returns):
+        :return df_result (Pandas Dataframe) ==> Los datos del campo deseado, en formato de Tabla (DataFrame de Pandas).
+
+    Raises:
+        Exception ==> Si se detectan errores en alguna de las operaciones realizadas.
+    """
+    try:
+        params = dict(params or {})
+        endtime = parse_fecha_parametro(params.pop("endtime")) if "endtime" in params else datetime.utcnow()
+        starttime = parse_fecha_parametro(params.pop("starttime")) if "starttime" in params else endtime - timedelta(days=30)
+
+        if cantVentanas is None:
+            ## Si el rango entra en una unica peticion, se evita la consulta al endpoint 'count' (la API rechaza rapidamente las que superan su limite)
+            result = get_response_data(url_base, endpoint, {**params, "starttime": starttime.strftime("%Y-%m-%dT%H:%M:%S"), "endtime": endtime.strftime("%Y-%m-%dT%H:%M:%S")})
+            if result is not None and (fieldToExtract is None or len(result.get(fieldToExtract) or []) < limiteEventos):
+                return deduplicar_eventos(extract_response_data_field(result, fieldToExtract))
+
+            cantVentanas = estimar_cant_ventanas(url_base, params, starttime, endtime, limiteEventos)
+
+        ventanas = generar_ventanas_tiempo(starttime, endtime, cantVentanas)
+
+        with ThreadPoolExecutor(max_workers=maxWorkers) as executor:
+            futuros = [executor.submit(extraer_ventana, url_base, endpoint, params, fieldToExtract, inicio, fin, limiteEventos) for inicio, fin in ventanas]
+            resultados = [futuro.result() for futuro in futuros]
+
+        df_result = deduplicar_eventos(concatenar_dataframes(resultados))
+
+    except Exception as ex:
+        print(f"ERROR!: {ex}")
+        raise ex
+
+    return df_result
+
+### Métodos de extraccion asincronica ### 
+
+async def extraccion_full_async(url_base, endpoint, params, fieldToExtract=None, paralelo=False, semaforo=None):
+    """
+    Version asincronica de extraccion_full (o de extraccion_full_paralela si paralelo=True).
+    La peticion se ejecuta en un hilo aparte, por lo que no bloquea al event loop.
+
+    Parametros (args):
+        :param url_base (str) ==> URL base de la API.
+        :param endpoint (str) ==> Endpoint (ruta) de la API para obtener datos específicos.
+        :param params   (Python Dict) ==> Parámetros de la solicitud GET.
+        :param fieldToExtract (str) ==> Campo que contienen los eventos y/o datos específicos de interés.
+        :param paralelo (bool) ==> Indica si se realiza la extraccion por ventanas de tiempo en paralelo. Por defecto, False.
+        :param semaforo (asyncio.Semaphore) ==> Semaforo que limita la cantidad de extracciones simultaneas. Por defecto, None (sin limite).
+
+    Output (returns):
+        :return df_result (Pandas Dataframe) ==> Los datos del campo deseado, en formato de Tabla (DataFrame de Pandas).
+    """
+    funcion = extraccion_full_paralela if paralelo else extraccion_full
+
+    if semaforo is None:
+        return await asyncio.to_thread(funcion, url_base, endpoint, params, fieldToExtract)
+
+    async with semaforo:
+        return await asyncio.to_thread(funcion, url_base, endpoint, params, fieldToExtract)
+
+async def extraccion_incremental_async(url_base, endpoint, parameters=None, fieldToExtract=None, deltaHoras=1, semaforo=None, rutaCheckpoint=None):
+    """
+    Version asincronica de extraccion_incremental.
+    La peticion se ejecuta en un hilo aparte, por lo que no bloquea al event loop.
+
+    Parametros (args):
+        :param url_base (str) ==> URL base de la API.
+        :param endpoint (str) ==> Endpoint (ruta) de la API para obtener datos específicos.
+        :param parameters (Dict) ==> Parámetros de la solicitud GET.
+        :param fieldToExtract (str) ==> Nombre del campo donde se encuentran los datos de interés.
+        :param deltaHoras (int) ==> Numero que represente la Diferencia de tiempo respecto a hora.
+        :param semaforo (asyncio.Semaphore) ==> Semaforo que limita la cantidad de extracciones simultaneas. Por defecto, None (sin limite).
+        :param rutaCheckpoint (str) ==> Path del archivo de checkpoints. Por defecto, None (no se utilizan checkpoints).
+
+    Output (returns):
+        :return df_result (Pandas Dataframe) ==> Los eventos actualizados luego del checkpoint, o en las últimas deltaHoras horas, en formato Dataframe.
+    """
+    if semaforo is None:
+        return await asyncio.to_thread(extraccion_incremental, url_base, endpoint, parameters, fieldToExtract, deltaHoras, rutaCheckpoint)
 
+    async with semaforo:
+        return await asyncio.to_thread(extraccion_incremental, url_base, endpoint, parameters, fieldToExtract, deltaHoras, rutaCheckpoint)
+
+async def ejecutar_tarea_extraccion(url_base, tarea, semaforo=None):
+    """
+    Ejecuta una tarea de extraccion (full o incremental) de forma asincronica.
+
+    Parametros (args):
+        :param url_base (str) ==> URL base de la API.
+        :param tarea (Dict) ==> Tarea a ejecutar. Claves: endpoint, params, fieldToExtract, tipo ('full' o 'incremental'), y opcionalmente paralelo, deltaHoras y rutaCheckpoint.
+        :param semaforo (asyncio.Semaphore) ==> Semaforo que limita la cantidad de extracciones simultaneas. Por defecto, None (sin limite).
+
+    Output (returns):
+        :return (tuple) ==> La tupla (tarea, df_result, error). Si la extraccion fallo, df_result es None y error contiene la excepcion.
+    """
+    try:
+        if tarea["tipo"] == "incremental":
+            df_result = await extraccion_incremental_async(url_base, tarea["endpoint"], tarea["params"], tarea["fieldToExtract"], tarea.get("deltaHoras", 1), semaforo, tarea.get("rutaCheckpoint"))
+        else:
+            df_result = await extraccion_full_async(url_base, tarea["endpoint"], tarea["params"], tarea["fieldToExtract"], tarea.get("paralelo", False), semaforo)
+    except Exception as ex:
+        return tarea, None, ex
+
+    return tarea, df_result, None
+
+async def ejecutar_extracciones_async(url_base, tareas, maxConcurrencia=4, alCompletar=None, derivarLocalmente=False):
+    """
+    Ejecuta un conjunto de tareas de extraccion de forma concurrente, con un limite de extracciones simultaneas.
+    A medida que cada tarea finaliza, su resultado se entrega a la funcion 'alCompletar' (ej. para almacenarlo).
+    Si derivarLocalmente=True, las tareas que pueden resolverse a partir del resultado de otra (ver planificar_consultas) no se consultan a la API,
+    salvo que la tarea de origen falle.
+
+    Parametros (args):
+        :param url_base (str) ==> URL base de la API.
+        :param tareas (list) ==> Lista de tareas de extraccion (ver ejecutar_tarea_extraccion).
+        :param maxConcurrencia (int) ==> Cantidad maxima de extracciones simultaneas. Por defecto, 4.
+        :param alCompletar (function) ==> Funcion invocada como alCompletar(tarea, df_result) por cada tarea finalizada con exito. Por defecto, None.
+        :param derivarLocalmente (bool) ==> Indica si se resuelven localmente las tareas derivables. Por defecto, False.
+
+    Output (returns):
+        :return resultados (list) ==> Lista de tuplas (tarea, df_result, error), en orden de finalizacion. error contiene la excepcion
+            de la extraccion o, si la extraccion finalizo con exito, la de 'alCompletar' (ej. un almacenamiento fallido); None si ambas finalizaron con exito.
+    """
+    semaforo = asyncio.Semaphore(maxConcurrencia)
+    resultados = []
+
+    remotas, derivadas = planificar_consultas(tareas) if derivarLocalmente else (tareas, [])
+
+    for futuro in asyncio.as_completed([ejecutar_tarea_extraccion(url_base, tarea, semaforo) for tarea in remotas]):
+        tarea, df_result, error = await futuro
+
+        ## Las tareas derivadas se resuelven antes de entregar el resultado de origen, que puede ser modificado al almacenarlo
+        resueltas = [] if error is not None else resolver_derivadas(tarea, df_result, derivadas)
+
+        for tarea_resuelta, df_resuelto in [(tarea, df_result)] + resueltas:
+            resultados.append((tarea_resuelta, df_resuelto, entregar_resultado(tarea_resuelta, df_resuelto, error, alCompletar)))
+
+    ## Las tareas derivadas cuyo origen (o su derivacion) fallo se consultan a la API
+    pendientes = [derivada for derivada in derivadas if not any(tarea is derivada for tarea, _, _ in resultados)]
+
+    for futuro in asyncio.as_completed([ejecutar_tarea_extraccion(url_base, tarea, semaforo) for tarea in pendientes]):
+        tarea, df_result, error = await futuro
+        resultados.append((tarea, df_result, entregar_resultado(tarea, df_result, error, alCompletar)))
+
+    return resultados
+
+def resolver_derivadas(tarea, df_result, derivadas):
+    """
+    Resuelve localmente las tareas derivadas de una tarea de origen (ver derivar_resultado). Un error en una derivacion
+    solo afecta a esa tarea: se informa y la tarea no se resuelve (por lo que luego se consulta a la API).
+
+    Parametros (args):
+        :param tarea (Dict) ==> Tarea de origen, finalizada con exito.
+        :param df_result (Pandas.DataFrame) ==> Resultado de la tarea de origen.
+        :param derivadas (list) ==> Tareas derivadas (ver planificar_consultas).
+
+    Output (returns):
+        :return resueltas (list) ==> Lista de tuplas (tarea derivada, df_result) de las derivaciones exitosas.
+    """
+    resueltas = []
+
+    for derivada in derivadas:
+        if derivada["origen"] is not tarea:
+            continue
+        try:
+            resueltas.append((derivada, derivar_resultado(derivada, df_result)))
+        except Exception as ex:
+            print(f"ERROR! No se pudo derivar localmente la extraccion '{derivada['tipo']}' del endpoint '{derivada['endpoint']}' (se consulta a la API): {str(ex)}")
+
+    return resueltas
+
+def entregar_resultado(tarea, df_result, error, alCompletar=None):
+    """
+    Entrega el resultado de una tarea de extraccion a la funcion 'alCompletar', o informa el error de la misma.
+
+    Parametros (args):
+        :param tarea (Dict) ==> Tarea de extraccion.
+        :param df_result (Pandas.DataFrame) ==> Resultado de la tarea, o None si fallo.
+        :param error (Exception) ==> Error de la tarea, o None si finalizo con exito.
+        :param alCompletar (function) ==> Funcion invocada como alCompletar(tarea, df_result). Por defecto, None.
+
+    Output (returns):
+        :return error (Exception) ==> El error de la tarea o, si finalizo con exito, el de 'alCompletar'. None si ambas finalizaron con exito.
+    """
+    if error is not None:
+        print(f"ERROR! No se pudo concluir la extraccion '{tarea['tipo']}' del endpoint '{tarea['endpoint']}': {str(error)}")
+        return error
+
+    if alCompletar is not None:
+        try:
+            alCompletar(tarea, df_result)
         except Exception as ex:
-            print(f"ERROR! No se pudo concluir la operacion en base al endpoint solicitado: {str(ex)}")
+            print(f"ERROR! No se pudo procesar el resultado del endpoint '{tarea['endpoint']}': {str(ex)}")
+            return ex
+
+    return None
+
+### Planificacion de consultas ### 
+
+def planificar_consultas(tareas):
+    """
+    Separa las tareas de extraccion que requieren una consulta a la API de aquellas que pueden resolverse localmente,
+    a partir del resultado de una extraccion full del endpoint 'query' con los mismos parametros:
+        - 'query' incremental ==> eventos del resultado full actualizados luego de 'updatedafter'.
+        - 'count' full ==> cantidad de eventos del resultado full.
+        - 'count' incremental ==> cantidad de eventos del resultado full actualizados luego de 'updatedafter'.
+    Las tareas derivadas incluyen las claves 'origen' (tarea full de la que se obtienen) y 'derivacion' ('incremental', 'conteo' o 'conteo_incremental').
+    Las tareas incrementales solo se derivan si su 'updatedafter' se encuentra dentro del rango de tiempo de la consulta full (ver incremental_derivable):
+    como un evento no se actualiza antes de ocurrir, todos los eventos actualizados luego de esa fecha estan en el resultado full.
+    Si no (ej. un checkpoint anterior al rango), se consultan a la API.
+
+    Parametros (args):
+        :param tareas (list) ==> Lista de tareas de extraccion (ver ejecutar_tarea_extraccion).
+
+    Output (returns):
+        :return (tuple) ==> La tupla (remotas, derivadas) con las tareas a consultar a la API y las tareas a resolver localmente.
+    """
+    origenes = {}
+    for tarea in tareas:
+        if tarea["endpoint"] == "query" and tarea["tipo"] == "full" and tarea["fieldToExtract"] is not None:
+            origenes.setdefault(clave_consulta(tarea["params"]), tarea)
+
+    remotas, derivadas = [], []
+    for tarea in tareas:
+        origen = origenes.get(clave_consulta(tarea["params"]))
+
+        if origen is None or origen is tarea:
+            remotas.append(tarea)
+        elif tarea["tipo"] == "incremental" and not incremental_derivable(tarea, origen):
+            remotas.append(tarea)
+        elif tarea["endpoint"] == "query" and tarea["tipo"] == "incremental" and tarea["fieldToExtract"] == origen["fieldToExtract"]:
+            derivadas.append({**tarea, "origen": origen, "derivacion": "incremental"})
+        elif tarea["endpoint"] == "count":
+            derivadas.append({**tarea, "origen": origen, "derivacion": "conteo" if tarea["tipo"] == "full" else "conteo_incremental"})
+        else:
+            remotas.append(tarea)
+
+    return remotas, derivadas
+
+def incremental_derivable(tarea, origen, margen=timedelta(hours=1)):
+    """
+    Indica si una tarea incremental puede derivarse del resultado de una consulta full: su 'updatedafter' (ver calcular_updatedafter)
+    debe ser posterior al inicio del rango de la consulta full, y el rango debe llegar hasta el momento actual.
+
+    Parametros (args):
+        :param tarea (Dict) ==> Tarea incremental.
+        :param origen (Dict) ==> Tarea full del endpoint 'query'.
+        :param margen (timedelta) ==> Margen sobre el inicio del rango, por el tiempo entre la planificacion y la extraccion full
+            (sin starttime, el rango comienza 30 dias antes de la misma). Por defecto, 1 hora.
+
+    Output (returns):
+        :return derivable (bool) ==> True si todos los eventos actualizados luego de 'updatedafter' estan en el resultado full.
+    """
+    ahora = datetime.utcnow()
+    params = origen["params"] or {}
+
+    if "endtime" in params and parse_fecha_parametro(params["endtime"]) < ahora:
+        return False
+
+    starttime = parse_fecha_parametro(params["starttime"]) if "starttime" in params else ahora - timedelta(days=30)
+    updatedafter = parse_fecha_parametro(calcular_updatedafter(tarea["endpoint"], tarea["params"], tarea.get("deltaHoras", 1), tarea.get("rutaCheckpoint")))
+
+    return updatedafter >= starttime + margen
+
+def clave_consulta(params):
+    """
+    Obtiene una clave que identifica a los parametros de una consulta, sin considerar el parametro 'updatedafter'.
+
+    Parametros (args):
+        :param params (Dict) ==> Parámetros de la solicitud GET.
+
+    Output (returns):
+        :return clave (str) ==> Los parametros ordenados, en formato JSON.
+    """
+    return json.dumps({k: v for k, v in (params or {}).items() if k != "updatedafter"}, sort_keys=True, default=str)
+
+def derivar_resultado(tarea, df_origen, campoVersion="properties.updated"):
+    """
+    Resuelve localmente una tarea derivada (ver planificar_consultas) a partir del resultado de su tarea de origen.
+
+    Parametros (args):
+        :param tarea (Dict) ==> Tarea derivada.
+        :param df_origen (Pandas.DataFrame) ==> Resultado de la tarea de origen.
+        :param campoVersion (str) ==> Campo con la fecha de actualizacion de los eventos (epoch en milisegundos). Por defecto, 'properties.updated'.
+
+    Output (returns):
+        :return df_result (Pandas.DataFrame) ==> Los eventos filtrados, o un DataFrame con las columnas 'count' y 'maxAllowed' (igual que el endpoint 'count').
+    """
+    df_result = df_origen
+
+    if tarea["derivacion"] in ("incremental", "conteo_incremental"):
+        updatedafter = calcular_updatedafter(tarea["endpoint"], tarea["params"], tarea.get("deltaHoras", 1), tarea.get("rutaCheckpoint"))
+        corte = (parse_fecha_parametro(updatedafter) - datetime(1970, 1, 1)) // timedelta(milliseconds=1)
+        df_result = df_origen[df_origen[campoVersion].to_numpy() >= corte].reset_index(drop=True)
+
+    if tarea["derivacion"] in ("conteo", "conteo_incremental"):
+        return pds.DataFrame({"count": [len(df_result)], "maxAllowed": [LIMITE_EVENTOS_USGS]})
+
+    return df_result.copy()
+
+def almacenar_extraccion(tarea, df):
+    """
+    Almacena el resultado de una tarea de extraccion en el path de destino indicado en la misma, y lo imprime.
+    En las tareas incrementales con 'rutaCheckpoint', el nuevo checkpoint se registra solo si los datos se almacenaron
+    (si el almacenamiento falla, el error se propaga y el checkpoint no avanza, por lo que los eventos se vuelven a extraer).
+
+    Parametros (args):
+        :param tarea (Dict) ==> Tarea de extraccion. Utiliza las claves 'destino' (path) y 'almacenamiento' (parametros de almacenar_particionado).
+            Si 'almacenamiento' incluye fechaExtraccion=True, se utiliza la fecha actual como fecha de los datos.
+        :param df (Pandas.DataFrame) ==> Resultado de la extraccion.
+
+    Output (returns):
+        :return None ==> Sin retorno
+    """
+    opciones = dict(tarea["almacenamiento"])
+
+    if opciones.pop("fechaExtraccion", False):
+        opciones["fecha"] = datetime.utcnow()
+
+    print(f"\n###### Consulta '{tarea['endpoint']}' ({tarea['tipo']}) ######\n")
+    almacenar_particionado(df, tarea["destino"], **opciones)
+    print_parquet(tarea["destino"])
+
+    if tarea["tipo"] == "incremental" and tarea.get("rutaCheckpoint") is not None:
+        registrar_checkpoint(tarea["rutaCheckpoint"], tarea["endpoint"], tarea["params"], df)
+
+
+### Funcion principal del Script ### 
+
+def main():
+    """
+    Funcion principal del Script para modularizar el código.
+    En la misma se envian la mayor parte de parametros propios de la API en cuestion.
+    Las extracciones de todos los endpoints se ejecutan de forma concurrente, y cada resultado se almacena a medida que finaliza.
+    Las extracciones que pueden obtenerse del resultado de la extraccion full de 'query' se resuelven localmente.
+
+    Parametros (args):
+        :param (None)
+
+    Output (returns):
+        :return (None) 
+    """
+
+    maxConcurrencia = 4
+    url_base = "https://earthquake.usgs.gov/fdsnws/event/1/"
+
+    endpoints = [ 
+        {"endpoint": "query", "params": {'format': 'geojson', 'latitude':34,'longitude':-118, 'maxradius': 5}, "fieldToExtract": "features", "paralelo": True, "rutaCheckpoint": RUTA_CHECKPOINTS}, 
+        {"endpoint": "count", "params": {'format': 'geojson', 'latitude':34,'longitude':-118, 'maxradius': 5}, "fieldToExtract": None, "paralelo": False }
+    ]
+
+    opciones_parquet_registros = {"compresion": 'zstd', "ordenarPor": ['timestamp_measured'], "columnasDiccionario": COLUMNAS_CATEGORICAS + ['properties.sources', 'properties.types']}
+
+    almacenamiento_registros = {"dateFiledName": 'properties.time', "unitEpoch": 'ms', "tipoParticion": 'f', "modoEscritura": 'merge', "opcionesParquet": opciones_parquet_registros}
+    almacenamiento_cantidad = {"fechaExtraccion": True, "tipoParticion": 'f'}
+
+    destinos = {
+        ("query", "full"): ("Output/datalake/landing/earthquake/Registros/Historial/terremotos-historial.parquet", almacenamiento_registros),
+        ("query", "incremental"): ("Output/datalake/landing/earthquake/Registros/Latest/ultimos-terremotos.parquet", almacenamiento_registros),
+        ("count", "full"): ("Output/datalake/landing/earthquake/Cantidad/cant-ult-30dias.parquet", almacenamiento_cantidad),
+        ("count", "incremental"): ("Output/datalake/landing/earthquake/Cantidad/cant-actualizados-ult-6hs.parquet", almacenamiento_cantidad),
+    }
+
+    tareas = []
+    for ep in endpoints:
+        for tipo in ["full", "incremental"]:
+            destino, almacenamiento = destinos[(ep["endpoint"], tipo)]
+            tareas.append({**ep, "tipo": tipo, "deltaHoras": 6, "destino": destino, "almacenamiento": almacenamiento})
+
+    ## Los datasets de eventos escritos con el esquema previo de las coordenadas se migran antes de combinarlos con los nuevos datos
+    for destino, almacenamiento in destinos.values():
+        if almacenamiento is almacenamiento_registros and os.path.isdir(destino):
+            migrar_esquema_coordenadas(destino, opciones_parquet_registros)
+
+    resultados = asyncio.run(ejecutar_extracciones_async(url_base, tareas, maxConcurrencia, almacenar_extraccion, derivarLocalmente=True))
+
+    fallidas = [f"{tarea['endpoint']} ({tarea['tipo']})" for tarea, _, error in resultados if error is not None]
+    if fallidas:
+        print(f"\nERROR! Extracciones o almacenamientos fallidos (se reintentan en la proxima ejecucion): {', '.join(fallidas)}")
+
+    ## Solo se compactan los datasets escritos en modo append (una particion por fecha que recibe un archivo por ejecucion);
+    ## los de eventos (merge) ya tienen un unico archivo por particion
+    print("\n###### Compactacion del datalake ######\n")
+    for destino in dict.fromkeys(destino for destino, almacenamiento in destinos.values() if almacenamiento.get("modoEscritura", "append") == "append"):
+        print(compactar_particiones(destino, ordenarPor="timestamp_measured"))
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
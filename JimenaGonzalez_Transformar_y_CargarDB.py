@@ -3,11 +3,60 @@ __author__ = "Jimena B. Gonzalez"
 __version__ = "1.0.0"
 
 import pandas as pds
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import json
 import os
+import re
+import time
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
 import sqlalchemy as sa
 from configparser import ConfigParser
 import JimenaGonzalez_Extraer_y_Almacenar as JG_Alm
 
+## Estado persistido de las agregaciones de magnitud por fecha y place (ver actualizar_agregado_magnitudes).
+## Junto al mismo se guarda (en un .json) el dataset de origen y la marca de escritura de sus archivos ya procesados.
+RUTA_ESTADO_MAGNITUDES = "Output/datalake/state/magnitudes-por-place.parquet"
+
+## Rollups por intervalo de tiempo (ver actualizar_rollups): tabla ==> columnas de agrupamiento. Se actualizan de forma incremental
+## (solo las fechas con archivos nuevos); la marca de escritura de los archivos ya cargados se guarda en RUTA_MARCA_ROLLUPS.
+ROLLUPS = {
+    "JimenaGonzalez_terremotos_por_dia": ["fecha"],
+    "JimenaGonzalez_terremotos_por_hora": ["fecha", "hora"],
+    "JimenaGonzalez_terremotos_por_place_dia": ["fecha", "properties.place"],
+}
+RUTA_MARCA_ROLLUPS = "Output/datalake/state/rollups.json"
+
+## Normalizacion de places (ver normalizar_place): los places de USGS con la forma "12 km NNE of Ridgecrest, CA" se agrupan
+## por la localidad/region de referencia ("Ridgecrest, CA"). Los places se repiten mucho, por lo que se memoizan (cache acotado).
+PATRON_PLACE = re.compile(r"^\s*\d+(?:\.\d+)?\s*km\s+(?:[NSEW]{1,3}\s+)?of\s+(?P<referencia>.+?)\s*$", re.IGNORECASE)
+TAMANO_CACHE_PLACES = 65536
+
+## Backend SQL embebido (ver generar_df_magnitudes_agrupado_duckdb): configuracion de DuckDB. Si la memoria no alcanza,
+## los operadores (agrupamiento, ordenamiento) vuelcan a disco en el directorio temporal. threads None ==> todos los nucleos.
+CONFIG_DUCKDB = {"memory_limit": "2GB", "temp_directory": "Output/datalake/tmp/duckdb", "threads": None}
+
+## Sketches combinables de las agregaciones por place (ver agregar_sketches): cuantiles de magnitud (t-digest)
+## y cantidad de valores distintos de un campo (HyperLogLog). Columnas a generar ==> cuantil / campo.
+CUANTILES_MAGNITUD = {"magnitud_p50": 0.5, "magnitud_p95": 0.95}
+CAMPOS_DISTINTOS = {"cant_redes": "properties.net", "cant_tipos": "properties.type"}
+COMPRESION_TDIGEST = 100                                # cantidad aproximada de centroides por grupo (mayor ==> cuantiles mas precisos)
+PRECISION_HLL = 12                                      # 2^12 registros por grupo (error tipico ~1.6%); solo se almacenan los registros no vacios
+VERSION_SKETCH = 1                                      # primer byte de cada sketch serializado; los estados con otra version se recalculan
+
+## Escalas de clasificacion (ver clasificar): limites inferiores (inclusive) de cada clase a partir de la segunda, y la etiqueta de cada clase.
+## Los valores menores al primer limite toman la primer etiqueta; los valores nulos, "-".
+ESCALAS = {
+    "impacto": {"limites": [3.0, 4.0, 5.0, 6.0, 7.0, 8.0], "etiquetas": ["micro", "minor", "light", "moderate", "strong", "major", "great"]},  # magnitud
+}
+
+## Reglas de enriquecimiento de las magnitudes agrupadas (ver enriquecer): columna a generar ==> (campo de origen, escala).
+REGLAS_ENRIQUECIMIENTO_MAGNITUDES = {
+    "impacto_maximo": ("magnitud_maxima", "impacto"),
+}
+
 ### Utilitarios Operaciones BD ###  
 def connect_to_database(motor="postgres", config_file_path="config.ini", config_file_path_section="postgres"):
     """
@@ -161,12 +210,14 @@ def delete_database_table(motor="postgres",nombreTabla="Tabla_1"):
         Exception ==> Si se detectan errores en alguna de las operaciones realizadas.  
     """
     sql_query = f"DROP TABLE IF EXISTS {nombreTabla}"
+    conn = None
 
     try:
 
         conn = connect_to_database(motor,"Inputs/config.ini")
 
-        execute_query(conn, sql_query)
+        with conn.begin() as transaccion:
+            transaccion.execute(sa.text(sql_query))
 
     except Exception as ex:
         close_connection_to_database(motor, conn)
@@ -190,6 +241,8 @@ def create_magnitude_database_table(nombreTabla):
     Raises:
         Exception ==> Si se detectan errores en alguna de las operaciones realizadas.  
     """
+    conn = None
+
     try:
         sql_query = f"""              
             CREATE TABLE IF NOT EXISTS {nombreTabla} (
@@ -197,13 +250,18 @@ def create_magnitude_database_table(nombreTabla):
                 magnitud_minima FLOAT,
                 magnitud_promedio FLOAT,
                 magnitud_maxima FLOAT,
+                magnitud_p50 FLOAT,
+                magnitud_p95 FLOAT,
+                cant_redes INTEGER,
+                cant_tipos INTEGER,
                 impacto_maximo TEXT
             )
         """
 
         conn = connect_to_database("postgres","Inputs/config.ini")
 
-        execute_query(conn, sql_query)
+        with conn.begin() as transaccion:
+            transaccion.execute(sa.text(sql_query))
 
         #sql_query_check_fields = f"SELECT * FROM {nombreTabla}"
         #print(execute_query(conn, sql_query_check_fields)) ## DEBUG!
@@ -216,6 +274,115 @@ def create_magnitude_database_table(nombreTabla):
         if conn is not None:
             close_connection_to_database("postgres", conn)
 
+def create_rollup_database_table(nombreTabla, columnasGrupo):
+    """
+    Crea (si no existe) una tabla de rollup (ver actualizar_rollups), con clave primaria en sus columnas de agrupamiento.
+
+    Parametros (args):
+        :param nombreTabla (str) ==> Nombre de la tabla a crear.
+        :param columnasGrupo (list) ==> Columnas de agrupamiento del rollup ('fecha', 'hora' y/o 'properties.place').
+
+    Output (returns):
+        :return None ==> Sin retorno
+
+    Raises:
+        Exception ==> Si se detectan errores en alguna de las operaciones realizadas.  
+    """
+    tipos = {"fecha": "DATE", "hora": "INTEGER", "place": "TEXT"}
+    columnas = [nombre_columna_rollup(col) for col in columnasGrupo]
+    conn = None
+
+    try:
+        sql_query = f"""
+            CREATE TABLE IF NOT EXISTS {nombreTabla} (
+                {", ".join(f"{col} {tipos[col]} NOT NULL" for col in columnas)},
+                cantidad INTEGER,
+                magnitud_minima FLOAT,
+                magnitud_promedio FLOAT,
+                magnitud_maxima FLOAT,
+                PRIMARY KEY ({", ".join(columnas)})
+            )
+        """
+
+        conn = connect_to_database("postgres","Inputs/config.ini")
+
+        with conn.begin() as transaccion:
+            transaccion.execute(sa.text(sql_query))
+
+    except Exception as ex:
+        close_connection_to_database("postgres", conn)
+        print(f"ERROR! No se pudo crear la tabla: {str(ex)}")
+    finally:
+        if conn is not None:
+            close_connection_to_database("postgres", conn)
+
+def reemplazar_filas_database(nombreTabla, df_load, columna, valores=None, motor="postgres"):
+    """
+    Reemplaza el contenido de una tabla para un conjunto de valores de una columna: se eliminan sus filas y se insertan las del DataFrame dado
+    (por ejemplo, las fechas de un rollup o los places de la tabla de magnitudes).
+    Requiere que los datos de conexion a la DB se enceuntren en un archivo "Inputs/config.ini".
+
+    Parametros (args):
+        :param nombreTabla (str) ==> Nombre de la tabla a actualizar.
+        :param df_load (Pandas.DataFrame) ==> Las nuevas filas de los valores a reemplazar, con las columnas de la tabla.
+        :param columna (str) ==> Columna de la tabla por la cual se eliminan las filas (ej. 'fecha' o 'place').
+        :param valores (list) ==> Valores de la columna a reemplazar. Por defecto, None (se reemplaza el contenido completo de la tabla).
+        :param motor (str, optional) ==> Nombre del motor correspondiente a la base de datos a donde nos coenectaremos. Por defecto, "postgres".
+
+    Output (returns):
+        :return (bool) ==> True si la tabla se actualizo; False en caso contrario.
+    """
+    try:
+        ##Control de tipos
+        if JG_Alm.isDataframe(df_load) is False:
+            raise TypeError("El argumento 'df' debe ser un DataFrame de pandas.")
+
+        if motor=="postgres":
+            return reemplazar_filas_postgres(nombreTabla, df_load, columna, valores)
+
+        print("No es posible conectarse a la base de datos solicitada.")
+    except Exception as ex:
+        print(f"ERROR! No se pudo concluir la operacion solicitada: {str(ex)}")
+
+    return False
+
+def reemplazar_filas_postgres(nombreTabla, df_load, columna, valores=None):
+    """
+    Version postgres de reemplazar_filas_database. La eliminacion y la insercion se realizan en una unica transaccion,
+    por lo que ante un error la tabla conserva su contenido previo.
+
+    Parametros (args):
+        :param nombreTabla (str) ==> Nombre de la tabla a actualizar.
+        :param df_load (Pandas.DataFrame) ==> Las nuevas filas de los valores a reemplazar.
+        :param columna (str) ==> Columna de la tabla por la cual se eliminan las filas.
+        :param valores (list) ==> Valores de la columna a reemplazar, con el tipo de la columna. Por defecto, None (contenido completo).
+
+    Output (returns):
+        :return (bool) ==> True si la tabla se actualizo; False en caso contrario.
+    """
+    conn = None
+    try:
+        conn = connect_to_database("postgres","Inputs/config.ini")
+
+        with conn.begin() as transaccion:
+            if valores is None:
+                transaccion.execute(sa.text(f"DELETE FROM {nombreTabla}"))
+            elif len(valores) > 0:
+                sql_query = sa.text(f"DELETE FROM {nombreTabla} WHERE {columna} IN :valores").bindparams(sa.bindparam("valores", expanding=True))
+                transaccion.execute(sql_query, {"valores": list(valores)})
+
+            df_load.to_sql(nombreTabla, transaccion, method="multi", if_exists="append", index=False)
+
+        return True
+
+    except Exception as ex:
+        print(f"ERROR! No se pudo actualizar la tabla: {str(ex)}")
+        return False
+
+    finally:
+        if conn is not None:
+            close_connection_to_database("postgres", conn)
+
 def load_database(nombreTabla, df_load, motor="postgres"):
     """
     Funcion para cargar una tabla con el contenido de un dataframe dado. 
@@ -341,6 +508,10 @@ def reemplazar_nulos(df, column_name, fill_value):
     Output (returns):
         :return pd.DataFrame ==> El DataFrame con los valores nulos rellenados en la columna especificada.
     """
+    ## En las columnas categoricas, el valor de relleno debe ser una de las categorias
+    if isinstance(df[column_name].dtype, pds.CategoricalDtype) and fill_value not in df[column_name].cat.categories:
+        df[column_name] = df[column_name].cat.add_categories([fill_value])
+
     df[column_name] = df[column_name].fillna(fill_value)
     return df
 
@@ -443,113 +614,1434 @@ def generar_df_magnitudes_agrupado(df):
         :param df (Pandas.DataFrame) ==> El DataFrame que se desea guardar.
 
     Output (returns):
-        :return df_group (Pandas.DataFrame) ==> La salida es un nuevo DataFrame con el resultado de las agregaciones realizadas.
+        :return df_group (Pandas.DataFrame) ==> La salida es un nuevo DataFrame con el resultado de las agregaciones realizadas: magnitud minima, promedio y maxima,
+            los cuantiles de CUANTILES_MAGNITUD y la cantidad de valores distintos de los campos de CAMPOS_DISTINTOS presentes en df.
     
     Raises:
         TypeError ==> Si el parametro enviado como 'df' no se encuentra en formato DataFrame de Pandas.
     """
     
-    field_group_by='properties.place'
-    field_agg_by='properties.mag'
-
-    # reemplazar_nulos(df, field_group_by, "unknown")
-    eliminar_nulos(df, field_group_by)
-
     ##Control de tipos
     if JG_Alm.isDataframe(df) is False:
         raise TypeError("El argumento 'df' debe ser un DataFrame de pandas.")
-    
-    df_group = df.groupby(field_group_by).agg(
+
+    ## Eliminacion de nulos, normalizacion del place y agrupamiento (ver crear_pipeline_magnitudes)
+    return crear_pipeline_magnitudes(agrupar=True, finalizar=False).ejecutar(df)
+
+def agrupar_magnitudes(df, field_group_by='properties.place', field_agg_by='properties.mag'):
+    """
+    Obtiene las magnitudes minima, promedio y maxima de un DataFrame de eventos, por un campo dado,
+    y los cuantiles de CUANTILES_MAGNITUD y la cantidad de valores distintos de CAMPOS_DISTINTOS (exactos, ver agregar_sketches).
+
+    Parametros (args):
+        :param df (Pandas.DataFrame) ==> El DataFrame con los eventos.
+        :param field_group_by (str) ==> Campo por el cual agrupar. Por defecto, 'properties.place'.
+        :param field_agg_by (str) ==> Campo a agregar. Por defecto, 'properties.mag'.
+
+    Output (returns):
+        :return df_group (Pandas.DataFrame) ==> Un DataFrame indexado por el campo agrupador, con las columnas magnitud_minima, magnitud_promedio y magnitud_maxima,
+            los cuantiles y la cantidad de valores distintos de los campos de CAMPOS_DISTINTOS presentes en df.
+    """
+    ## observed=True: si el campo agrupador es categorico, solo se generan grupos para las categorias presentes
+    grupos = df.groupby(field_group_by, observed=True)
+    df_group = grupos.agg(
         magnitud_minima=(field_agg_by, 'min'),
         magnitud_promedio=(field_agg_by, 'mean'),         
         magnitud_maxima=(field_agg_by, 'max')
     )
 
-    df_group.rename(columns = {'field_group_by':'place'}, inplace = True)
+    for columna, cuantil in CUANTILES_MAGNITUD.items():
+        df_group[columna] = grupos[field_agg_by].quantile(cuantil)
+
+    for columna, campo in CAMPOS_DISTINTOS.items():
+        if campo in df.columns:
+            df_group[columna] = grupos[campo].nunique()
 
     return df_group
 
-def get_impacto_magnitud(value):
+def generar_df_magnitudes_agrupado_por_lotes(path, filasPorLote=100000, sketches=False):
     """
-    Obtener el impacto segun la magnitud de un terremoto.
+    Version por lotes de generar_df_magnitudes_agrupado: obtiene las agregaciones de un dataset parquet sin cargarlo completo en memoria
+    (ver agregar_parcial_por_lotes).
 
     Parametros (args):
-        :param df (numerical value) ==> El valor a comparar.
+        :param path (str) ==> Path del dataset de eventos.
+        :param filasPorLote (int) ==> Cantidad maxima de filas de cada lote de lectura. Por defecto, 100000.
+        :param sketches (bool) ==> Indica si se calculan los cuantiles y valores distintos (ver agregar_sketches). Por defecto, False.
 
     Output (returns):
-        :return (string ) ==> La salida es un string o guion con el resultado de las validaciones realizadas.
+        :return df_group (Pandas.DataFrame) ==> Un DataFrame con el resultado de las agregaciones, con el formato de finalizar_agregado.
     """
-    if value is not None:
-        if value < 2.9:
-            return "micro"
-        elif (value >= 3.0 and value < 4.0):
-            return "minor"
-        elif (value >= 4.0 and value < 5.09):
-            return "light"
-        elif (value >= 5.0 and value < 6.0):
-            return "moderate"
-        elif (value >= 6.0 and value < 7.0):
-            return  "strong"
-        elif (value >= 7.0 and value < 8.0):
-            return "major"
-        elif value >= 8.0:
-            return  "great"
-        else:
-            return "-"
-    else:
-        return "-"
+    field_group_by='properties.place'
+    field_agg_by='properties.mag'
 
-def add_columna_impacto(df):
+    return finalizar_agregado(agregar_parcial_por_lotes(path, [field_group_by], field_agg_by, filasPorLote, sketches), field_group_by)
+
+def agregar_particiones_magnitudes(path, fechas, columnasGrupo, field_agg_by='properties.mag', sketches=False):
     """
-    Añadir una nueva columna al DataFrame, que contenga el impacto de los terremotos segun su magnitud.
+    Obtiene el estado parcial de las agregaciones (ver agregar_parcial) de un rango de particiones 'fecha' consecutivas de un dataset.
+    Es la tarea que ejecuta cada proceso en generar_df_magnitudes_agrupado_paralelo.
 
     Parametros (args):
-        :param df (Pandas.DataFrame) ==> El DataFrame que se desea analizar.
+        :param path (str) ==> Path del dataset.
+        :param fechas (list) ==> Valores consecutivos (ordenados) de la particion 'fecha' a procesar.
+        :param columnasGrupo (list) ==> Columnas por las cuales agrupar.
+        :param field_agg_by (str) ==> Campo a agregar. Por defecto, 'properties.mag'.
+        :param sketches (bool) ==> Indica si se agregan los sketches de cuantiles y valores distintos (ver agregar_sketches). Por defecto, False.
 
     Output (returns):
-        :return df_group (Pandas.DataFrame) ==> La salida es un nuevo DataFrame que incluye a la nueva columna.
+        :return (tuple) ==> La tupla (df_parcial, tiempos), con tiempos un Dict con el pid del proceso, la cantidad de particiones y de filas, y los segundos de lectura y de agregacion.
     """
-    try:
-        df['impacto_maximo'] = df['magnitud_maxima'].map(get_impacto_magnitud)
+    inicio = time.perf_counter()
+    df = JG_Alm.read_parquet(path, fechaDesde=fechas[0], fechaHasta=fechas[-1], columnas=columnas_agregacion(columnasGrupo, field_agg_by, sketches))
+    lectura = time.perf_counter()
+
+    df = preparar_columnas_grupo(df, columnasGrupo)
+    df_parcial = agregar_parcial(df, columnasGrupo, field_agg_by, sketches)
+
+    return df_parcial, {"pid": os.getpid(), "particiones": len(fechas), "filas": len(df), "segundos_lectura": lectura - inicio, "segundos_agregacion": time.perf_counter() - lectura}
+
+def generar_df_magnitudes_agrupado_paralelo(path, maxWorkers=None, tareasPorWorker=4, sketches=False):
+    """
+    Version paralela de generar_df_magnitudes_agrupado: las particiones 'fecha' del dataset se dividen en rangos consecutivos,
+    cada rango se lee y agrega en un proceso de un pool (ver agregar_particiones_magnitudes), y los estados parciales
+    resultantes se combinan (ver finalizar_agregado). Al finalizar, se imprime el reporte de tiempos por proceso (ver reporte_workers).
+
+    Parametros (args):
+        :param path (str) ==> Path del dataset de eventos (particionado por fecha).
+        :param maxWorkers (int) ==> Cantidad maxima de procesos. Por defecto, None (cantidad de nucleos).
+        :param tareasPorWorker (int) ==> Cantidad de rangos de particiones por proceso (mas rangos equilibran mejor la carga, con mayor costo fijo). Por defecto, 4.
+        :param sketches (bool) ==> Indica si se calculan los cuantiles y valores distintos (ver agregar_sketches). Por defecto, False.
+
+    Output (returns):
+        :return df_group (Pandas.DataFrame) ==> Un DataFrame con el resultado de las agregaciones, con el formato de finalizar_agregado.
+    """
+    field_group_by='properties.place'
+    field_agg_by='properties.mag'
+
+    fechas = JG_Alm.listar_particiones(path, 'fecha')
+
+    if not fechas:
+        print("El dataset no se encuentra particionado por fecha. Se agrupa por lotes en un unico proceso.")
+        return generar_df_magnitudes_agrupado_por_lotes(path, sketches=sketches)
+
+    cantTareas = min(len(fechas), (maxWorkers or os.cpu_count() or 1) * tareasPorWorker)
+    rangos = [list(rango) for rango in np.array_split(np.array(fechas, dtype=object), cantTareas)]
+
+    inicio = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=maxWorkers) as executor:
+        futuros = [executor.submit(agregar_particiones_magnitudes, path, rango, [field_group_by], field_agg_by, sketches) for rango in rangos]
+        resultados = [futuro.result() for futuro in futuros]
+
+    parciales, tiempos = zip(*resultados)
+    df_group = finalizar_agregado(JG_Alm.concatenar_dataframes(list(parciales)), field_group_by)
+
+    print(f"\nAgregacion paralela de {len(fechas)} particion(es) en {time.perf_counter() - inicio:.2f} segundos.")
+    print(reporte_workers(tiempos))
+
+    return df_group
+
+def reporte_workers(tiempos):
+    """
+    Resume los tiempos de las tareas de una ejecucion paralela por proceso (worker).
+
+    Parametros (args):
+        :param tiempos (list) ==> Tiempos de cada tarea (ver agregar_particiones_magnitudes).
+
+    Output (returns):
+        :return df_reporte (Pandas.DataFrame) ==> Una fila por proceso, con la cantidad de tareas, particiones y filas procesadas y los segundos de lectura, agregacion y totales.
+    """
+    df_tiempos = pds.DataFrame(list(tiempos))
+    df_reporte = df_tiempos.groupby('pid').agg(
+        tareas=('filas', 'size'),
+        particiones=('particiones', 'sum'),
+        filas=('filas', 'sum'),
+        segundos_lectura=('segundos_lectura', 'sum'),
+        segundos_agregacion=('segundos_agregacion', 'sum')
+    )
+    df_reporte['segundos_totales'] = df_reporte['segundos_lectura'] + df_reporte['segundos_agregacion']
+
+    return df_reporte.round(3)
+
+def generar_df_magnitudes_agrupado_arrow(tabla):
+    """
+    Version Arrow de generar_df_magnitudes_agrupado: realiza las agregaciones sobre una tabla de Arrow y solo convierte a Pandas el resultado agrupado.
+    Los cuantiles se estiman con el t-digest de Arrow, y los valores distintos se cuentan de forma exacta.
+
+    Parametros (args):
+        :param tabla (pyarrow.Table) ==> La tabla con los eventos (requiere las columnas 'properties.place' y 'properties.mag'; opcionalmente, las de CAMPOS_DISTINTOS).
+
+    Output (returns):
+        :return df_group (Pandas.DataFrame) ==> Un DataFrame con el resultado de las agregaciones, con el mismo formato que generar_df_magnitudes_agrupado.
+    """
+    field_group_by='properties.place'
+    field_agg_by='properties.mag'
+
+    ## Eliminacion de nulos (incluido el texto 'null') en el campo agrupador
+    place = tabla[field_group_by]
+    distintos = {columna: campo for columna, campo in CAMPOS_DISTINTOS.items() if campo in tabla.column_names}
+    tabla = tabla.select([field_group_by, field_agg_by] + list(distintos.values())).filter(pc.and_(pc.is_valid(place), pc.not_equal(place, "null")))
+
+    ## Se agrupa por la localidad de referencia del place (ver normalizar_places_arrow), sobre los indices de su diccionario
+    tabla = tabla.unify_dictionaries()
+    tabla = tabla.set_column(0, field_group_by, normalizar_places_arrow(tabla[field_group_by]))
+    tabla_group = tabla.group_by(field_group_by).aggregate(
+        [(field_agg_by, "min"), (field_agg_by, "mean"), (field_agg_by, "max"), (field_agg_by, "tdigest", pc.TDigestOptions(q=list(CUANTILES_MAGNITUD.values())))]
+        + [(campo, "count_distinct", pc.CountOptions(mode="only_valid")) for campo in distintos.values()]
+    )
+    tabla_group = tabla_group.rename_columns({f"{field_agg_by}_min": "magnitud_minima", f"{field_agg_by}_mean": "magnitud_promedio", f"{field_agg_by}_max": "magnitud_maxima",
+                                              **{f"{campo}_count_distinct": columna for columna, campo in distintos.items()}})
+    tabla_group = tabla_group.set_column(tabla_group.schema.get_field_index(field_group_by), field_group_by, pc.cast(tabla_group[field_group_by], "string"))
+
+    ## El t-digest devuelve una lista con los cuantiles pedidos, en orden
+    for i, columna in enumerate(CUANTILES_MAGNITUD):
+        tabla_group = tabla_group.append_column(columna, pc.list_element(tabla_group[f"{field_agg_by}_tdigest"], i))
+
+    df_group = tabla_group.sort_by(field_group_by).to_pandas().set_index(field_group_by)
+
+    return df_group[["magnitud_minima", "magnitud_promedio", "magnitud_maxima"] + list(CUANTILES_MAGNITUD) + list(distintos)]
+
+def agregar_parcial(df, columnasGrupo, field_agg_by='properties.mag', sketches=False):
+    """
+    Obtiene el estado parcial (combinable) de las agregaciones de un campo: cantidad de valores, suma, minimo y maximo por grupo.
+
+    Parametros (args):
+        :param df (Pandas.DataFrame) ==> El DataFrame con los datos.
+        :param columnasGrupo (list) ==> Columnas por las cuales agrupar.
+        :param field_agg_by (str) ==> Campo a agregar. Por defecto, 'properties.mag'.
+        :param sketches (bool) ==> Indica si se agregan al estado los sketches de cuantiles y valores distintos (ver agregar_sketches). Por defecto, False.
+
+    Output (returns):
+        :return df_parcial (Pandas.DataFrame) ==> Una fila por grupo, con las columnas de agrupamiento y cantidad, suma, minimo y maximo (y los sketches).
+    """
+    grupos = df.groupby(columnasGrupo, observed=True)
+    df_parcial = grupos[field_agg_by].agg(['count', 'sum', 'min', 'max']).set_axis(['cantidad', 'suma', 'minimo', 'maximo'], axis=1)
+
+    if sketches:
+        df_parcial = agregar_sketches(df_parcial, codigos_grupo(grupos), df, field_agg_by)
+
+    return df_parcial.reset_index()
+
+def combinar_parciales(df_parciales, columnasGrupo):
+    """
+    Combina estados parciales de agregacion (ver agregar_parcial) en uno solo por grupo.
+
+    Parametros (args):
+        :param df_parciales (Pandas.DataFrame) ==> Los estados parciales, concatenados.
+        :param columnasGrupo (list) ==> Columnas por las cuales agrupar el resultado.
+
+    Output (returns):
+        :return df_parcial (Pandas.DataFrame) ==> Una fila por grupo, con cantidad, suma, minimo y maximo (y los sketches, si los tienen) combinados.
+    """
+    grupos = df_parciales.groupby(columnasGrupo, observed=True)
+    df_combinado = pds.concat([grupos[['cantidad', 'suma']].sum(), grupos['minimo'].min(), grupos['maximo'].max()], axis=1)
+
+    if 'tdigest' in df_parciales.columns:
+        df_combinado = combinar_sketches(df_combinado, codigos_grupo(grupos), df_parciales)
+
+    return df_combinado.reset_index()
+
+def agregar_parcial_por_lotes(path, columnasGrupo, field_agg_by='properties.mag', filasPorLote=100000, sketches=False, **filtrosLectura):
+    """
+    Obtiene el estado parcial de las agregaciones de un dataset parquet (ver agregar_parcial) leyendolo por lotes de tamaño acotado
+    (ver JG_Alm.iterar_lotes_parquet): el estado de cada lote se combina con el acumulado y el lote se descarta,
+    por lo que la memoria utilizada depende de la cantidad de grupos y del tamaño del lote, y no de la cantidad de eventos.
+    Las columnas de agrupamiento se preparan con preparar_columnas_grupo.
+
+    Parametros (args):
+        :param path (str) ==> Path del dataset.
+        :param columnasGrupo (list) ==> Columnas por las cuales agrupar.
+        :param field_agg_by (str) ==> Campo a agregar. Por defecto, 'properties.mag'.
+        :param filasPorLote (int) ==> Cantidad maxima de filas de cada lote. Por defecto, 100000.
+        :param sketches (bool) ==> Indica si se agregan los sketches de cuantiles y valores distintos (ver agregar_sketches). Por defecto, False.
+        :param filtrosLectura ==> Filtros de lectura (fechaDesde, fechaHasta, magnitudMinima, filtros) (ver JG_Alm.read_parquet).
+
+    Output (returns):
+        :return df_parcial (Pandas.DataFrame) ==> Una fila por grupo, con las columnas de agrupamiento y cantidad, suma, minimo y maximo.
+    """
+    df_estado = pds.DataFrame(columns=columnasGrupo + ['cantidad', 'suma', 'minimo', 'maximo'])
+
+    for df_lote in JG_Alm.iterar_lotes_parquet(path, columnas_agregacion(columnasGrupo, field_agg_by, sketches), filasPorLote, **filtrosLectura):
+        df_lote = preparar_columnas_grupo(df_lote, columnasGrupo)
+        df_parcial = agregar_parcial(df_lote, columnasGrupo, field_agg_by, sketches)
+        df_estado = df_parcial if len(df_estado) == 0 else combinar_parciales(JG_Alm.concatenar_dataframes([df_estado, df_parcial]), columnasGrupo)
+
+    return df_estado
+
+def preparar_columnas_grupo(df, columnasGrupo):
+    """
+    Prepara las columnas de agrupamiento de un lote de eventos: descarta los registros con valores nulos (o 'null') en las mismas,
+    agrupa la columna 'fecha' como texto y la columna 'properties.place' por su localidad de referencia (ver normalizar_places).
+
+    Parametros (args):
+        :param df (Pandas.DataFrame) ==> El lote de eventos.
+        :param columnasGrupo (list) ==> Columnas por las cuales agrupar.
+
+    Output (returns):
+        :return df (Pandas.DataFrame) ==> El lote con las columnas de agrupamiento preparadas.
+    """
+    for columna in columnasGrupo:
+        df = eliminar_nulos(df, columna)
+
+    ## La fecha es categorica si proviene de la particion, y date si proviene de los datos
+    if 'fecha' in columnasGrupo:
+        df['fecha'] = df['fecha'].astype(str)
+
+    if 'properties.place' in columnasGrupo:
+        df['properties.place'] = normalizar_places(df['properties.place'])
 
-    except Exception as e:
-        print(f"Error al añadir la nueva columna al DataFrame: {str(e)}")
-    
     return df
 
-def main():
+def finalizar_agregado(df_estado, field_group_by='properties.place'):
     """
-    Funcion principal del Script para modularizar el código.
-    En la misma se invocan los procesos de transformacion de los datos almacenados, y carga en base de datos OLAP.
+    Obtiene las magnitudes minima, promedio y maxima por place a partir del estado de agregacion, con el formato de generar_df_magnitudes_agrupado.
 
     Parametros (args):
-        :param (None)
+        :param df_estado (Pandas.DataFrame) ==> Estado de agregacion (ver agregar_parcial), con cualquier nivel de detalle que incluya el campo agrupador.
+        :param field_group_by (str) ==> Campo agrupador. Por defecto, 'properties.place'.
 
     Output (returns):
-        :return (None) 
+        :return df_group (Pandas.DataFrame) ==> Un DataFrame indexado por place, con las columnas magnitud_minima, magnitud_promedio y magnitud_maxima
+            (y, si el estado tiene sketches, las columnas de CUANTILES_MAGNITUD y CAMPOS_DISTINTOS).
     """
+    df_group = combinar_parciales(df_estado, [field_group_by]).set_index(field_group_by)
 
-    df_agrupado = generar_df_magnitudes_agrupado(JG_Alm.read_parquet("Output/datalake/landing/earthquake/Registros/Historial/terremotos-historial.parquet"))
-    # print(df_agrupado) ## DEBUG!
+    ## El promedio se deriva del estado; sin valores (cantidad 0) es nulo, al igual que en un promedio de Pandas
+    df_group['magnitud_promedio'] = df_group['suma'] / df_group['cantidad'].where(df_group['cantidad'] > 0)
+    df_group = df_group.rename(columns={'minimo': 'magnitud_minima', 'maximo': 'magnitud_maxima'})
+    columnas = ['magnitud_minima', 'magnitud_promedio', 'magnitud_maxima']
 
-    truncar_decimales(df_agrupado, 'magnitud_promedio', 2)
-    # print(df_agrupado)  ## DEBUG!
+    if 'tdigest' in df_group.columns:
+        df_group = finalizar_sketches(df_group)
+        columnas += [col for col in list(CUANTILES_MAGNITUD) + list(CAMPOS_DISTINTOS) if col in df_group.columns]
 
-    df_agrupado = add_columna_impacto(df_agrupado)
-    # print(df_agrupado) ## DEBUG!
-    
-    nombreTabla="JimenaGonzalez_magnitud_terremotos"    
+    return df_group[columnas]
+
+def columnas_agregacion(columnasGrupo, field_agg_by='properties.mag', sketches=False):
+    """
+    Obtiene las columnas a leer para obtener el estado de agregacion (ver agregar_parcial).
 
-    print("\n########## ELIMINAR TABLA - ARRANCAR DE 0 ##########")
-    delete_database_table("postgres",nombreTabla)
+    Parametros (args):
+        :param columnasGrupo (list) ==> Columnas por las cuales agrupar.
+        :param field_agg_by (str) ==> Campo a agregar. Por defecto, 'properties.mag'.
+        :param sketches (bool) ==> Indica si se incluyen los campos de CAMPOS_DISTINTOS. Por defecto, False.
 
-    print("\n########## CREACION DE TABLA ##########")
-    create_magnitude_database_table(nombreTabla)
+    Output (returns):
+        :return columnas (list) ==> Las columnas a leer, sin repetir.
+    """
+    return list(dict.fromkeys(columnasGrupo + [field_agg_by] + (list(CAMPOS_DISTINTOS.values()) if sketches else [])))
 
-    print("\n########## CARGA DE TABLA ##########")
-    load_database(nombreTabla, df_agrupado, "postgres")
+def leer_estado_magnitudes(rutaEstado, path):
+    """
+    Lee el estado persistido de las agregaciones de magnitud de un dataset.
 
-    print("\n########## LECTURA DE TABLA ##########")
-    print_contenido_tabla(nombreTabla, "postgres")
+    Parametros (args):
+        :param rutaEstado (str) ==> Path del archivo parquet del estado.
+        :param path (str) ==> Path del dataset de origen. Si el estado corresponde a otro dataset, se descarta.
+
+    Output (returns):
+        :return (tuple) ==> La tupla (df_estado, marca). (None, None) si no existe un estado valido.
+    """
+    marca = leer_marca(os.path.splitext(rutaEstado)[0] + ".json", path)
+
+    if not os.path.isfile(rutaEstado) or marca is None:
+        return None, None
+
+    return pds.read_parquet(rutaEstado, engine="pyarrow"), marca["marca"]
+
+def guardar_estado_magnitudes(df_estado, rutaEstado, path, marca):
+    """
+    Guarda el estado de las agregaciones de magnitud de un dataset, junto a la marca de escritura de los archivos procesados.
+    Ambos archivos se escriben con un nombre temporal y luego se renombran. Si el proceso se interrumpe entre ambos,
+    la proxima ejecucion vuelve a procesar las mismas particiones (el resultado es el mismo).
+
+    Parametros (args):
+        :param df_estado (Pandas.DataFrame) ==> Estado de agregacion por fecha y place.
+        :param rutaEstado (str) ==> Path del archivo parquet del estado.
+        :param path (str) ==> Path del dataset de origen.
+        :param marca (float) ==> Maximo momento de escritura (epoch) de los archivos procesados. None si el dataset no tiene manifest.
+
+    Output (returns):
+        :return None ==> Sin retorno
+    """
+    JG_Alm.crear_directorio(rutaEstado)
+
+    df_estado.to_parquet(rutaEstado + ".tmp", engine="pyarrow", index=False)
+    os.replace(rutaEstado + ".tmp", rutaEstado)
+
+    guardar_marca(os.path.splitext(rutaEstado)[0] + ".json", path, marca)
+
+def leer_marca(rutaMarca, path):
+    """
+    Lee la marca de escritura (ver guardar_marca) de los archivos de un dataset ya procesados.
+
+    Parametros (args):
+        :param rutaMarca (str) ==> Path del archivo .json de la marca.
+        :param path (str) ==> Path del dataset de origen. Si la marca corresponde a otro dataset, se descarta.
+
+    Output (returns):
+        :return marca (Dict) ==> El contenido de la marca ('marca' y datos adicionales). None si no existe una marca valida.
+    """
+    if not os.path.isfile(rutaMarca):
+        return None
+
+    with open(rutaMarca, "r", encoding="utf-8") as archivo:
+        marca = json.load(archivo)
+
+    ## La marca tambien se descarta si los places se normalizaron con otro patron (ver normalizar_place)
+    if marca.get("dataset") != os.path.normpath(path) or marca.get("marca") is None or marca.get("patron_place") != PATRON_PLACE.pattern:
+        return None
+
+    return marca
+
+def guardar_marca(rutaMarca, path, marca, **adicionales):
+    """
+    Guarda la marca de escritura de los archivos de un dataset ya procesados, con un nombre temporal que luego se renombra.
+
+    Parametros (args):
+        :param rutaMarca (str) ==> Path del archivo .json de la marca.
+        :param path (str) ==> Path del dataset de origen.
+        :param marca (float) ==> Maximo momento de escritura (epoch) de los archivos procesados. None si el dataset no tiene manifest.
+        :param adicionales ==> Otros datos a guardar junto a la marca.
+
+    Output (returns):
+        :return None ==> Sin retorno
+    """
+    JG_Alm.crear_directorio(rutaMarca)
+
+    with open(rutaMarca + ".tmp", "w", encoding="utf-8") as archivo:
+        json.dump({"dataset": os.path.normpath(path), "marca": marca, "patron_place": PATRON_PLACE.pattern, **adicionales}, archivo)
+    os.replace(rutaMarca + ".tmp", rutaMarca)
+
+def actualizar_agregado_magnitudes(path, rutaEstado=RUTA_ESTADO_MAGNITUDES, filasPorLote=100000, sketches=False):
+    """
+    Obtiene las magnitudes minima, promedio y maxima por place de un dataset particionado por fecha, de forma incremental
+    (ver actualizar_estado_magnitudes), y guarda el estado actualizado.
+
+    Parametros (args):
+        :param path (str) ==> Path del dataset de eventos.
+        :param rutaEstado (str) ==> Path del archivo parquet del estado. Por defecto, RUTA_ESTADO_MAGNITUDES.
+        :param filasPorLote (int) ==> Cantidad maxima de filas de cada lote de lectura. Por defecto, 100000.
+        :param sketches (bool) ==> Indica si el estado incluye los sketches de cuantiles y valores distintos (ver agregar_sketches). Por defecto, False.
+
+    Output (returns):
+        :return df_group (Pandas.DataFrame) ==> El resultado de las agregaciones, con el formato de finalizar_agregado. None si el dataset no existe.
+    """
+    df_estado, _, nuevaMarca = actualizar_estado_magnitudes(path, rutaEstado, filasPorLote, sketches)
+
+    if df_estado is None:
+        return None
+
+    guardar_estado_magnitudes(df_estado, rutaEstado, path, nuevaMarca)
+
+    return finalizar_agregado(df_estado)
+
+def actualizar_estado_magnitudes(path, rutaEstado=RUTA_ESTADO_MAGNITUDES, filasPorLote=100000, sketches=False):
+    """
+    Actualiza el estado de las agregaciones de magnitud por fecha y place de un dataset particionado por fecha, sin guardarlo:
+    se parte del estado persistido (cantidad, suma, minimo y maximo por fecha y place normalizado) y solo se leen
+    las particiones con archivos escritos luego de la ejecucion anterior (segun el manifest del dataset).
+    Cada particion leida reemplaza su estado previo, por lo que los registros actualizados (merge) o compactados no se cuentan dos veces.
+    Si el dataset no tiene manifest, o no existe un estado previo, se procesa el dataset completo.
+    Las particiones se leen por lotes (ver agregar_parcial_por_lotes).
+    El estado debe guardarse (ver guardar_estado_magnitudes) recien una vez cargado su resultado, para que ante un error
+    la proxima ejecucion vuelva a procesar las mismas particiones.
+
+    Parametros (args):
+        :param path (str) ==> Path del dataset de eventos.
+        :param rutaEstado (str) ==> Path del archivo parquet del estado. Por defecto, RUTA_ESTADO_MAGNITUDES.
+        :param filasPorLote (int) ==> Cantidad maxima de filas de cada lote de lectura. Por defecto, 100000.
+        :param sketches (bool) ==> Indica si el estado incluye los sketches de cuantiles y valores distintos (ver agregar_sketches). Por defecto, False.
+
+    Output (returns):
+        :return (tuple) ==> La tupla (df_estado, placesAfectados, nuevaMarca): el estado actualizado, los places (normalizados) cuyo resultado
+            pudo cambiar (None si se proceso el dataset completo) y la marca a guardar junto al estado. (None, None, None) si el dataset no existe.
+    """
+    field_group_by='properties.place'
+    field_agg_by='properties.mag'
+    if not os.path.exists(path):
+        print("\nEl archivo o path deseado es inexistente.")
+        return None, None, None
+
+    df_estado, marca = leer_estado_magnitudes(rutaEstado, path)
+
+    ## Un estado sin sketches (o con otra version de su formato) no puede completarse de forma incremental
+    if df_estado is not None and sketches and not sketches_vigentes(df_estado):
+        df_estado = None
+    df_manifest = JG_Alm.leer_manifest(path)
+    incremental = df_estado is not None and df_manifest is not None and df_manifest['fecha'].notna().all()
+
+    nuevaMarca = float(df_manifest['escrito_en'].max()) if df_manifest is not None and len(df_manifest) > 0 else None
+
+    if not incremental:
+        print("Agregacion completa del dataset.")
+        return agregar_parcial_por_lotes(path, ['fecha', field_group_by], field_agg_by, filasPorLote, sketches), None, nuevaMarca
+
+    fechas = sorted(set(df_manifest.loc[df_manifest['escrito_en'] > marca, 'fecha']))
+    nuevaMarca = max(marca, nuevaMarca or marca)
+    print(f"Agregacion incremental: {len(fechas)} particion(es) nueva(s) o modificada(s).")
+
+    ## Se descarta el estado de las particiones que ya no existen en el dataset, y el de las que se vuelven a leer
+    reemplazadas = ~df_estado['fecha'].isin(set(df_manifest['fecha'])) | df_estado['fecha'].isin(fechas)
+    placesAfectados = set(df_estado.loc[reemplazadas, field_group_by].dropna().astype(str))
+    df_estado = df_estado[~reemplazadas]
+
+    if fechas:
+        df_parcial = agregar_parcial_por_lotes(path, ['fecha', field_group_by], field_agg_by, filasPorLote, sketches, fechaDesde=fechas[0], fechaHasta=fechas[-1], filtros=[('fecha', 'in', fechas)])
+        placesAfectados |= set(df_parcial[field_group_by].dropna().astype(str))
+        df_estado = JG_Alm.concatenar_dataframes([df_estado, df_parcial])
+
+    return df_estado, placesAfectados, nuevaMarca
+
+def agregar_rollups_por_lotes(path, rollups=ROLLUPS, field_agg_by='properties.mag', filasPorLote=100000, **filtrosLectura):
+    """
+    Obtiene el estado parcial de las agregaciones (ver agregar_parcial) de varios rollups a la vez, en una unica lectura por lotes del dataset
+    (ver JG_Alm.iterar_lotes_parquet). Cada rollup descarta solo los registros con nulos en sus propias columnas de agrupamiento.
+
+    Parametros (args):
+        :param path (str) ==> Path del dataset.
+        :param rollups (Dict) ==> Nombre del rollup ==> columnas de agrupamiento. Por defecto, ROLLUPS.
+        :param field_agg_by (str) ==> Campo a agregar. Por defecto, 'properties.mag'.
+        :param filasPorLote (int) ==> Cantidad maxima de filas de cada lote. Por defecto, 100000.
+        :param filtrosLectura ==> Filtros de lectura (fechaDesde, fechaHasta, magnitudMinima, filtros) (ver JG_Alm.read_parquet).
+
+    Output (returns):
+        :return estados (Dict) ==> Nombre del rollup ==> estado parcial (una fila por grupo, con cantidad, suma, minimo y maximo).
+    """
+    columnas = list(dict.fromkeys(col for columnasGrupo in rollups.values() for col in columnasGrupo))
+    estados = {nombre: None for nombre in rollups}
+
+    for df_lote in JG_Alm.iterar_lotes_parquet(path, columnas + [field_agg_by], filasPorLote, **filtrosLectura):
+        for nombre, columnasGrupo in rollups.items():
+            df_parcial = agregar_parcial(preparar_columnas_grupo(df_lote.copy(), columnasGrupo), columnasGrupo, field_agg_by)
+            estados[nombre] = df_parcial if estados[nombre] is None else combinar_parciales(JG_Alm.concatenar_dataframes([estados[nombre], df_parcial]), columnasGrupo)
+
+    return {nombre: estado if estado is not None else pds.DataFrame(columns=rollups[nombre] + ['cantidad', 'suma', 'minimo', 'maximo']) for nombre, estado in estados.items()}
+
+def nombre_columna_rollup(columna):
+    """
+    Obtiene el nombre en base de datos de una columna de agrupamiento de un rollup ('properties.place' ==> 'place').
+
+    Parametros (args):
+        :param columna (str) ==> Nombre de la columna.
+
+    Output (returns):
+        :return nombre (str) ==> Nombre de la columna en base de datos.
+    """
+    return columna.split(".")[-1]
+
+def finalizar_rollup(df_estado, columnasGrupo):
+    """
+    Obtiene las filas a cargar de un rollup a partir de su estado de agregacion: cantidad de eventos con magnitud
+    y magnitudes minima, promedio (truncada a dos decimales) y maxima por grupo.
+
+    Parametros (args):
+        :param df_estado (Pandas.DataFrame) ==> Estado de agregacion del rollup (ver agregar_rollups_por_lotes).
+        :param columnasGrupo (list) ==> Columnas de agrupamiento del rollup.
+
+    Output (returns):
+        :return df_rollup (Pandas.DataFrame) ==> Las filas del rollup, con los nombres de columna de su tabla (ver create_rollup_database_table).
+    """
+    df_rollup = df_estado.rename(columns={col: nombre_columna_rollup(col) for col in columnasGrupo})
+    df_rollup = df_rollup.rename(columns={'minimo': 'magnitud_minima', 'maximo': 'magnitud_maxima'})
+    df_rollup['magnitud_promedio'] = df_rollup['suma'] / df_rollup['cantidad'].where(df_rollup['cantidad'] > 0)
+    truncar_decimales(df_rollup, 'magnitud_promedio', 2)
+
+    if 'fecha' in df_rollup.columns:
+        df_rollup['fecha'] = pds.to_datetime(df_rollup['fecha'].astype(str)).dt.date
+    if 'place' in df_rollup.columns:
+        df_rollup['place'] = df_rollup['place'].astype(str)
+
+    columnas = [nombre_columna_rollup(col) for col in columnasGrupo]
+
+    return df_rollup[columnas + ['cantidad', 'magnitud_minima', 'magnitud_promedio', 'magnitud_maxima']].sort_values(columnas, ignore_index=True)
+
+def actualizar_rollups(path, rollups=ROLLUPS, rutaMarca=RUTA_MARCA_ROLLUPS, motor="postgres", filasPorLote=100000):
+    """
+    Actualiza las tablas de rollup por intervalo de tiempo (por dia, por hora y por place y dia, ver ROLLUPS) de forma incremental:
+    solo se leen las particiones 'fecha' con archivos escritos luego de la ultima actualizacion (segun el manifest del dataset),
+    y en cada tabla se reemplazan unicamente las filas de esas fechas (y se eliminan las de fechas que ya no existen en el dataset).
+    Si no existe una marca previa, o el dataset no tiene manifest, se reconstruyen las tablas completas.
+    La marca solo se actualiza si todas las tablas se actualizaron.
+
+    Parametros (args):
+        :param path (str) ==> Path del dataset de eventos, particionado por fecha.
+        :param rollups (Dict) ==> Nombre de la tabla ==> columnas de agrupamiento. Por defecto, ROLLUPS.
+        :param rutaMarca (str) ==> Path del archivo .json de la marca de los archivos ya cargados. Por defecto, RUTA_MARCA_ROLLUPS.
+        :param motor (str, optional) ==> Nombre del motor correspondiente a la base de datos. Por defecto, "postgres".
+        :param filasPorLote (int) ==> Cantidad maxima de filas de cada lote de lectura. Por defecto, 100000.
+
+    Output (returns):
+        :return df_rollups (Dict) ==> Nombre de la tabla ==> filas cargadas (ver finalizar_rollup). None si el dataset no existe.
+    """
+    if not os.path.exists(path):
+        print("\nEl archivo o path deseado es inexistente.")
+        return None
+
+    marca = leer_marca(rutaMarca, path)
+    df_manifest = JG_Alm.leer_manifest(path)
+    incremental = marca is not None and df_manifest is not None and df_manifest['fecha'].notna().all()
+
+    nuevaMarca = float(df_manifest['escrito_en'].max()) if df_manifest is not None and len(df_manifest) > 0 else None
+    fechasDataset = sorted(set(df_manifest['fecha'])) if incremental else None
+
+    if incremental:
+        fechas = sorted(set(df_manifest.loc[df_manifest['escrito_en'] > marca['marca'], 'fecha']))
+        eliminadas = sorted(set(marca.get("fechas", [])) - set(fechasDataset))
+        nuevaMarca = max(marca['marca'], nuevaMarca or marca['marca'])
+        print(f"Rollups incrementales: {len(fechas)} fecha(s) nueva(s) o modificada(s), {len(eliminadas)} eliminada(s).")
+        if not fechas and not eliminadas:
+            return {nombre: None for nombre in rollups}
+        estados = agregar_rollups_por_lotes(path, rollups, filasPorLote=filasPorLote, fechaDesde=fechas[0], fechaHasta=fechas[-1], filtros=[('fecha', 'in', fechas)]) if fechas else {nombre: pds.DataFrame(columns=columnasGrupo + ['cantidad', 'suma', 'minimo', 'maximo']) for nombre, columnasGrupo in rollups.items()}
+        fechasReemplazo = fechas + eliminadas
+    else:
+        print("Rollups completos del dataset.")
+        estados = agregar_rollups_por_lotes(path, rollups, filasPorLote=filasPorLote)
+        fechasReemplazo = None
+        fechasDataset = sorted(set(df_manifest['fecha'].dropna())) if df_manifest is not None else None
+
+    df_rollups = {}
+    actualizadas = True
+    for nombreTabla, columnasGrupo in rollups.items():
+        df_rollups[nombreTabla] = finalizar_rollup(estados[nombreTabla], columnasGrupo)
+        create_rollup_database_table(nombreTabla, columnasGrupo)
+        fechas = [pds.Timestamp(fecha).date() for fecha in fechasReemplazo] if fechasReemplazo is not None else None
+        actualizadas = reemplazar_filas_database(nombreTabla, df_rollups[nombreTabla], 'fecha', fechas, motor) and actualizadas
+
+    if actualizadas:
+        guardar_marca(rutaMarca, path, nuevaMarca, fechas=fechasDataset)
+
+    return df_rollups
+
+@lru_cache(maxsize=TAMANO_CACHE_PLACES)
+def normalizar_place(place):
+    """
+    Obtiene la localidad/region de referencia de un place de USGS: "12 km NNE of Ridgecrest, CA" ==> "Ridgecrest, CA".
+    Los places sin distancia y direccion ("Southern Alaska") se conservan, sin espacios extremos. Los resultados se memoizan
+    (cache acotado a TAMANO_CACHE_PLACES places), ya que los mismos places se repiten en muchos eventos y ejecuciones.
+
+    Parametros (args):
+        :param place (str) ==> El place a normalizar.
+
+    Output (returns):
+        :return referencia (str) ==> La localidad/region de referencia. Los valores que no son texto se devuelven sin cambios.
+    """
+    if not isinstance(place, str):
+        return place
+
+    coincidencia = PATRON_PLACE.match(place)
+
+    return coincidencia.group("referencia") if coincidencia else place.strip()
+
+def normalizar_places(serie):
+    """
+    Normaliza una columna de places (ver normalizar_place). Cada valor distinto se normaliza una unica vez,
+    y el resultado es categorico, con una categoria por localidad de referencia (ordenadas alfabeticamente).
+
+    Parametros (args):
+        :param serie (Pandas.Series) ==> La columna de places (texto o categorica).
+
+    Output (returns):
+        :return serie (Pandas.Series) ==> La columna categorica de places normalizados (los nulos se conservan).
+    """
+    if isinstance(serie.dtype, pds.CategoricalDtype):
+        codigos, valores = serie.cat.codes.to_numpy(), serie.cat.categories
+    else:
+        codigos, valores = pds.factorize(serie)
+
+    ## Los valores distintos que comparten localidad se unifican en una misma categoria (-1 ==> nulo)
+    codigosReferencia, referencias = pds.factorize(pds.Index([normalizar_place(valor) for valor in valores], dtype=object), sort=True)
+    codigosReferencia = np.append(codigosReferencia, -1)
+
+    return pds.Series(pds.Categorical.from_codes(codigosReferencia[codigos], categories=referencias), index=serie.index, name=serie.name)
+
+def normalizar_places_arrow(columna):
+    """
+    Version Arrow de normalizar_places: normaliza el diccionario de la columna y reasigna sus indices.
+
+    Parametros (args):
+        :param columna (pyarrow.ChunkedArray) ==> La columna de places (texto, o diccionario unificado entre sus bloques).
+
+    Output (returns):
+        :return columna (pyarrow.DictionaryArray) ==> La columna de places normalizados, de tipo diccionario.
+    """
+    columna = columna.combine_chunks()
+    if not pa.types.is_dictionary(columna.type):
+        columna = columna.dictionary_encode()
+
+    codigosReferencia, referencias = pds.factorize(pds.Index([normalizar_place(valor) for valor in columna.dictionary.to_pylist()], dtype=object), sort=True)
+    indices = pc.take(pa.array(codigosReferencia, type=pa.int32()), columna.indices)
+
+    return pa.DictionaryArray.from_arrays(indices, pa.array(referencias, type=pa.string()))
+
+def clasificar(valores, escala):
+    """
+    Clasifica un conjunto de valores segun una escala (ver ESCALAS), de forma vectorizada: la clase de cada valor se obtiene
+    por busqueda binaria sobre los limites de la escala (numpy.searchsorted), sin evaluar una funcion de Python por valor.
+
+    Parametros (args):
+        :param valores (Pandas.Series, numpy.ndarray o list) ==> Los valores a clasificar. Los valores no numericos se consideran nulos.
+        :param escala (Dict) ==> Escala de clasificacion, con las claves 'limites' y 'etiquetas' (una etiqueta mas que limites).
+
+    Output (returns):
+        :return clases (Pandas.Categorical) ==> La etiqueta de cada valor ("-" para los valores nulos).
+    """
+    valores = pds.to_numeric(pds.Series(valores), errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+    codigos = np.searchsorted(np.asarray(escala["limites"], dtype="float64"), valores, side="right")
+    codigos[np.isnan(valores)] = len(escala["etiquetas"])
+
+    return pds.Categorical.from_codes(codigos, categories=list(escala["etiquetas"]) + ["-"])
+
+def enriquecer(df, reglas=REGLAS_ENRIQUECIMIENTO_MAGNITUDES, escalas=ESCALAS):
+    """
+    Agrega a un DataFrame las columnas derivadas de un conjunto de reglas de clasificacion (ver clasificar).
+    Todas las columnas se calculan sobre el DataFrame recibido y se asignan juntas, generando un unico DataFrame nuevo.
+
+    Parametros (args):
+        :param df (Pandas.DataFrame) ==> El DataFrame a enriquecer. No se modifica.
+        :param reglas (Dict) ==> Por cada columna a generar, la tupla (campo de origen, nombre de la escala). Por defecto, REGLAS_ENRIQUECIMIENTO_MAGNITUDES.
+        :param escalas (Dict) ==> Escalas de clasificacion. Por defecto, ESCALAS.
+
+    Output (returns):
+        :return df (Pandas.DataFrame) ==> El DataFrame con las nuevas columnas (categoricas). Las reglas cuyo campo de origen no existe se omiten.
+    """
+    columnas = {}
+
+    for columna, (campo, escala) in reglas.items():
+        if campo not in df.columns:
+            print(f"No se genera la columna '{columna}': el campo '{campo}' no existe.")
+            continue
+
+        columnas[columna] = clasificar(df[campo].to_numpy(), escalas[escala])
+
+    return df.assign(**columnas)
+
+def get_impacto_magnitud(value):
+    """
+    Obtener el impacto segun la magnitud de un terremoto (ver ESCALAS["impacto"]).
+
+    Parametros (args):
+        :param value (numerical value) ==> El valor a comparar.
+
+    Output (returns):
+        :return (string ) ==> La salida es un string o guion (valor nulo) con el impacto correspondiente.
+    """
+    return clasificar([value], ESCALAS["impacto"])[0]
+
+def add_columna_impacto(df):
+    """
+    Añadir una nueva columna al DataFrame, que contenga el impacto de los terremotos segun su magnitud maxima.
+
+    Parametros (args):
+        :param df (Pandas.DataFrame) ==> El DataFrame que se desea analizar.
+
+    Output (returns):
+        :return df_group (Pandas.DataFrame) ==> La salida es un nuevo DataFrame que incluye a la nueva columna.
+    """
+    try:
+        df = enriquecer(df, REGLAS_ENRIQUECIMIENTO_MAGNITUDES)
+
+    except Exception as e:
+        print(f"Error al añadir la nueva columna al DataFrame: {str(e)}")
+    
+    return df
+
+### Pipeline de Transformacion ###
+
+class PipelineTransformacion:
+    """
+    Lista ordenada de pasos de transformacion, que se ejecutan uno a uno y en orden sobre un DataFrame (ver ejecutar).
+    Tipos de paso:
+        - 'filtro': funcion df ==> mascara booleana de las filas a conservar. Es el unico tipo de paso que se combina: los filtros consecutivos
+          se fusionan en una unica mascara, que se aplica una sola vez (antes del siguiente paso de otro tipo, o al final).
+        - 'columna': funcion df ==> valores de una columna, que se asigna sobre el DataFrame en proceso (sin copiarlo).
+        - 'transformacion': funcion df ==> DataFrame (por ejemplo, un agrupamiento). Cada transformacion puede generar un nuevo DataFrame.
+    El DataFrame recibido no se modifica (ver ejecutar).
+    Por cada paso se registran las filas de entrada y salida y los segundos de ejecucion (ver imprimir_reporte).
+    """
+
+    TIPOS_PASO = ("filtro", "columna", "transformacion")
+
+    def __init__(self, pasos=None):
+        """
+        Parametros (args):
+            :param pasos (list) ==> Pasos iniciales, como tuplas (tipo, nombre, funcion) o (tipo, nombre, funcion, columna). Por defecto, None (sin pasos).
+        """
+        self.pasos = []
+        self.reporte = None
+
+        for paso in pasos or []:
+            self.agregar(*paso)
+
+    def agregar(self, tipo, nombre, funcion, columna=None):
+        """
+        Agrega un paso al final del plan.
+
+        Parametros (args):
+            :param tipo (str) ==> Tipo de paso ('filtro', 'columna' o 'transformacion').
+            :param nombre (str) ==> Nombre del paso (para el reporte).
+            :param funcion (callable) ==> Funcion del paso, que recibe el DataFrame en proceso.
+            :param columna (str) ==> Columna a asignar (solo para los pasos de tipo 'columna'). Por defecto, None.
+
+        Output (returns):
+            :return self (PipelineTransformacion) ==> El mismo pipeline, para encadenar pasos.
+
+        Raises:
+            ValueError ==> Si el tipo de paso no es valido, o si un paso de tipo 'columna' no indica la columna.
+        """
+        if tipo not in self.TIPOS_PASO:
+            raise ValueError(f"Tipo de paso invalido: '{tipo}'. Tipos validos: {self.TIPOS_PASO}.")
+        if tipo == "columna" and columna is None:
+            raise ValueError(f"El paso '{nombre}' de tipo 'columna' requiere el nombre de la columna a asignar.")
+
+        self.pasos.append({"tipo": tipo, "nombre": nombre, "funcion": funcion, "columna": columna})
+
+        return self
+
+    def filtrar(self, nombre, condicion):
+        """Agrega un paso de tipo 'filtro' (ver agregar)."""
+        return self.agregar("filtro", nombre, condicion)
+
+    def asignar(self, nombre, columna, funcion):
+        """Agrega un paso de tipo 'columna' (ver agregar)."""
+        return self.agregar("columna", nombre, funcion, columna)
+
+    def transformar(self, nombre, funcion):
+        """Agrega un paso de tipo 'transformacion' (ver agregar)."""
+        return self.agregar("transformacion", nombre, funcion)
+
+    def ejecutar(self, df):
+        """
+        Ejecuta el plan sobre un DataFrame. Los pasos de tipo 'columna' y 'transformacion' pueden modificar el DataFrame en proceso,
+        por lo que si el plan no comienza con un filtro (que genera un DataFrame filtrado), el DataFrame recibido se copia una unica vez.
+
+        Parametros (args):
+            :param df (Pandas.DataFrame) ==> El DataFrame de entrada. No se modifica.
+
+        Output (returns):
+            :return df (Pandas.DataFrame) ==> El DataFrame resultante del ultimo paso.
+        """
+        registros = []
+        mascara = None
+        entrada = df
+
+        for paso in self.pasos:
+            inicio = time.perf_counter()
+            filasEntrada = len(df) if mascara is None else int(mascara.sum())
+
+            if paso["tipo"] == "filtro":
+                ## La condicion se evalua sobre las columnas del DataFrame sin filtrar, y se combina con la mascara acumulada
+                condicion = np.asarray(paso["funcion"](df), dtype=bool)
+                mascara = condicion if mascara is None else mascara & condicion
+                filasSalida = int(mascara.sum())
+            else:
+                if mascara is not None:
+                    df = df[mascara]
+                    mascara = None
+                elif df is entrada:
+                    ## Los pasos pueden modificar el DataFrame que reciben: el DataFrame de entrada se copia (una unica vez)
+                    df = df.copy()
+
+                if paso["tipo"] == "columna":
+                    df[paso["columna"]] = paso["funcion"](df)
+                else:
+                    df = paso["funcion"](df)
+                filasSalida = len(df)
+
+            registros.append({"paso": paso["nombre"], "tipo": paso["tipo"], "filas_entrada": filasEntrada, "filas_salida": filasSalida, "segundos": time.perf_counter() - inicio})
+
+        if mascara is not None:
+            df = df[mascara]
+
+        self.reporte = pds.DataFrame(registros, columns=["paso", "tipo", "filas_entrada", "filas_salida", "segundos"])
+
+        return df
+
+    def imprimir_reporte(self):
+        """Imprime las filas de entrada y salida y los segundos de cada paso de la ultima ejecucion."""
+        if self.reporte is None:
+            print("El pipeline aun no fue ejecutado.")
+        else:
+            print(self.reporte.to_string(index=False))
+
+def crear_pipeline_magnitudes(agrupar=True, finalizar=True, clasificarImpacto=True, field_group_by='properties.place', field_agg_by='properties.mag'):
+    """
+    Crea el pipeline de transformacion de las magnitudes por place (ver PipelineTransformacion).
+
+    Parametros (args):
+        :param agrupar (bool) ==> Indica si el pipeline recibe los eventos y los agrupa: elimina los nulos (o 'null') del campo agrupador,
+            normaliza el place (ver normalizar_places) y agrupa (ver agrupar_magnitudes). Si es False, recibe el resultado ya agrupado. Por defecto, True.
+        :param finalizar (bool) ==> Indica si se incluyen los pasos previos a la carga en base de datos: truncado de decimales,
+            columna impacto_maximo (ver add_columna_impacto) e indice 'place' (nombre de la clave de la tabla). Por defecto, True.
+        :param clasificarImpacto (bool) ==> Indica si el pipeline calcula la columna impacto_maximo (False si ya la calculo el backend SQL). Por defecto, True.
+        :param field_group_by (str) ==> Campo por el cual agrupar. Por defecto, 'properties.place'.
+        :param field_agg_by (str) ==> Campo a agregar. Por defecto, 'properties.mag'.
+
+    Output (returns):
+        :return pipeline (PipelineTransformacion) ==> El pipeline, a ejecutar sobre los eventos o el resultado agrupado.
+    """
+    pipeline = PipelineTransformacion()
+
+    if agrupar:
+        pipeline.filtrar("eliminar_nulos", lambda df: df[field_group_by].notna() & (df[field_group_by] != 'null'))
+        pipeline.asignar("normalizar_place", field_group_by, lambda df: normalizar_places(df[field_group_by]))
+        pipeline.transformar("agrupar", lambda df: agrupar_magnitudes(df, field_group_by, field_agg_by))
+
+    if finalizar:
+        for columna in ['magnitud_promedio'] + list(CUANTILES_MAGNITUD):
+            pipeline.transformar(f"truncar_{columna}", lambda df, columna=columna: truncar_decimales(df, columna, 2) if columna in df.columns else df)
+        if clasificarImpacto:
+            pipeline.transformar("impacto_maximo", add_columna_impacto)
+        pipeline.transformar("indice_place", lambda df: df.rename_axis('place'))
+
+    return pipeline
+
+### Backend SQL embebido (DuckDB) ###
+
+def conectar_duckdb(config=CONFIG_DUCKDB):
+    """
+    Abre una conexion a una base DuckDB en memoria (sin servidor). La libreria es opcional: solo se importa al utilizar este backend.
+
+    Parametros (args):
+        :param config (Dict) ==> Configuracion (memory_limit, temp_directory, threads). Por defecto, CONFIG_DUCKDB.
+
+    Output (returns):
+        :return conn (duckdb.DuckDBPyConnection) ==> La conexion.
+
+    Raises:
+        ImportError ==> Si la libreria duckdb no esta instalada.
+    """
+    try:
+        import duckdb
+    except ImportError as ex:
+        print("ERROR! El backend SQL requiere la libreria duckdb (pip install duckdb).")
+        raise ex
+
+    opciones = {clave: valor for clave, valor in config.items() if valor is not None}
+    if "temp_directory" in opciones:
+        os.makedirs(opciones["temp_directory"], exist_ok=True)
+
+    return duckdb.connect(database=":memory:", config=opciones)
+
+def origen_duckdb(path):
+    """
+    Obtiene el origen a leer con read_parquet de DuckDB: la lista de archivos del manifest (ver JG_Alm.archivos_a_leer).
+    No se listan los directorios del dataset (ej. con un patron '**/*.parquet'), ya que durante un merge o compactacion pueden contener ambas versiones de una particion.
+
+    Parametros (args):
+        :param path (str) ==> El path del dataset (o de un archivo parquet).
+
+    Output (returns):
+        :return origen (str o list) ==> La lista de archivos (o el path, si es un archivo).
+    """
+    return JG_Alm.archivos_a_leer(path)
+
+def sql_columna(nombre):
+    """
+    Obtiene el nombre de una columna como identificador SQL (entre comillas dobles, ya que los campos de USGS contienen puntos).
+
+    Parametros (args):
+        :param nombre (str) ==> Nombre de la columna.
+
+    Output (returns):
+        :return identificador (str) ==> El identificador SQL.
+    """
+    return '"' + nombre.replace('"', '""') + '"'
+
+def sql_texto(valor):
+    """
+    Obtiene un texto como literal SQL (entre comillas simples).
+
+    Parametros (args):
+        :param valor (str) ==> El texto.
+
+    Output (returns):
+        :return literal (str) ==> El literal SQL.
+    """
+    return "'" + str(valor).replace("'", "''") + "'"
+
+def sql_clasificacion(expresion, escala):
+    """
+    Version SQL de clasificar: genera la expresion CASE que clasifica un valor segun una escala (ver ESCALAS),
+    con los mismos limites (inclusive) y etiquetas ("-" para los valores nulos).
+
+    Parametros (args):
+        :param expresion (str) ==> Expresion SQL del valor a clasificar.
+        :param escala (Dict) ==> Escala de clasificacion, con las claves 'limites' y 'etiquetas'.
+
+    Output (returns):
+        :return sql (str) ==> La expresion CASE.
+    """
+    casos = [f"WHEN {expresion} IS NULL OR isnan({expresion}) THEN '-'"]
+    casos += [f"WHEN {expresion} >= {float(limite)!r} THEN {sql_texto(etiqueta)}" for limite, etiqueta in reversed(list(zip(escala["limites"], escala["etiquetas"][1:])))]
+
+    return f"CASE {' '.join(casos)} ELSE {sql_texto(escala['etiquetas'][0])} END"
+
+def sql_normalizar_place(expresion):
+    """
+    Version SQL de normalizar_place: extrae la localidad de referencia con el mismo patron (PATRON_PLACE).
+
+    Parametros (args):
+        :param expresion (str) ==> Expresion SQL del place.
+
+    Output (returns):
+        :return sql (str) ==> La expresion del place normalizado.
+    """
+    ## Patron sin el nombre del grupo (RE2 no acepta (?P<...>) en todas las versiones); el grupo 1 es la referencia
+    patron = sql_texto(PATRON_PLACE.pattern.replace("?P<referencia>", ""))
+    opciones = "'i'" if PATRON_PLACE.flags & re.IGNORECASE else "''"
+
+    return (f"CASE WHEN regexp_matches({expresion}, {patron}, {opciones}) THEN regexp_extract({expresion}, {patron}, 1, {opciones}) "
+            f"ELSE regexp_replace({expresion}, '^\\s+|\\s+$', '', 'g') END")
+
+def generar_df_magnitudes_agrupado_duckdb(path, clasificarImpacto=False, config=CONFIG_DUCKDB):
+    """
+    Version SQL de generar_df_magnitudes_agrupado: las agregaciones se ejecutan con DuckDB directamente sobre el dataset parquet particionado,
+    sin cargarlo en memoria. DuckDB solo lee las columnas utilizadas, aplica los filtros durante la lectura, lee los archivos en paralelo
+    y, si la memoria configurada no alcanza, vuelca a disco (ver CONFIG_DUCKDB). Solo el resultado agrupado se convierte a Pandas.
+    Los cuantiles y la cantidad de valores distintos se calculan de forma exacta (quantile_cont, count(DISTINCT ...)).
+
+    Parametros (args):
+        :param path (str) ==> Path del dataset de eventos.
+        :param clasificarImpacto (bool) ==> Indica si la columna impacto_maximo se calcula en la misma consulta (ver sql_clasificacion). Por defecto, False.
+        :param config (Dict) ==> Configuracion de DuckDB. Por defecto, CONFIG_DUCKDB.
+
+    Output (returns):
+        :return df_group (Pandas.DataFrame) ==> Un DataFrame con el resultado de las agregaciones, con el mismo formato que generar_df_magnitudes_agrupado
+            (y, si clasificarImpacto, la columna impacto_maximo, igual a la de add_columna_impacto).
+    """
+    field_group_by='properties.place'
+    field_agg_by='properties.mag'
+    place, mag = sql_columna(field_group_by), sql_columna(field_agg_by)
+
+    cuantiles = "".join(f", quantile_cont(e.{mag}, {float(cuantil)!r}) AS {sql_columna(columna)}" for columna, cuantil in CUANTILES_MAGNITUD.items())
+    distintos = "".join(f", count(DISTINCT e.{sql_columna(campo)}) AS {sql_columna(columna)}" for columna, campo in CAMPOS_DISTINTOS.items())
+    impacto = f", {sql_clasificacion(f'max(e.{mag})', ESCALAS['impacto'])} AS impacto_maximo" if clasificarImpacto else ""
+
+    ## Cada place distinto se normaliza una unica vez (ver normalizar_places), y los eventos se agrupan por su localidad de referencia
+    sql_query = f"""
+        WITH eventos AS (
+            SELECT *
+            FROM read_parquet($origen, hive_partitioning = true, union_by_name = true)
+            WHERE {place} IS NOT NULL AND {place} <> 'null'
+        ),
+        places AS (
+            SELECT place, {sql_normalizar_place('place')} AS referencia
+            FROM (SELECT DISTINCT {place} AS place FROM eventos)
+        )
+        SELECT p.referencia AS {place},
+               min(e.{mag}) AS magnitud_minima,
+               avg(e.{mag}) AS magnitud_promedio,
+               max(e.{mag}) AS magnitud_maxima{cuantiles}{distintos}{impacto}
+        FROM eventos e
+        JOIN places p ON e.{place} = p.place
+        GROUP BY 1
+        ORDER BY 1
+    """
+
+    conn = conectar_duckdb(config)
+    try:
+        df_group = conn.execute(sql_query, {"origen": origen_duckdb(path)}).df()
+    finally:
+        conn.close()
+
+    if clasificarImpacto:
+        df_group['impacto_maximo'] = pds.Categorical(df_group['impacto_maximo'], categories=list(ESCALAS['impacto']['etiquetas']) + ["-"])
+
+    return df_group.set_index(field_group_by)
+
+### Sketches combinables (cuantiles y cantidad de valores distintos) ###
+
+def sketches_vigentes(df_estado):
+    """
+    Indica si un estado de agregacion incluye los sketches de cada grupo (ver agregar_sketches), serializados con la version actual del formato.
+
+    Parametros (args):
+        :param df_estado (Pandas.DataFrame) ==> El estado de agregacion.
+
+    Output (returns):
+        :return vigentes (bool) ==> True si el estado puede combinarse con nuevos sketches.
+    """
+    if 'tdigest' not in df_estado.columns:
+        return False
+
+    columnas = ['tdigest'] + [col for col in df_estado.columns if col.startswith('hll_')]
+
+    return all(not sketch or sketch[0] == VERSION_SKETCH for columna in columnas for sketch in df_estado[columna])
+
+def codigos_grupo(grupos):
+    """
+    Obtiene el numero de grupo de cada fila de un GroupBy de Pandas, en el mismo orden que el resultado de sus agregaciones.
+
+    Parametros (args):
+        :param grupos (Pandas.GroupBy) ==> El agrupamiento.
+
+    Output (returns):
+        :return codigos (numpy.ndarray) ==> Numero de grupo (entero) de cada fila; -1 para las filas sin grupo (claves nulas).
+    """
+    return grupos.ngroup().fillna(-1).to_numpy(dtype="int64")
+
+def agregar_sketches(df_parcial, codigos, df, field_agg_by='properties.mag'):
+    """
+    Agrega al estado parcial de agregacion (ver agregar_parcial) los sketches combinables de cada grupo:
+    un t-digest del campo agregado (columna 'tdigest') y un HyperLogLog por cada campo de CAMPOS_DISTINTOS (columnas 'hll_<campo>'),
+    serializados como bytes. Los sketches de distintas particiones o ejecuciones se combinan con combinar_sketches.
+
+    Parametros (args):
+        :param df_parcial (Pandas.DataFrame) ==> Estado parcial, con una fila por grupo.
+        :param codigos (numpy.ndarray) ==> Numero de grupo de cada fila de df (ver codigos_grupo).
+        :param df (Pandas.DataFrame) ==> Los datos agrupados.
+        :param field_agg_by (str) ==> Campo del que se obtienen los cuantiles. Por defecto, 'properties.mag'.
+
+    Output (returns):
+        :return df_parcial (Pandas.DataFrame) ==> El estado parcial con las columnas de los sketches.
+    """
+    validos = codigos >= 0
+    codigos = codigos[validos]
+
+    centroides = construir_tdigest(codigos, pds.to_numeric(df[field_agg_by], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)[validos])
+    df_parcial['tdigest'] = serializar_por_grupo(centroides[0], len(df_parcial), *centroides[1:])
+
+    for campo in CAMPOS_DISTINTOS.values():
+        if campo in df.columns:
+            registros = combinar_hll(codigos, *construir_hll(df[campo][validos]))
+            df_parcial[f'hll_{campo}'] = serializar_por_grupo(registros[0], len(df_parcial), *registros[1:])
+
+    return df_parcial
+
+def combinar_sketches(df_combinado, codigos, df_parciales):
+    """
+    Combina los sketches de los estados parciales de cada grupo (ver agregar_sketches).
+
+    Parametros (args):
+        :param df_combinado (Pandas.DataFrame) ==> Estado combinado, con una fila por grupo.
+        :param codigos (numpy.ndarray) ==> Numero de grupo de cada fila de df_parciales (ver codigos_grupo).
+        :param df_parciales (Pandas.DataFrame) ==> Los estados parciales, con sus sketches.
+
+    Output (returns):
+        :return df_combinado (Pandas.DataFrame) ==> El estado combinado con los sketches de cada grupo.
+    """
+    validos = codigos >= 0
+
+    centroides = construir_tdigest(*deserializar_por_grupo(df_parciales['tdigest'][validos], codigos[validos], ["float64", "float64"]))
+    df_combinado['tdigest'] = serializar_por_grupo(centroides[0], len(df_combinado), *centroides[1:])
+
+    for columna in [col for col in df_parciales.columns if col.startswith('hll_')]:
+        registros = combinar_hll(*deserializar_por_grupo(df_parciales[columna][validos], codigos[validos], ["uint16", "uint8"]))
+        df_combinado[columna] = serializar_por_grupo(registros[0], len(df_combinado), *registros[1:])
+
+    return df_combinado
+
+def finalizar_sketches(df_group):
+    """
+    Obtiene, a partir de los sketches de cada grupo, los cuantiles de CUANTILES_MAGNITUD y la cantidad estimada de valores distintos de CAMPOS_DISTINTOS.
+
+    Parametros (args):
+        :param df_group (Pandas.DataFrame) ==> Estado combinado por grupo, con las columnas magnitud_minima y magnitud_maxima y los sketches.
+
+    Output (returns):
+        :return df_group (Pandas.DataFrame) ==> El DataFrame con las nuevas columnas.
+    """
+    centroides = [leer_sketch(sketch, ["float64", "float64"]) for sketch in df_group['tdigest']]
+
+    for columna, cuantil in CUANTILES_MAGNITUD.items():
+        df_group[columna] = [cuantil_tdigest(medias, pesos, cuantil, minimo, maximo) for (medias, pesos), minimo, maximo in zip(centroides, df_group['magnitud_minima'], df_group['magnitud_maxima'])]
+
+    for columna, campo in CAMPOS_DISTINTOS.items():
+        if f'hll_{campo}' in df_group.columns:
+            df_group[columna] = [estimar_hll(leer_sketch(sketch, ["uint16", "uint8"])[1]) for sketch in df_group[f'hll_{campo}']]
+
+    return df_group
+
+def construir_tdigest(codigos, valores, pesos=None, compresion=COMPRESION_TDIGEST):
+    """
+    Construye o combina t-digests de varios grupos a la vez, de forma vectorizada: los valores de cada grupo se ordenan
+    y se agrupan en centroides (media y peso) segun la escala k1 del t-digest, que genera centroides mas pequeños
+    en los extremos de la distribucion (donde se ubican los cuantiles altos). Al recibir los centroides de otros
+    t-digests (con sus pesos) el resultado es su combinacion.
+
+    Parametros (args):
+        :param codigos (numpy.ndarray) ==> Numero de grupo de cada valor.
+        :param valores (numpy.ndarray) ==> Los valores (o las medias de los centroides). Los nulos se descartan.
+        :param pesos (numpy.ndarray) ==> El peso de cada valor. Por defecto, None (peso 1).
+        :param compresion (int) ==> Cantidad aproximada de centroides por grupo. Por defecto, COMPRESION_TDIGEST.
+
+    Output (returns):
+        :return (tuple) ==> La tupla (codigos, medias, pesos) de los centroides, ordenados por grupo y media.
+    """
+    valores = np.asarray(valores, dtype="float64")
+    pesos = np.ones(len(valores)) if pesos is None else np.asarray(pesos, dtype="float64")
+    validos = ~np.isnan(valores)
+    codigos, valores, pesos = codigos[validos], valores[validos], pesos[validos]
+
+    orden = np.lexsort((valores, codigos))
+    codigos, valores, pesos = codigos[orden], valores[orden], pesos[orden]
+
+    if len(valores) == 0:
+        return codigos, valores, pesos
+
+    ## Cuantil del centro de cada valor dentro de su grupo, y su posicion en la escala k1 (de 0 a compresion)
+    inicioGrupo = np.flatnonzero(np.r_[True, codigos[1:] != codigos[:-1]])
+    grupo = np.repeat(np.arange(len(inicioGrupo)), np.diff(np.r_[inicioGrupo, len(valores)]))
+    acumulado = np.cumsum(pesos)
+    previo = (acumulado - pesos)[inicioGrupo][grupo]
+    cuantil = (acumulado - previo - pesos / 2) / np.add.reduceat(pesos, inicioGrupo)[grupo]
+    k = np.floor(compresion * (np.arcsin(2 * cuantil - 1) / np.pi + 0.5))
+
+    ## Los valores consecutivos de un mismo grupo con igual k forman un centroide
+    inicios = np.flatnonzero(np.r_[True, (codigos[1:] != codigos[:-1]) | (k[1:] != k[:-1])])
+    pesosCentroides = np.add.reduceat(pesos, inicios)
+
+    return codigos[inicios], np.add.reduceat(valores * pesos, inicios) / pesosCentroides, pesosCentroides
+
+def cuantil_tdigest(medias, pesos, cuantil, minimo=np.nan, maximo=np.nan):
+    """
+    Estima un cuantil a partir de los centroides de un t-digest, interpolando entre sus centros (y el minimo y maximo exactos, si se conocen).
+
+    Parametros (args):
+        :param medias (numpy.ndarray) ==> Medias de los centroides, ordenadas.
+        :param pesos (numpy.ndarray) ==> Pesos de los centroides.
+        :param cuantil (float) ==> El cuantil a estimar, entre 0 y 1.
+        :param minimo (float) ==> Valor minimo exacto. Por defecto, nulo (desconocido).
+        :param maximo (float) ==> Valor maximo exacto. Por defecto, nulo (desconocido).
+
+    Output (returns):
+        :return valor (float) ==> El valor estimado del cuantil. Nulo si el t-digest esta vacio.
+    """
+    if len(medias) == 0:
+        return np.nan
+
+    total = pesos.sum()
+    posiciones = np.cumsum(pesos) - pesos / 2
+
+    if not pds.isna(minimo):
+        posiciones, medias = np.r_[0.0, posiciones], np.r_[minimo, medias]
+    if not pds.isna(maximo):
+        posiciones, medias = np.r_[posiciones, total], np.r_[medias, maximo]
+
+    return float(np.interp(cuantil * total, posiciones, medias))
+
+def construir_hll(valores, precision=PRECISION_HLL):
+    """
+    Obtiene, para cada valor, el registro y el rango de un HyperLogLog: el registro son los primeros bits del hash del valor,
+    y el rango la posicion del primer bit 1 en el resto del hash. Los valores nulos se descartan.
+
+    Parametros (args):
+        :param valores (Pandas.Series) ==> Los valores.
+        :param precision (int) ==> Cantidad de bits del registro (2^precision registros). Por defecto, PRECISION_HLL.
+
+    Output (returns):
+        :return (tuple) ==> La tupla (registros, rangos) para los valores (los nulos con rango 0, que no modifica el sketch).
+    """
+    nulos = pds.isna(valores).to_numpy()
+    hashes = pds.util.hash_array(valores.astype(str).to_numpy(dtype=object))
+
+    registros = (hashes >> np.uint64(64 - precision)).astype("int64")
+    rangos = np.minimum(ceros_iniciales(hashes << np.uint64(precision)), 64 - precision) + 1
+    rangos[nulos] = 0
+
+    return registros, rangos
+
+def combinar_hll(codigos, registros, rangos):
+    """
+    Combina los registros de HyperLogLog de cada grupo, conservando el maximo rango de cada registro.
+
+    Parametros (args):
+        :param codigos (numpy.ndarray) ==> Numero de grupo de cada registro.
+        :param registros (numpy.ndarray) ==> Numero de registro.
+        :param rangos (numpy.ndarray) ==> Rango del registro (0 ==> vacio, se descarta).
+
+    Output (returns):
+        :return (tuple) ==> La tupla (codigos, registros, rangos) de los registros no vacios, ordenados por grupo y registro.
+    """
+    df_registros = pds.DataFrame({'codigo': codigos, 'registro': np.asarray(registros, dtype="int64"), 'rango': np.asarray(rangos, dtype="int64")})
+    df_registros = df_registros[df_registros['rango'] > 0].groupby(['codigo', 'registro'])['rango'].max().reset_index()
+
+    return df_registros['codigo'].to_numpy(), df_registros['registro'].to_numpy(dtype="uint16"), df_registros['rango'].to_numpy(dtype="uint8")
+
+def estimar_hll(rangos, precision=PRECISION_HLL):
+    """
+    Estima la cantidad de valores distintos a partir de los registros no vacios de un HyperLogLog
+    (con la correccion de conteo lineal para cantidades pequeñas).
+
+    Parametros (args):
+        :param rangos (numpy.ndarray) ==> Rango de cada registro no vacio.
+        :param precision (int) ==> Cantidad de bits del registro. Por defecto, PRECISION_HLL.
+
+    Output (returns):
+        :return cantidad (int) ==> La cantidad estimada de valores distintos.
+    """
+    m = 2 ** precision
+    vacios = m - len(rangos)
+    estimacion = (0.7213 / (1 + 1.079 / m)) * m * m / (np.sum(np.power(2.0, -np.asarray(rangos, dtype="float64"))) + vacios)
+
+    if estimacion <= 2.5 * m and vacios > 0:
+        estimacion = m * np.log(m / vacios)
+
+    return int(round(estimacion))
+
+def ceros_iniciales(valores):
+    """
+    Obtiene la cantidad de bits 0 iniciales de cada entero de 64 bits (sin signo) de un array, por busqueda binaria vectorizada.
+
+    Parametros (args):
+        :param valores (numpy.ndarray) ==> Enteros de tipo uint64.
+
+    Output (returns):
+        :return ceros (numpy.ndarray) ==> La cantidad de ceros iniciales de cada valor (64 para el valor 0).
+    """
+    valores = np.array(valores, dtype="uint64")
+    ceros = np.zeros(len(valores), dtype="int64")
+
+    for bits in (32, 16, 8, 4, 2, 1):
+        sinBits = valores < (np.uint64(1) << np.uint64(64 - bits))
+        ceros[sinBits] += bits
+        valores[sinBits] <<= np.uint64(bits)
+
+    return np.where(valores == 0, 64, ceros)
+
+def serializar_por_grupo(codigos, cantGrupos, *arrays):
+    """
+    Serializa como bytes los elementos de cada grupo de uno o mas arrays (ordenados por grupo): por cada grupo, la version del formato (VERSION_SKETCH, un byte)
+    y sus elementos de cada array en orden.
+
+    Parametros (args):
+        :param codigos (numpy.ndarray) ==> Numero de grupo de cada elemento, ordenado.
+        :param cantGrupos (int) ==> Cantidad de grupos (los grupos sin elementos se serializan vacios).
+        :param arrays (numpy.ndarray) ==> Los arrays a serializar, alineados con codigos.
+
+    Output (returns):
+        :return sketches (list) ==> Los bytes de cada grupo.
+    """
+    limites = np.searchsorted(codigos, np.arange(cantGrupos + 1))
+
+    return [bytes([VERSION_SKETCH]) + b"".join(array[inicio:fin].tobytes() for array in arrays) for inicio, fin in zip(limites[:-1], limites[1:])]
+
+def leer_sketch(sketch, tipos):
+    """
+    Obtiene los arrays de un sketch serializado (ver serializar_por_grupo).
+
+    Parametros (args):
+        :param sketch (bytes) ==> El sketch serializado (None se considera vacio).
+        :param tipos (list) ==> El tipo de dato (numpy) de cada array, en orden.
+
+    Output (returns):
+        :return arrays (list) ==> Los arrays del sketch.
+
+    Raises:
+        ValueError ==> Si el sketch fue serializado con otra version del formato (ver VERSION_SKETCH).
+    """
+    if sketch:
+        if sketch[0] != VERSION_SKETCH:
+            raise ValueError(f"Version de sketch no soportada: {sketch[0]} (version actual: {VERSION_SKETCH}).")
+        sketch = sketch[1:]
+    else:
+        sketch = b""
+
+    cantidad = len(sketch) // sum(np.dtype(tipo).itemsize for tipo in tipos)
+    arrays, offset = [], 0
+
+    for tipo in tipos:
+        arrays.append(np.frombuffer(sketch, dtype=tipo, count=cantidad, offset=offset))
+        offset += cantidad * np.dtype(tipo).itemsize
+
+    return arrays
+
+def deserializar_por_grupo(sketches, codigos, tipos):
+    """
+    Obtiene los arrays de un conjunto de sketches serializados, junto al numero de grupo de cada elemento.
+
+    Parametros (args):
+        :param sketches (Pandas.Series) ==> Los sketches serializados.
+        :param codigos (numpy.ndarray) ==> Numero de grupo de cada sketch.
+        :param tipos (list) ==> El tipo de dato (numpy) de cada array, en orden.
+
+    Output (returns):
+        :return (tuple) ==> La tupla (codigos, array_1, ..., array_n), con un elemento por cada elemento de los sketches.
+    """
+    arrays = [leer_sketch(sketch, tipos) for sketch in sketches]
+    cantidades = [len(partes[0]) for partes in arrays]
+
+    return (np.repeat(codigos, cantidades),) + tuple(np.concatenate([partes[i] for partes in arrays] or [np.array([], dtype=tipo)]) for i, tipo in enumerate(tipos))
+
+def main(modo="incremental"):
+    """
+    Funcion principal del Script para modularizar el código.
+    En la misma se invocan los procesos de transformacion de los datos almacenados, y carga en base de datos OLAP.
+
+    Parametros (args):
+        :param modo (str) ==> 'incremental' actualiza el estado de agregacion con las particiones nuevas (ver actualizar_estado_magnitudes)
+            y en la tabla solo reemplaza los places afectados;
+            'lotes' agrupa todos los datos leyendolos por lotes de tamaño acotado; 'paralelo' agrupa cada particion 'fecha' en un proceso distinto;
+            'pandas' lee y agrupa todos los datos como DataFrame;
+            'arrow' lee y agrupa todos los datos como tabla de Arrow;
+            'duckdb' agrupa y clasifica el impacto con SQL sobre el dataset parquet (ver generar_df_magnitudes_agrupado_duckdb). Por defecto, 'incremental'.
+            Todos los modos cargan las mismas columnas: los cuantiles y valores distintos por place se obtienen de los sketches (ver agregar_sketches)
+            en los modos 'incremental', 'lotes' y 'paralelo', y con las agregaciones propias de cada backend en el resto.
+
+    Output (returns):
+        :return (None) 
+    """
+
+    path_historial = "Output/datalake/landing/earthquake/Registros/Historial/terremotos-historial.parquet"
+    columnas = ['properties.place', 'properties.mag'] + list(CAMPOS_DISTINTOS.values())
+
+    ## En el modo 'pandas' el pipeline recibe los eventos y los agrupa; en el resto, recibe el resultado ya agrupado
+    pipeline = crear_pipeline_magnitudes(agrupar=(modo == "pandas"), clasificarImpacto=(modo != "duckdb"))
+
+    if modo == "incremental":
+        df_estado, placesAfectados, nuevaMarca = actualizar_estado_magnitudes(path_historial, sketches=True)
+        if df_estado is None:
+            print(f"ERROR! No se pudo actualizar el estado de agregacion: el dataset '{path_historial}' no existe.")
+            return
+        df_entrada = finalizar_agregado(df_estado)
+    elif modo == "paralelo":
+        df_entrada = generar_df_magnitudes_agrupado_paralelo(path_historial, sketches=True)
+    elif modo == "lotes":
+        df_entrada = generar_df_magnitudes_agrupado_por_lotes(path_historial, sketches=True)
+    elif modo == "arrow":
+        df_entrada = generar_df_magnitudes_agrupado_arrow(JG_Alm.read_parquet_arrow(path_historial, columnas=columnas))
+    elif modo == "duckdb":
+        df_entrada = generar_df_magnitudes_agrupado_duckdb(path_historial, clasificarImpacto=True)
+    else:
+        df_entrada = JG_Alm.read_parquet(path_historial, columnas=columnas)
+
+    print("\n########## TRANSFORMACION ##########")
+    df_agrupado = pipeline.ejecutar(df_entrada)
+    pipeline.imprimir_reporte()
+    # print(df_agrupado) ## DEBUG!
+    
+    nombreTabla="JimenaGonzalez_magnitud_terremotos"    
+
+    if modo == "incremental" and placesAfectados is not None:
+        print("\n########## CREACION DE TABLA ##########")
+        create_magnitude_database_table(nombreTabla)
+
+        ## Solo se reemplazan las filas de los places cuyo resultado pudo cambiar (los que ya no tienen resultado se eliminan)
+        print(f"\n########## ACTUALIZACION DE TABLA: {len(placesAfectados)} place(s) ##########")
+        df_load = df_agrupado[df_agrupado.index.astype(str).isin(placesAfectados)].reset_index()
+        cargada = reemplazar_filas_database(nombreTabla, df_load, 'place', sorted(placesAfectados), "postgres")
+    else:
+        print("\n########## ELIMINAR TABLA - ARRANCAR DE 0 ##########")
+        delete_database_table("postgres",nombreTabla)
+
+        print("\n########## CREACION DE TABLA ##########")
+        create_magnitude_database_table(nombreTabla)
+
+        print("\n########## CARGA DE TABLA ##########")
+        cargada = reemplazar_filas_database(nombreTabla, df_agrupado.reset_index(), 'place', None, "postgres")
+
+    ## El estado incremental solo avanza si la tabla refleja su resultado (ver actualizar_estado_magnitudes)
+    if modo == "incremental" and cargada:
+        guardar_estado_magnitudes(df_estado, RUTA_ESTADO_MAGNITUDES, path_historial, nuevaMarca)
+
+    print("\n########## LECTURA DE TABLA ##########")
+    print_contenido_tabla(nombreTabla, "postgres")
+
+    print("\n########## ACTUALIZACION DE ROLLUPS ##########")
+    actualizar_rollups(path_historial)
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    ## Extraccion y almacenamiento previos a la transformacion (ver JG_Alm.main)
+    JG_Alm.main()
+    main()
\ No newline at end of file
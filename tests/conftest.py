@@ -0,0 +1,32 @@
+import os
+import sys
+
+## Los scripts se importan como modulos desde la raiz del repositorio
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import random
+
+import pytest
+
+
+@pytest.fixture
+def crear_features():
+    """Genera eventos GeoJSON sinteticos de USGS: crear_features(ids, dia, mag=None, lugares=..., actualizado=..., coordenadas=None)."""
+    generador = random.Random(0)
+
+    def crear(ids, dia, mag=None, lugares=("3 km N of A, CA", "A, CA", "10 km SSW of B", None, "null"), actualizado=1700000000000, coordenadas=None):
+        return [{
+            "type": "Feature",
+            "id": f"ev{i}",
+            "properties": {
+                "mag": mag if mag is not None else (round(generador.uniform(0, 7), 2) if i % 11 else None),
+                "place": generador.choice(lugares),
+                "net": generador.choice(["us", "ak", "nc", "hv"]),
+                "type": generador.choice(["earthquake", "quarry blast"]),
+                "time": 1672531200000 + dia * 86400000 + (i * 37000) % 86400000,
+                "updated": actualizado + i,
+            },
+            "geometry": {"type": "Point", "coordinates": coordenadas(i) if coordenadas else [-118.0 + (i % 10) / 10, 34.0, 5.0]},
+        } for i in ids]
+
+    return crear
@@ -0,0 +1,346 @@
+import asyncio
+import json
+import os
+from datetime import datetime, timezone, timedelta
+
+import numpy as np
+import pandas as pds
+import pytest
+
+import JimenaGonzalez_Extraer_y_Almacenar as JG_Alm
+
+
+def test_parse_fecha_parametro_convierte_a_utc():
+    assert JG_Alm.parse_fecha_parametro("2023-01-01") == datetime(2023, 1, 1)
+    assert JG_Alm.parse_fecha_parametro("2023-01-01T00:00:00Z") == datetime(2023, 1, 1)
+    assert JG_Alm.parse_fecha_parametro("2023-01-01T00:00:00-03:00") == datetime(2023, 1, 1, 3)
+    assert JG_Alm.parse_fecha_parametro(datetime(2023, 1, 1, 12, tzinfo=timezone(timedelta(hours=2)))) == datetime(2023, 1, 1, 10)
+
+
+class RespuestaFalsa:
+    """Respuesta HTTP minima (requests.Response) para las pruebas sin red."""
+
+    def __init__(self, status_code=200, data=None, headers=None, contenido=b""):
+        self.status_code, self.data, self.headers, self.contenido = status_code, data, headers or {}, contenido
+
+    def json(self):
+        return self.data
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise JG_Alm.req.exceptions.HTTPError(f"{self.status_code} Error")
+
+    def iter_content(self, chunk_size=1):
+        return (self.contenido[i:i + chunk_size] for i in range(0, len(self.contenido), chunk_size))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+@pytest.mark.parametrize("chunkBytes", [1, 7, 64, 1 << 20])
+def test_iterar_elementos_json_stream_con_fragmentos_de_cualquier_tamanio(crear_features, chunkBytes):
+    features = crear_features(range(0, 30), 0, lugares=("12 km NNE of Ñuñoa, Chile", "東京, Japan", 'con "comillas" y ] corchetes'))
+    contenido = json.dumps({"type": "FeatureCollection", "metadata": {"count": 30}, "features": features, "bbox": [1, 2]}, ensure_ascii=False).encode("utf-8")
+
+    elementos = JG_Alm.iterar_elementos_json_stream(RespuestaFalsa(contenido=contenido).iter_content(chunkBytes), "features")
+
+    assert list(elementos) == features
+
+
+def test_iterar_elementos_json_stream_informa_documentos_incompletos(crear_features):
+    contenido = json.dumps({"features": crear_features(range(0, 5), 0)}).encode("utf-8")
+
+    with pytest.raises(ValueError):
+        list(JG_Alm.iterar_elementos_json_stream([contenido[:-10]], "features"))
+
+
+@pytest.mark.parametrize("formato", ["pandas", "arrow"])
+def test_extraccion_full_streaming_almacena_por_lotes(tmp_path, crear_features, monkeypatch, formato):
+    contenido = json.dumps({"type": "FeatureCollection", "features": crear_features(range(0, 50), 0) + crear_features(range(50, 100), 1)}).encode("utf-8")
+    monkeypatch.setattr(JG_Alm, "get_response_stream", lambda url_base, endpoint, params=None: RespuestaFalsa(contenido=contenido))
+    path = str(tmp_path / "historial")
+
+    assert JG_Alm.extraccion_full_streaming("http://api", "query", {}, path, tamanioLote=30, chunkBytes=100, formato=formato) == 100
+
+    df = JG_Alm.read_parquet(path)
+    assert len(df) == 100 and df["id"].is_unique
+    assert df.groupby("fecha", observed=True).size().tolist() == [50, 50]
+
+
+def test_migrar_esquema_coordenadas(tmp_path, crear_features):
+    path = str(tmp_path / "historial")
+    features = crear_features(range(0, 20), 0)
+
+    ## Archivo con el esquema previo (coordenadas en una unica columna)
+    df_previo = pds.json_normalize(features)
+    JG_Alm.almacenar_particionado(df_previo, path, dateFiledName="properties.time", unitEpoch="ms", tipoParticion="f")
+    assert "geometry.coordinates" in JG_Alm.read_parquet(path).columns
+
+    ## El merge combina los archivos previos con los nuevos sin perder las coordenadas
+    JG_Alm.almacenar_particionado(JG_Alm.create_table(crear_features(range(15, 30), 0)), path, dateFiledName="properties.time", unitEpoch="ms", tipoParticion="f", modoEscritura="merge")
+    df = JG_Alm.read_parquet(path)
+    assert "geometry.coordinates" not in df.columns
+    assert len(df) == 30 and df["geometry.latitude"].notna().all()
+
+    ## La migracion reescribe solo las particiones con archivos previos
+    JG_Alm.almacenar_particionado(df_previo.assign(**{"properties.time": df_previo["properties.time"] + 86400000}), path, dateFiledName="properties.time", unitEpoch="ms", tipoParticion="f")
+    assert len(JG_Alm.migrar_esquema_coordenadas(path)) == 1
+    assert JG_Alm.migrar_esquema_coordenadas(path) == []
+    df = JG_Alm.read_parquet(path)
+    assert len(df) == 50 and df["geometry.depth"].eq(5.0).all()
+
+
+def test_checkpoint_no_avanza_si_falla_el_almacenamiento(tmp_path, crear_features, monkeypatch):
+    path = str(tmp_path / "latest")
+    rutaCheckpoint = str(tmp_path / "checkpoints.json")
+    tarea = {"endpoint": "query", "tipo": "incremental", "params": {"format": "geojson"}, "rutaCheckpoint": rutaCheckpoint, "destino": path,
+             "almacenamiento": {"dateFiledName": "properties.time", "unitEpoch": "ms", "tipoParticion": "f", "modoEscritura": "merge"}}
+
+    JG_Alm.almacenar_extraccion(tarea, JG_Alm.create_table(crear_features(range(0, 10), 0)))
+    checkpoint = JG_Alm.leer_checkpoint(rutaCheckpoint, "query", tarea["params"])
+    assert checkpoint == 1700000000009
+
+    def sin_espacio(*args, **kwargs):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(JG_Alm, "reemplazar_particiones", sin_espacio)
+    with pytest.raises(OSError):
+        JG_Alm.almacenar_extraccion(tarea, JG_Alm.create_table(crear_features(range(10, 20), 1, actualizado=1800000000000)))
+
+    assert JG_Alm.leer_checkpoint(rutaCheckpoint, "query", tarea["params"]) == checkpoint
+    assert len(JG_Alm.read_parquet(path)) == 10
+
+
+class SesionFalsa:
+    """Sesion HTTP que devuelve las respuestas dadas, en orden, y registra los headers de cada peticion."""
+
+    def __init__(self, respuestas):
+        self.respuestas, self.headers = list(respuestas), []
+
+    def get(self, url, params=None, timeout=None, headers=None, stream=False):
+        self.headers.append(headers or {})
+        return self.respuestas.pop(0)
+
+
+def test_cache_revalida_con_etag_las_respuestas_expiradas(tmp_path, monkeypatch):
+    monkeypatch.setattr(JG_Alm, "CONFIG_CACHE", {**JG_Alm.CONFIG_CACHE, "habilitado": True, "directorio": str(tmp_path / "cache")})
+    sesion = SesionFalsa([RespuestaFalsa(200, {"count": 5}, {"ETag": '"v1"'}), RespuestaFalsa(304)])
+    monkeypatch.setattr(JG_Alm, "get_sesion_http", lambda: sesion)
+
+    assert JG_Alm.get_response_data("http://api", "count", {"format": "geojson"}) == {"count": 5}
+
+    ## Dentro del TTL no se realiza la peticion
+    assert JG_Alm.get_response_data("http://api", "count", {"format": "geojson"}) == {"count": 5}
+    assert len(sesion.headers) == 1
+
+    ## Expirada, se revalida: ante un 304 se devuelve la respuesta guardada y se renueva su TTL
+    JG_Alm.CONFIG_CACHE["ttlSegundos"] = {"count": -1}
+    assert JG_Alm.get_response_data("http://api", "count", {"format": "geojson"}) == {"count": 5}
+    assert sesion.headers == [{}, {"If-None-Match": '"v1"'}]
+
+
+def test_cache_elimina_las_entradas_menos_usadas(tmp_path, monkeypatch):
+    monkeypatch.setattr(JG_Alm, "CONFIG_CACHE", {**JG_Alm.CONFIG_CACHE, "habilitado": True, "directorio": str(tmp_path / "cache")})
+    sesion = SesionFalsa([RespuestaFalsa(200, {"datos": "x" * 1000}) for _ in range(3)])
+    monkeypatch.setattr(JG_Alm, "get_sesion_http", lambda: sesion)
+
+    for pagina in range(2):
+        JG_Alm.get_response_data("http://api", "query", {"pagina": pagina})
+    tamanio = sum(entrada.stat().st_size for entrada in os.scandir(tmp_path / "cache"))
+
+    ## Al superar el tamaño maximo, se elimina la entrada usada hace mas tiempo
+    os.utime(JG_Alm.ruta_cache(JG_Alm.clave_cache("http://api/query", {"pagina": 0})), (0, 0))
+    JG_Alm.CONFIG_CACHE["maxBytes"] = int(tamanio * 1.2)
+    JG_Alm.get_response_data("http://api", "query", {"pagina": 2})
+
+    assert JG_Alm.leer_cache(JG_Alm.clave_cache("http://api/query", {"pagina": 0})) is None
+    assert JG_Alm.leer_cache(JG_Alm.clave_cache("http://api/query", {"pagina": 1})) is not None
+
+
+def test_error_de_derivacion_no_aborta_las_extracciones(crear_features, monkeypatch):
+    params = {"format": "geojson"}
+    tareas = [{"endpoint": "query", "tipo": "full", "params": params, "fieldToExtract": "features"},
+              {"endpoint": "count", "tipo": "full", "params": params, "fieldToExtract": None},
+              {"endpoint": "query", "tipo": "incremental", "params": params, "fieldToExtract": "features"}]
+    consultadas = []
+
+    async def extraer(url_base, tarea, semaforo=None):
+        consultadas.append((tarea["endpoint"], tarea["tipo"]))
+        return tarea, JG_Alm.create_table(crear_features(range(0, 5), 0)), None
+
+    def derivar(tarea, df_origen, campoVersion="properties.updated"):
+        if tarea["derivacion"] == "incremental":
+            raise TypeError("boolean value of NA is ambiguous")
+        return pds.DataFrame({"count": [len(df_origen)], "maxAllowed": [20000]})
+
+    monkeypatch.setattr(JG_Alm, "ejecutar_tarea_extraccion", extraer)
+    monkeypatch.setattr(JG_Alm, "derivar_resultado", derivar)
+    resultados = asyncio.run(JG_Alm.ejecutar_extracciones_async("http://api", tareas, derivarLocalmente=True))
+
+    assert sorted((t["endpoint"], t["tipo"]) for t, _, error in resultados if error is None) == [("count", "full"), ("query", "full"), ("query", "incremental")]
+    assert consultadas == [("query", "full"), ("query", "incremental")]
+
+
+def test_main_realiza_una_unica_consulta_a_la_api(tmp_path, crear_features, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    consultas = []
+    ahora = int(datetime.now(timezone.utc).timestamp() * 1000)
+
+    def respuesta(url_base, endpoint, params=None):
+        consultas.append(endpoint)
+        return {"type": "FeatureCollection", "features": crear_features(range(0, 50), 0, actualizado=ahora - 3600000 * 24)}
+
+    monkeypatch.setattr(JG_Alm, "get_response_data", respuesta)
+    JG_Alm.main()
+
+    assert consultas == ["query"]
+    assert len(JG_Alm.read_parquet("Output/datalake/landing/earthquake/Registros/Historial/terremotos-historial.parquet")) == 50
+    assert JG_Alm.read_parquet("Output/datalake/landing/earthquake/Cantidad/cant-ult-30dias.parquet")["count"].tolist() == [50]
+
+
+def test_incremental_fuera_del_rango_full_se_consulta_a_la_api(tmp_path):
+    rutaCheckpoint = str(tmp_path / "checkpoints.json")
+    params = {"format": "geojson"}
+    full = {"endpoint": "query", "tipo": "full", "params": params, "fieldToExtract": "features"}
+    incremental = {"endpoint": "query", "tipo": "incremental", "params": params, "fieldToExtract": "features", "rutaCheckpoint": rutaCheckpoint}
+
+    assert JG_Alm.planificar_consultas([full, incremental])[0] == [full]
+
+    ## Checkpoint anterior al rango de la consulta full (ultimos 30 dias): la derivacion omitiria eventos
+    JG_Alm.registrar_checkpoint(rutaCheckpoint, "query", params, pds.DataFrame({"properties.updated": [int((datetime.now(timezone.utc) - timedelta(days=40)).timestamp() * 1000)]}))
+    assert JG_Alm.planificar_consultas([full, incremental])[0] == [full, incremental]
+    assert JG_Alm.planificar_consultas([{**full, "params": {**params, "starttime": "2000-01-01"}}, {**incremental, "params": {**params, "starttime": "2000-01-01"}}])[1] != []
+
+
+def test_deduplicar_eventos_prefiere_versiones_no_nulas():
+    df = pds.DataFrame({"id": ["a", "a", "b", "b", "c"], "properties.updated": pds.array([200, None, None, 100, None], dtype="Int64"), "v": [1, 2, 3, 4, 5]})
+    df = JG_Alm.deduplicar_eventos(df).set_index("id")
+
+    assert df["v"].to_dict() == {"a": 1, "b": 4, "c": 5}
+
+
+def almacenar_merge(features, path):
+    JG_Alm.almacenar_particionado(JG_Alm.create_table(features), path, dateFiledName="properties.time", unitEpoch="ms", tipoParticion="f", modoEscritura="merge")
+
+
+def test_merge_mueve_los_registros_que_cambian_de_particion(tmp_path, crear_features):
+    path = str(tmp_path / "historial")
+    almacenar_merge(crear_features(range(0, 10), 0) + crear_features(range(10, 20), 1), path)
+
+    ## Nuevas versiones de eventos del dia 0 cuya fecha se corrigio al dia 2
+    corregidos = crear_features(range(5, 10), 2, actualizado=1800000000000)
+    almacenar_merge(corregidos, path)
+    almacenar_merge(corregidos, path)
+
+    df = JG_Alm.read_parquet(path)
+    assert len(df) == 20 and df["id"].is_unique
+    assert df.groupby("fecha", observed=True).size().to_dict() == {"2023-01-01": 5, "2023-01-02": 10, "2023-01-03": 5}
+    assert (df.loc[df["id"].isin([f"ev{i}" for i in range(5, 10)]), "properties.updated"] > 1800000000000).all()
+    assert all(len(JG_Alm.listar_archivos_parquet(os.path.join(path, f"fecha={fecha}"))) == 1 for fecha in ["2023-01-01", "2023-01-02", "2023-01-03"])
+
+
+def test_almacenamiento_fallido_se_informa_en_los_resultados(tmp_path, crear_features, monkeypatch):
+    tarea = {"endpoint": "query", "tipo": "full", "params": {}, "fieldToExtract": "features", "destino": str(tmp_path / "historial"),
+             "almacenamiento": {"dateFiledName": "properties.time", "unitEpoch": "ms", "tipoParticion": "f", "modoEscritura": "merge"}}
+
+    async def extraer(url_base, tarea, semaforo=None):
+        return tarea, JG_Alm.create_table(crear_features(range(0, 5), 0)), None
+
+    def sin_espacio(*args, **kwargs):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(JG_Alm, "ejecutar_tarea_extraccion", extraer)
+    monkeypatch.setattr(JG_Alm, "reemplazar_particiones", sin_espacio)
+    [(_, _, error)] = asyncio.run(JG_Alm.ejecutar_extracciones_async("http://api", [tarea], alCompletar=JG_Alm.almacenar_extraccion))
+
+    assert isinstance(error, OSError)
+
+
+def test_compactar_particiones_ordena_eventos_por_fecha(tmp_path, crear_features):
+    path = str(tmp_path / "historial")
+    for i in reversed(range(8)):
+        JG_Alm.almacenar_particionado(JG_Alm.create_table(crear_features(range(i * 5, i * 5 + 5), 0)), path, dateFiledName="properties.time", unitEpoch="ms", tipoParticion="f")
+
+    assert list(JG_Alm.compactar_particiones(path, ordenarPor="properties.time").values()) == [(8, 1)]
+    tiempos = JG_Alm.read_parquet(path)["properties.time"]
+    assert len(tiempos) == 40 and tiempos.is_monotonic_increasing
+
+
+def test_main_compacta_los_conteos_de_cada_ejecucion(tmp_path, crear_features, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(JG_Alm, "get_response_data", lambda url_base, endpoint, params=None: {"features": crear_features(range(0, 10), 0)})
+    path = "Output/datalake/landing/earthquake/Cantidad/cant-ult-30dias.parquet"
+
+    ## Cada ejecucion agrega un archivo a la particion del dia; al alcanzar el umbral, se compactan en uno
+    for _ in range(8):
+        JG_Alm.main()
+
+    assert [len(JG_Alm.listar_archivos_parquet(directorio)) for directorio, _, _ in os.walk(path) if "fecha=" in directorio] == [1]
+    df = JG_Alm.read_parquet(path)
+    assert len(df) == 8 and df["timestamp_measured"].is_monotonic_increasing
+
+
+def test_almacenar_particionado_arrow_propaga_errores(tmp_path, crear_features, monkeypatch):
+    def sin_espacio(*args, **kwargs):
+        raise OSError(28, "No space left on device")
+
+    monkeypatch.setattr(JG_Alm.pq, "write_to_dataset", sin_espacio)
+    with pytest.raises(OSError):
+        JG_Alm.almacenar_particionado_arrow(JG_Alm.create_arrow_table(crear_features(range(0, 5), 0)), str(tmp_path / "historial"), tipoParticion="f")
+
+
+@pytest.mark.parametrize("formato", ["pandas", "arrow"])
+def test_particionado_fecha_y_celda_de_un_lote_global(tmp_path, crear_features, formato):
+    generador = np.random.default_rng(0)
+    coordenadas = lambda i: [float(generador.uniform(-180, 180)), float(generador.uniform(-90, 90)), 10.0]
+    features = [feature for dia in range(10) for feature in crear_features(range(dia * 500, dia * 500 + 500), dia, coordenadas=coordenadas)]
+    path = str(tmp_path / "global")
+
+    if formato == "arrow":
+        JG_Alm.almacenar_particionado_arrow(JG_Alm.create_arrow_table(features), path, tipoParticion="fg")
+    else:
+        JG_Alm.almacenar_particionado(JG_Alm.create_table(features), path, dateFiledName="properties.time", unitEpoch="ms", tipoParticion="fg")
+
+    df = JG_Alm.read_parquet(path)
+    assert len(df) == 5000
+    assert df.groupby(["fecha", "celda_lat", "celda_lon"], observed=True).ngroups > 1024
+
+
+def test_manifest_planifica_la_lectura_por_fecha(tmp_path, crear_features):
+    path = str(tmp_path / "historial")
+    almacenar_merge([feature for dia in range(3) for feature in crear_features(range(dia * 10, dia * 10 + 10), dia)], path)
+
+    assert [os.path.dirname(archivo) for archivo in JG_Alm.planificar_lectura_manifest(path, "2023-01-02", "2023-01-02")] == [os.path.join(path, "fecha=2023-01-02")]
+    assert len(JG_Alm.read_parquet(path, fechaDesde="2023-01-02")) == 20
+
+    ## Solo los archivos escritos luego de la marca (el merge reemplaza el archivo de la particion)
+    marca = max(JG_Alm.leer_manifest(path)["escrito_en"])
+    almacenar_merge(crear_features(range(0, 5), 0, actualizado=1800000000000), path)
+    assert list(JG_Alm.archivos_nuevos_manifest(path, marca)["fecha"]) == ["2023-01-01"]
+
+    ## Sin manifest (ej. dataset previo), se genera al leer
+    os.remove(JG_Alm.ruta_manifest(path))
+    assert len(JG_Alm.read_parquet(path)) == 30
+    assert len(JG_Alm.leer_manifest(path)) == 3
+
+
+def test_lectores_ven_una_unica_version_durante_un_reemplazo(tmp_path, crear_features, monkeypatch):
+    path = str(tmp_path / "historial")
+    almacenar_merge(crear_features(range(0, 10), 0) + crear_features(range(10, 20), 1), path)
+    lecturas = []
+    eliminar = os.remove
+
+    ## Lecturas entre la publicacion de los nuevos archivos y la eliminacion de los previos
+    def leer_y_eliminar(archivo):
+        if archivo.endswith(".parquet"):
+            lecturas.append((len(JG_Alm.read_parquet(path)), sum(len(lote) for lote in JG_Alm.iterar_lotes_parquet(path)), JG_Alm.read_parquet_arrow(path).num_rows))
+        eliminar(archivo)
+
+    monkeypatch.setattr(JG_Alm.os, "remove", leer_y_eliminar)
+    almacenar_merge(crear_features(range(5, 15), 2, actualizado=1800000000000), path)
+    JG_Alm.compactar_particiones(path, umbralArchivos=1, ordenarPor="properties.time")
+
+    assert lecturas and set(lecturas) == {(20, 20, 20)}
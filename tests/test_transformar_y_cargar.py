@@ -0,0 +1,235 @@
+import os
+
+import numpy as np
+import pandas as pds
+import pyarrow as pa
+import pytest
+import sqlalchemy as sa
+
+import JimenaGonzalez_Extraer_y_Almacenar as JG_Alm
+import JimenaGonzalez_Transformar_y_CargarDB as JG_Tr
+
+PATH_HISTORIAL = "Output/datalake/landing/earthquake/Registros/Historial/terremotos-historial.parquet"
+TABLA_MAGNITUDES = "JimenaGonzalez_magnitud_terremotos"
+
+
+def almacenar(features, path):
+    JG_Alm.almacenar_particionado(JG_Alm.create_table(features), path, dateFiledName="properties.time", unitEpoch="ms", tipoParticion="f", modoEscritura="merge")
+
+
+@pytest.fixture
+def motor_sqlite(tmp_path, monkeypatch):
+    """Ejecuta el script en tmp_path, con una base sqlite en lugar de postgres."""
+    monkeypatch.chdir(tmp_path)
+    engine = sa.create_engine(f"sqlite:///{tmp_path / 'db.sqlite'}")
+    monkeypatch.setattr(JG_Tr, "connect_to_database", lambda *args, **kwargs: engine)
+    return engine
+
+
+def leer_tabla(engine, nombreTabla, columnas):
+    return pds.read_sql_table(nombreTabla, engine).sort_values(columnas, ignore_index=True)
+
+
+def comparar_magnitudes(df_resultado, df_esperado):
+    """
+    Compara resultados por place: exactos salvo los cuantiles, que dependen del orden en que se combinan los t-digest
+    (con pocos eventos por place, la estimacion interpola dentro del hueco entre dos magnitudes consecutivas).
+    """
+    df_resultado = df_resultado[df_esperado.columns].astype({"impacto_maximo": str})
+    df_esperado = df_esperado.astype({"impacto_maximo": str})
+    cuantiles = [col for col in JG_Tr.CUANTILES_MAGNITUD if col in df_esperado.columns]
+    pds.testing.assert_frame_equal(df_resultado.drop(columns=cuantiles), df_esperado.drop(columns=cuantiles), check_dtype=False)
+    pds.testing.assert_frame_equal(df_resultado[cuantiles], df_esperado[cuantiles], check_exact=False, atol=0.3)
+
+
+def test_main_incremental_solo_reemplaza_los_places_afectados(motor_sqlite, crear_features, monkeypatch):
+    almacenar(crear_features(range(0, 300), 0) + crear_features(range(300, 600), 1), PATH_HISTORIAL)
+    JG_Tr.main("incremental")
+
+    reemplazos = []
+    reemplazar = JG_Tr.reemplazar_filas_database
+    monkeypatch.setattr(JG_Tr, "reemplazar_filas_database", lambda nombreTabla, df_load, columna, valores=None, motor="postgres": reemplazos.append((nombreTabla, valores)) or reemplazar(nombreTabla, df_load, columna, valores, motor))
+
+    almacenar(crear_features(range(600, 700), 2, lugares=("5 km E of C, NV",)), PATH_HISTORIAL)
+    JG_Tr.main("incremental")
+    assert (TABLA_MAGNITUDES, ["C, NV"]) in reemplazos
+
+    df_incremental = leer_tabla(motor_sqlite, TABLA_MAGNITUDES, ["place"])
+    JG_Tr.main("lotes")
+    comparar_magnitudes(df_incremental, leer_tabla(motor_sqlite, TABLA_MAGNITUDES, ["place"]))
+    assert set(df_incremental["place"]) == {"A, CA", "B", "C, NV"}
+
+
+def test_main_incremental_no_avanza_el_estado_si_falla_la_carga(motor_sqlite, crear_features, monkeypatch):
+    almacenar(crear_features(range(0, 300), 0), PATH_HISTORIAL)
+    JG_Tr.main("incremental")
+    _, marca = JG_Tr.leer_estado_magnitudes(JG_Tr.RUTA_ESTADO_MAGNITUDES, PATH_HISTORIAL)
+
+    monkeypatch.setattr(JG_Tr, "reemplazar_filas_database", lambda *args, **kwargs: False)
+    almacenar(crear_features(range(300, 400), 1), PATH_HISTORIAL)
+    JG_Tr.main("incremental")
+
+    assert JG_Tr.leer_estado_magnitudes(JG_Tr.RUTA_ESTADO_MAGNITUDES, PATH_HISTORIAL)[1] == marca
+
+
+def test_main_incremental_sin_dataset_no_carga_la_tabla(motor_sqlite, capsys):
+    JG_Tr.main("incremental")
+
+    assert "ERROR!" in capsys.readouterr().out
+    assert not sa.inspect(motor_sqlite).has_table(TABLA_MAGNITUDES)
+    assert not os.path.exists(JG_Tr.RUTA_ESTADO_MAGNITUDES)
+
+
+def agrupar_magnitudes(modo, path):
+    """Resultado del pipeline de magnitudes para un modo de main (sin cargarlo en base de datos)."""
+    if modo == "incremental":
+        df_entrada = JG_Tr.actualizar_agregado_magnitudes(path, filasPorLote=64, sketches=True)
+    elif modo == "lotes":
+        df_entrada = JG_Tr.generar_df_magnitudes_agrupado_por_lotes(path, filasPorLote=64, sketches=True)
+    elif modo == "paralelo":
+        df_entrada = JG_Tr.generar_df_magnitudes_agrupado_paralelo(path, maxWorkers=2, sketches=True)
+    elif modo == "arrow":
+        df_entrada = JG_Tr.generar_df_magnitudes_agrupado_arrow(JG_Alm.read_parquet_arrow(path, columnas=["properties.place", "properties.mag"]))
+    elif modo == "duckdb":
+        df_entrada = JG_Tr.generar_df_magnitudes_agrupado_duckdb(path, clasificarImpacto=True)
+    else:
+        df_entrada = JG_Alm.read_parquet(path, columnas=["properties.place", "properties.mag"])
+
+    df_resultado = JG_Tr.crear_pipeline_magnitudes(agrupar=(modo == "pandas"), clasificarImpacto=(modo != "duckdb")).ejecutar(df_entrada)
+    df_resultado.index = df_resultado.index.astype(str)
+
+    return df_resultado.sort_index()
+
+
+@pytest.fixture
+def dataset_eventos(tmp_path, monkeypatch, crear_features):
+    """Dataset particionado por fecha de varios dias, con places repetidos y normalizables."""
+    monkeypatch.chdir(tmp_path)
+    lugares = ("3 km N of A, CA", "A, CA", "10 km SSW of B", "12 km NNE of Ridgecrest, CA", "Ridgecrest, CA", None, "null")
+    almacenar([feature for dia in range(4) for feature in crear_features(range(dia * 250, dia * 250 + 250), dia, lugares=lugares)], PATH_HISTORIAL)
+    return PATH_HISTORIAL
+
+
+def test_agrupado_por_lotes_igual_a_pandas(dataset_eventos):
+    df_pandas = agrupar_magnitudes("pandas", dataset_eventos)
+    df_lotes = agrupar_magnitudes("lotes", dataset_eventos)
+
+    comparar_magnitudes(df_lotes, df_pandas)
+    assert {"magnitud_p50", "magnitud_p95", "cant_redes", "cant_tipos"} <= set(df_lotes.columns)
+
+
+def test_agrupado_paralelo_igual_a_lotes(dataset_eventos):
+    comparar_magnitudes(agrupar_magnitudes("paralelo", dataset_eventos), agrupar_magnitudes("lotes", dataset_eventos))
+
+
+def test_agregado_incremental_con_sketches_igual_a_completo(tmp_path, monkeypatch, crear_features):
+    monkeypatch.chdir(tmp_path)
+    almacenar(crear_features(range(0, 250), 0) + crear_features(range(250, 500), 1), PATH_HISTORIAL)
+    agrupar_magnitudes("incremental", PATH_HISTORIAL)
+
+    ## Dias nuevos y nuevas versiones (merge) de eventos de un dia ya procesado
+    almacenar(crear_features(range(500, 750), 2, lugares=("5 km E of C, NV", "A, CA")) + crear_features(range(0, 100), 0, mag=7.5, actualizado=1800000000000), PATH_HISTORIAL)
+    df_incremental = agrupar_magnitudes("incremental", PATH_HISTORIAL)
+
+    comparar_magnitudes(df_incremental, agrupar_magnitudes("lotes", PATH_HISTORIAL))
+    assert df_incremental["magnitud_maxima"].max() == 7.5
+
+
+@pytest.mark.parametrize("distribucion", ["normal", "exponencial"])
+def test_tdigest_combinado_estima_cuantiles_con_error_de_rango_acotado(distribucion):
+    generador = np.random.default_rng(0)
+    valores = generador.normal(3, 1, 100000) if distribucion == "normal" else generador.exponential(1, 100000)
+
+    ## Se combinan los t-digest de 10 particiones, como en la agregacion incremental
+    parciales = [JG_Tr.construir_tdigest(np.zeros(len(parte), dtype="int64"), parte) for parte in np.array_split(valores, 10)]
+    _, medias, pesos = JG_Tr.construir_tdigest(*(np.concatenate([parcial[i] for parcial in parciales]) for i in range(3)))
+
+    assert len(medias) <= 2 * JG_Tr.COMPRESION_TDIGEST
+    for cuantil in [0.5, 0.95, 0.99]:
+        estimacion = JG_Tr.cuantil_tdigest(medias, pesos, cuantil, valores.min(), valores.max())
+        assert abs((valores <= estimacion).mean() - cuantil) < 0.005
+
+
+@pytest.mark.parametrize("cantidad", [10, 100, 1000, 10000, 100000])
+def test_hll_estima_valores_distintos_con_error_acotado(cantidad):
+    valores = pds.Series([f"valor{i}" for i in range(cantidad)] * 2)
+    _, _, rangos = JG_Tr.combinar_hll(np.zeros(len(valores), dtype="int64"), *JG_Tr.construir_hll(valores))
+
+    ## Error tipico de 1.04 / sqrt(2^12) ~ 1.6%: se admiten 3 desvios
+    assert abs(JG_Tr.estimar_hll(rangos) / cantidad - 1) < 0.05
+    assert len(rangos) <= 2 ** JG_Tr.PRECISION_HLL
+
+
+def test_estado_con_otra_version_de_sketches_se_recalcula(tmp_path, monkeypatch, crear_features):
+    monkeypatch.chdir(tmp_path)
+    almacenar(crear_features(range(0, 200), 0), PATH_HISTORIAL)
+    df_estado, _, marca = JG_Tr.actualizar_estado_magnitudes(PATH_HISTORIAL, sketches=True)
+    assert all(sketch[0] == JG_Tr.VERSION_SKETCH for sketch in df_estado["tdigest"])
+
+    df_estado["tdigest"] = [bytes([JG_Tr.VERSION_SKETCH + 1]) + sketch[1:] for sketch in df_estado["tdigest"]]
+    JG_Tr.guardar_estado_magnitudes(df_estado, JG_Tr.RUTA_ESTADO_MAGNITUDES, PATH_HISTORIAL, marca)
+    with pytest.raises(ValueError):
+        JG_Tr.leer_sketch(df_estado["tdigest"].iloc[0], ["float64", "float64"])
+
+    ## Sin places afectados: el estado se recalcula completo
+    assert JG_Tr.actualizar_estado_magnitudes(PATH_HISTORIAL, sketches=True)[1] is None
+
+
+@pytest.mark.parametrize("modo", ["pandas", "arrow", "duckdb"])
+def test_main_incremental_luego_de_otro_modo_no_deja_columnas_nulas(motor_sqlite, crear_features, modo):
+    if modo == "duckdb":
+        pytest.importorskip("duckdb")
+
+    almacenar(crear_features(range(0, 300), 0), PATH_HISTORIAL)
+    JG_Tr.main("incremental")
+    JG_Tr.main(modo)
+    assert leer_tabla(motor_sqlite, TABLA_MAGNITUDES, ["place"])[["magnitud_p50", "magnitud_p95", "cant_redes", "cant_tipos"]].notna().all().all()
+
+    almacenar(crear_features(range(300, 400), 1, lugares=("5 km E of C, NV",)), PATH_HISTORIAL)
+    JG_Tr.main("incremental")
+    df = leer_tabla(motor_sqlite, TABLA_MAGNITUDES, ["place"])
+    assert set(df["place"]) == {"A, CA", "B", "C, NV"}
+    assert df[["magnitud_p50", "magnitud_p95", "cant_redes", "cant_tipos"]].notna().all().all()
+
+
+def test_rollups_incrementales_iguales_a_completos(motor_sqlite, crear_features):
+    almacenar(crear_features(range(0, 250), 0) + crear_features(range(250, 500), 1), PATH_HISTORIAL)
+    JG_Tr.actualizar_rollups(PATH_HISTORIAL)
+
+    almacenar(crear_features(range(500, 750), 2) + crear_features(range(0, 100), 0, mag=7.5, actualizado=1800000000000), PATH_HISTORIAL)
+    assert all(df is not None for df in JG_Tr.actualizar_rollups(PATH_HISTORIAL).values())
+    df_incrementales = {nombreTabla: leer_tabla(motor_sqlite, nombreTabla, ["fecha"]) for nombreTabla in JG_Tr.ROLLUPS}
+
+    ## Sin marca previa, las tablas se reconstruyen completas
+    os.remove(JG_Tr.RUTA_MARCA_ROLLUPS)
+    JG_Tr.actualizar_rollups(PATH_HISTORIAL)
+
+    for nombreTabla, columnasGrupo in JG_Tr.ROLLUPS.items():
+        columnas = [JG_Tr.nombre_columna_rollup(col) for col in columnasGrupo]
+        df_completo = leer_tabla(motor_sqlite, nombreTabla, columnas)
+        pds.testing.assert_frame_equal(df_incrementales[nombreTabla].sort_values(columnas, ignore_index=True), df_completo)
+
+    ## Todos los eventos con magnitud, con la nueva version de los actualizados
+    df_por_dia = leer_tabla(motor_sqlite, "JimenaGonzalez_terremotos_por_dia", ["fecha"])
+    assert df_por_dia["cantidad"].sum() == 750 - sum(1 for i in range(100, 750) if i % 11 == 0)
+    assert df_por_dia["magnitud_maxima"].iloc[0] == 7.5
+
+
+@pytest.mark.parametrize("agrupar", [True, False])
+def test_pipeline_no_modifica_su_entrada(crear_features, agrupar):
+    df_eventos = JG_Alm.create_table(crear_features(range(0, 200), 0))
+    df_entrada = df_eventos if agrupar else JG_Tr.generar_df_magnitudes_agrupado_arrow(pa.Table.from_pandas(df_eventos[["properties.place", "properties.mag"]], preserve_index=False))
+    df_original = df_entrada.copy()
+
+    df_resultado = JG_Tr.crear_pipeline_magnitudes(agrupar=agrupar).ejecutar(df_entrada)
+
+    pds.testing.assert_frame_equal(df_entrada, df_original)
+    assert "impacto_maximo" in df_resultado.columns
+
+
+@pytest.mark.parametrize("modo", ["arrow", "duckdb"])
+def test_agrupado_por_backend_igual_a_pandas(dataset_eventos, modo):
+    if modo == "duckdb":
+        pytest.importorskip("duckdb")
+
+    comparar_magnitudes(agrupar_magnitudes(modo, dataset_eventos), agrupar_magnitudes("pandas", dataset_eventos))